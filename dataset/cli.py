@@ -3,6 +3,7 @@ import pathlib
 import tqdm
 
 from src.symbols.collector import build_type_collection
+from src.symbols.index import load_symbol_index
 
 from src.infer.inference._base import DatasetFolderStructure
 
@@ -36,6 +37,9 @@ def cli_entrypoint(dataset: pathlib.Path, outpath: pathlib.Path) -> None:
 
         output.write_dataset(outpath, author_repo, df=collection)
 
+        # Downstream stages join against the cached index instead of re-collecting the baseline
+        load_symbol_index(project)
+
 
 if __name__ == "__main__":
     cli_entrypoint()
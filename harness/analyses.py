@@ -1,6 +1,6 @@
 import dataclasses
 
-from src.common import TypeCollectionSchema
+from src.common.schemas import SymbolIndexSchema, TypeCollectionSchema
 
 import pandas as pd
 import pandera.typing as pt
@@ -22,26 +22,14 @@ class SymbolCommanality:
 def symbol_commonality(
     baseline: pt.DataFrame[TypeCollectionSchema], inferred: pt.DataFrame[TypeCollectionSchema]
 ) -> SymbolCommanality:
-    indic = "commonality"
-
-    comparison = pd.merge(
-        baseline,
-        inferred,
-        on=[
-            TypeCollectionSchema.file,
-            TypeCollectionSchema.category,
-            TypeCollectionSchema.qname,
-            TypeCollectionSchema.qname_ssa,
-            # TypeCollectionSchema.
-        ],
-        how="outer",
-        indicator=indic,
-    )
+    """Both collections must carry SymbolIndexSchema.symbol, see src.symbols.index.with_symbol_ids;
+    inferred symbols that are not in the baseline have no ID"""
+    in_inferred = baseline[SymbolIndexSchema.symbol].isin(inferred[SymbolIndexSchema.symbol])
 
     return SymbolCommanality(
-        common=comparison.loc[comparison[indic] == "both"],
-        only_in_baseline=comparison.loc[comparison[indic] == "left_only"],
-        only_in_inferred=comparison.loc[comparison[indic] == "right_only"],
+        common=baseline.loc[in_inferred],
+        only_in_baseline=baseline.loc[~in_inferred],
+        only_in_inferred=inferred.loc[inferred[SymbolIndexSchema.symbol].isna()],
     )
 
 
@@ -58,13 +46,10 @@ def annotation_commonality(
 ) -> AnnotationCommonality:
     comparison = pd.merge(
         baseline,
-        inferred,
-        on=[
-            TypeCollectionSchema.file,
-            TypeCollectionSchema.category,
-            TypeCollectionSchema.qname,
-            TypeCollectionSchema.qname_ssa,
-        ],
+        inferred[[SymbolIndexSchema.symbol, TypeCollectionSchema.anno]].dropna(
+            subset=SymbolIndexSchema.symbol
+        ),
+        on=SymbolIndexSchema.symbol,
         how="left",
         suffixes=("_gt", "_it"),
     )
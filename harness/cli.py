@@ -4,6 +4,7 @@ import click
 
 from .analyses import symbol_commonality, annotation_commonality
 from src.symbols.collector import build_type_collection
+from src.symbols.index import symbol_index, with_symbol_ids
 
 
 @click.command(name="harness")
@@ -29,6 +30,11 @@ def cli_entrypoint(baseline: pathlib.Path, inferred: pathlib.Path) -> None:
     baseline_collection = build_type_collection(baseline).df
     inferred_collection = build_type_collection(inferred).df
 
+    # Compare on symbol IDs; symbols only present in the inferred codebase remain without one
+    index = symbol_index(baseline_collection)
+    baseline_collection = with_symbol_ids(baseline_collection, index)
+    inferred_collection = with_symbol_ids(inferred_collection, index, how="left")
+
     sym = symbol_commonality(baseline_collection, inferred_collection)
     print(f"{len(sym.common)} common symbols")
     print(f"{len(sym.only_in_baseline)} only in baseline:\n{sym.only_in_baseline.T}\n")
@@ -26,6 +26,9 @@ if __name__ == "__main__":
         commands=[
             #context.cli_entrypoint,
             infer.cli_entrypoint,
+            infer.mmap_models_entrypoint,
+            infer.register_models_entrypoint,
+            infer.benchmark_entrypoint,
             #harness.cli_entrypoint,
             #dataset.cli_entrypoint,
             # symbols.cli_entrypoint,
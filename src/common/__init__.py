@@ -1,4 +1,4 @@
-from .storage import TypeCollection
+from .storage import TypeCollection, MergedAnnotations
 from .annotations import TypeAnnotationRemover, ApplyTypeAnnotationsVisitor
 
 from .ast_helper import (
@@ -11,6 +11,7 @@ from . import schemas
 
 __all__ = [
     "TypeCollection",
+    "MergedAnnotations",
     "TypeAnnotationRemover",
     "ApplyTypeAnnotationsVisitor",
     "generate_qname_ssas_for_file",
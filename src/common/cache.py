@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import pathlib
+import pickle
+import sys
+import tempfile
+import typing
+from typing import Generic, Optional
+
+
+T = typing.TypeVar("T")
+
+
+def cache_root() -> pathlib.Path:
+    if root := os.getenv("MDTI4PY_CACHE"):
+        return pathlib.Path(root)
+    return pathlib.Path.home() / ".cache" / "mdti4py"
+
+
+def content_hash(*parts: str | bytes) -> str:
+    """Hash of the given parts, e.g. source code. Parts are delimited by their lengths,
+    so that ("ab", "c") and ("a", "bc") differ"""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode() if isinstance(part, str) else part
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class DiskCache(Generic[T]):
+    """Persistent cache of artifacts that depend on source code only, e.g. static analyses,
+    shared between tools and runs. Entries are pickled under their key, which should be
+    a content_hash of everything the artifact depends on; bump the version whenever the
+    producer changes, e.g. to that of the library that computes the artifacts"""
+
+    def __init__(self, namespace: str, version: str, root: Optional[pathlib.Path] = None) -> None:
+        self.folder = (root or cache_root()) / namespace / version
+
+    def path(self, key: str) -> pathlib.Path:
+        return self.folder / key[:2] / f"{key}.pkl"
+
+    def get(self, key: str) -> Optional[T]:
+        path = self.path(key)
+        try:
+            with path.open("rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Truncated or stale entries are recomputed
+            print(f"WARNING: Discarding cache entry {path} - {e}", file=sys.stderr)
+            path.unlink(missing_ok=True)
+            return None
+
+    def put(self, key: str, value: T) -> None:
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Written under a temporary name first, so that concurrent readers never see partial entries
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception as e:
+            pathlib.Path(tmp).unlink(missing_ok=True)
+            print(f"WARNING: Could not cache {path} - {e}", file=sys.stderr)
@@ -1,5 +1,8 @@
+import heapq
+import itertools
 import operator
 import pathlib
+import typing
 
 import pandas as pd
 import pandera.typing as pt
@@ -19,7 +22,19 @@ def write_context_vectors(df: pt.DataFrame[ContextSymbolSchema], project: pathli
     cpath = context_vector_path(project)
     cpath.parent.mkdir(parents=True, exist_ok=True)
 
-    df.to_csv(cpath, index=False, header=list(ContextSymbolSchema.to_schema().columns))
+    # Additional columns, e.g. the rank of the annotations, are retained after the schema's
+    columns = list(ContextSymbolSchema.to_schema().columns)
+    columns += [c for c in df.columns if c not in columns]
+    df.to_csv(cpath, index=False, columns=columns)
+
+
+def append_context_vectors(df: pt.DataFrame[ContextSymbolSchema], project: pathlib.Path) -> None:
+    """Append to the context vectors stored at the given project, e.g. for incremental writes.
+    The caller is responsible for appending frames with the same columns"""
+    cpath = context_vector_path(project)
+    columns = list(ContextSymbolSchema.to_schema().columns)
+    columns += [c for c in df.columns if c not in columns]
+    df.to_csv(cpath, mode="a", index=False, columns=columns, header=not cpath.is_file())
 
 
 def read_context_vectors(project: pathlib.Path) -> pt.DataFrame[ContextSymbolSchema]:
@@ -35,29 +50,174 @@ def read_context_vectors(project: pathlib.Path) -> pt.DataFrame[ContextSymbolSch
     return df.pipe(pt.DataFrame[ContextSymbolSchema])
 
 
+def ground_truth_path(project: pathlib.Path) -> pathlib.Path:
+    return project / ".ground-truth.csv"
+
+
+def write_ground_truth(df: pt.DataFrame[TypeCollectionSchema], project: pathlib.Path) -> None:
+    df.to_csv(
+        ground_truth_path(project),
+        index=False,
+        columns=list(TypeCollectionSchema.to_schema().columns),
+    )
+
+
+def read_ground_truth(project: pathlib.Path) -> pt.DataFrame[TypeCollectionSchema]:
+    # Only annotations may be missing
+    df = pd.read_csv(
+        ground_truth_path(project),
+        converters={"category": lambda c: TypeCollectionCategory[c]},
+        keep_default_na=False,
+        na_values={TypeCollectionSchema.anno: [""]},
+    )
+    return df.pipe(pt.DataFrame[TypeCollectionSchema])
+
+
 def inferred_path(project: pathlib.Path) -> pathlib.Path:
     return project / ".inferred.csv"
 
 
+# Order in which inferred symbols are persisted; allows for k-way merges over
+# multiple stored outputs without loading them into memory entirely
+SYMBOL_ORDER = [InferredSchema.file, InferredSchema.category, InferredSchema.qname_ssa]
+
+
+def sort_symbols(df: pd.DataFrame) -> pd.DataFrame:
+    # Categories are enums, which are not orderable; compare them by name instead.
+    # Stable sorting retains the order of topn predictions per symbol
+    return df.sort_values(
+        by=SYMBOL_ORDER, key=lambda col: col.astype(str), kind="stable", ignore_index=True
+    )
+
+
+def _inferred_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Optional columns, e.g. score, are persisted as missing for tools that lack them
+    return df.reindex(columns=list(InferredSchema.to_schema().columns))
+
+
 def write_inferred(df: pt.DataFrame[InferredSchema], project: pathlib.Path) -> None:
     ipath = inferred_path(project)
-    df.to_csv(
+    _inferred_columns(sort_symbols(df)).to_csv(ipath, index=False)
+
+
+def append_inferred(df: pt.DataFrame[InferredSchema], project: pathlib.Path) -> None:
+    """Append to the inferred types stored at the given project, e.g. for incremental writes.
+    The caller is responsible for appending in SYMBOL_ORDER"""
+    ipath = inferred_path(project)
+    _inferred_columns(df).to_csv(
         ipath,
+        mode="a",
         index=False,
-        header=InferredSchema.to_schema().columns,
+        header=not ipath.is_file(),
     )
 
 
 def read_inferred(
-    inpath: pathlib.Path, tool: str, removed: list[TypeCollectionCategory]
+    inpath: pathlib.Path,
+    tool: str,
+    removed: list[TypeCollectionCategory],
+    inferred: list[TypeCollectionCategory],
 ) -> pt.DataFrame[InferredSchema]:
-    outpath = inference_output_path(inpath, tool, removed)
+    outpath = inference_output_path(inpath, tool, removed, inferred)
     ipath = inferred_path(outpath)
     df = pd.read_csv(ipath, converters={"category": lambda c: TypeCollectionCategory[c]})
 
     return df.pipe(pt.DataFrame[InferredSchema])
 
 
+FileGroup = tuple[str, pt.DataFrame[InferredSchema]]
+
+
+def iter_inferred(
+    inpath: pathlib.Path,
+    tool: str,
+    removed: list[TypeCollectionCategory],
+    inferred: list[TypeCollectionCategory],
+    chunksize: int = 2**16,
+) -> typing.Iterator[FileGroup]:
+    """Lazily read inferred types, one file at a time.
+    Peak memory is bounded by the chunksize and the largest file, not the entire output"""
+    outpath = inference_output_path(inpath, tool, removed, inferred)
+    yield from iter_file_groups(inferred_path(outpath), chunksize=chunksize)
+
+
+def iter_file_groups(path: pathlib.Path, chunksize: int) -> typing.Iterator[FileGroup]:
+    previous: typing.Optional[str] = None
+    carry: typing.Optional[pd.DataFrame] = None
+
+    def ordered(file: str) -> str:
+        nonlocal previous
+        if previous is not None and file <= previous:
+            raise RuntimeError(
+                f"{path} is not sorted by {SYMBOL_ORDER}; {file} was found after {previous}"
+            )
+        previous = file
+        return file
+
+    for chunk in pd.read_csv(
+        path,
+        chunksize=chunksize,
+        converters={"category": lambda c: TypeCollectionCategory[c]},
+    ):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+
+        groups = list(chunk.groupby(by=InferredSchema.file, sort=False))
+        if not groups:
+            continue
+
+        # The last file may continue into the next chunk
+        *complete, (_, carry) = groups
+        for file, group in complete:
+            yield ordered(file), group.reset_index(drop=True).pipe(pt.DataFrame[InferredSchema])
+
+    if carry is not None:
+        file = carry[InferredSchema.file].iloc[0]
+        yield ordered(file), carry.reset_index(drop=True).pipe(pt.DataFrame[InferredSchema])
+
+
+def iter_file_batches(
+    path: pathlib.Path, rows: int
+) -> typing.Iterator[pt.DataFrame[InferredSchema]]:
+    """Inferred types of whole files, batched until a batch holds at least the given rows"""
+    batch = list[pd.DataFrame]()
+    size = 0
+    for _, group in iter_file_groups(path, chunksize=rows):
+        batch.append(group)
+        size += len(group)
+        if size >= rows:
+            yield pd.concat(batch, ignore_index=True).pipe(pt.DataFrame[InferredSchema])
+            batch, size = [], 0
+    if batch:
+        yield pd.concat(batch, ignore_index=True).pipe(pt.DataFrame[InferredSchema])
+
+
+def group_by_file(df: pd.DataFrame) -> typing.Iterator[tuple[str, pd.DataFrame]]:
+    """Split an in-memory DataFrame into the same file order as iter_inferred"""
+    for file, group in df.groupby(by=InferredSchema.file, sort=True):
+        yield str(file), group.reset_index(drop=True)
+
+
+def merge_file_groups(
+    streams: typing.Mapping[str, typing.Iterable[tuple[str, pd.DataFrame]]]
+) -> typing.Iterator[tuple[str, dict[str, pd.DataFrame]]]:
+    """k-way merge over per-file streams that are sorted by file.
+    Yields each file alongside the frames of all streams that contain said file"""
+
+    def tagged(
+        key: str, stream: typing.Iterable[tuple[str, pd.DataFrame]]
+    ) -> typing.Iterator[tuple[str, str, pd.DataFrame]]:
+        for file, group in stream:
+            yield file, key, group
+
+    merged = heapq.merge(
+        *(tagged(key, stream) for key, stream in streams.items()),
+        key=operator.itemgetter(0),
+    )
+    for file, groups in itertools.groupby(merged, key=operator.itemgetter(0)):
+        yield file, {key: group for _, key, group in groups}
+
+
 def inference_output_path(
     inpath: pathlib.Path,
     tool: str,
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import contextlib
+import itertools
+import os
+import pathlib
+import pickle
+import sys
+import tempfile
+import traceback
+import typing
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Sequence
+
+import tqdm
+
+from utils import worker_count
+
+
+T = typing.TypeVar("T")
+R = typing.TypeVar("R")
+S = typing.TypeVar("S")
+
+
+# Work below this many bytes of source code is done in-process, as spawning workers costs more
+IN_PROCESS_BELOW = 64 * 1024
+
+# Tasks are batched into about as many chunks per worker, so that large files balance out
+CHUNKS_PER_WORKER = 4
+
+# Chunks in flight per worker when results are consumed as they arrive; the next chunk is only
+# submitted once one is done, so that results do not pile up behind a slow consumer
+IN_FLIGHT_PER_WORKER = 2
+
+
+# Stage state of the current worker process, read and unpickled on its first chunk of a stage
+_stage: tuple[Optional[int], Any] = (None, None)
+
+
+class _Failure(typing.NamedTuple):
+    # Formatted in the worker, as exceptions need not be picklable
+    traceback: str
+
+
+def _attempt(fn: Callable[[S, T], R], state: S, task: T) -> R | _Failure:
+    try:
+        return fn(state, task)
+    except Exception:
+        return _Failure(traceback.format_exc())
+
+
+def _run_chunk(
+    fn: Callable[[S, T], R], stage: int, payload: pathlib.Path, chunk: list[T]
+) -> list[R | _Failure]:
+    global _stage
+    if _stage[0] != stage:
+        _stage = (stage, pickle.loads(payload.read_bytes()))
+    return [_attempt(fn, _stage[1], task) for task in chunk]
+
+
+def chunk_by_size(sizes: Sequence[int], jobs: int) -> list[range]:
+    """Split consecutive tasks into chunks of about equal total size"""
+    target = max(1, sum(sizes) // (jobs * CHUNKS_PER_WORKER))
+
+    chunks, start, total = list[range](), 0, 0
+    for index, size in enumerate(sizes):
+        total += size
+        if total >= target:
+            chunks.append(range(start, index + 1))
+            start, total = index + 1, 0
+    if start < len(sizes):
+        chunks.append(range(start, len(sizes)))
+    return chunks
+
+
+class WorkerPool:
+    """Worker processes shared by every stage that runs over a project, e.g. annotation removal,
+    the application of each top-n prediction and type collection.
+    Workers are spawned on first use and kept alive until the pool is closed;
+    state of a stage, such as a codemod, is pickled once to a file, which each worker reads
+    on its first chunk of the stage; chunks only carry their tasks"""
+
+    def __init__(self, jobs: Optional[int] = None) -> None:
+        self.jobs = max(1, jobs or worker_count() or 1)
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._stages = itertools.count()
+
+    def map(
+        self,
+        fn: Callable[[S, T], R],
+        state: S,
+        tasks: Sequence[T],
+        sizes: Optional[Sequence[int]] = None,
+        desc: Optional[str] = None,
+        on_failure: Optional[Callable[[T], R]] = None,
+    ) -> list[R]:
+        """Compute fn(state, task) for every task, in order. fn must be a module-level function
+        (or method), as it is sent to workers by reference. sizes estimate the cost of
+        each task, e.g. the length of a file; by default, all tasks are of equal cost.
+        Should fn raise, or its worker die, the task's result is on_failure(task), computed
+        in this process; without on_failure, the stage is aborted instead"""
+        results: list[Any] = [None] * len(tasks)
+        for chunk, chunk_results in self._iter_chunks(fn, state, tasks, sizes, desc, on_failure):
+            for index, result in zip(chunk, chunk_results):
+                results[index] = result
+        return results
+
+    def imap_unordered(
+        self,
+        fn: Callable[[S, T], R],
+        state: S,
+        tasks: Sequence[T],
+        sizes: Optional[Sequence[int]] = None,
+        desc: Optional[str] = None,
+        on_failure: Optional[Callable[[T], R]] = None,
+    ) -> typing.Iterator[list[R]]:
+        """Like map, but yields the results of each chunk of tasks as soon as it is done,
+        in order of completion. At most IN_FLIGHT_PER_WORKER chunks per worker are submitted
+        or done but not yet consumed, which bounds memory by these chunks rather than all results"""
+        for _, results in self._iter_chunks(fn, state, tasks, sizes, desc, on_failure):
+            yield results
+
+    def _iter_chunks(
+        self,
+        fn: Callable[[S, T], R],
+        state: S,
+        tasks: Sequence[T],
+        sizes: Optional[Sequence[int]],
+        desc: Optional[str],
+        on_failure: Optional[Callable[[T], R]],
+    ) -> typing.Iterator[tuple[range, list[R]]]:
+        sizes = sizes if sizes is not None else [1] * len(tasks)
+        assert len(sizes) == len(tasks)
+
+        def resolve(index: int, result: R | _Failure) -> R:
+            if not isinstance(result, _Failure):
+                return result
+            if on_failure is None:
+                raise RuntimeError(f"Task {index} failed:\n{result.traceback}")
+            print(f"WARNING: Task {index} failed:\n{result.traceback}", file=sys.stderr)
+            return on_failure(tasks[index])
+
+        with tqdm.tqdm(total=len(tasks), desc=desc, disable=desc is None) as pbar:
+            if self._in_process(sizes):
+                for index, task in enumerate(tasks):
+                    yield range(index, index + 1), [resolve(index, _attempt(fn, state, task))]
+                    pbar.update()
+                return
+
+            stage = next(self._stages)
+            fd, name = tempfile.mkstemp(prefix=f"stage-{stage}-", suffix=".pickle")
+            payload = pathlib.Path(name)
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump(state, file)
+            try:
+                yield from self._run_stage(fn, stage, payload, tasks, sizes, pbar, resolve)
+            finally:
+                payload.unlink(missing_ok=True)
+
+    def _run_stage(
+        self,
+        fn: Callable[[S, T], R],
+        stage: int,
+        payload: pathlib.Path,
+        tasks: Sequence[T],
+        sizes: Sequence[int],
+        pbar: tqdm.tqdm,
+        resolve: Callable[[int, R | _Failure], R],
+    ) -> typing.Iterator[tuple[range, list[R]]]:
+        chunks = iter(chunk_by_size(sizes, self.jobs))
+
+        # Tasks of chunks that were in flight when a worker died, e.g. by the OOM killer;
+        # these are rerun one by one without any others, so that the culprit can be told
+        suspects = collections.deque[int]()
+
+        # Chunk, the executor that computes it and whether it runs alone, by future
+        pending = dict[
+            concurrent.futures.Future[list[R | _Failure]],
+            tuple[range, concurrent.futures.ProcessPoolExecutor, bool],
+        ]()
+
+        def submit(chunk: range, alone: bool = False) -> None:
+            args = (_run_chunk, fn, stage, payload, [tasks[i] for i in chunk])
+            executor = self._executor_or_new()
+            try:
+                future = executor.submit(*args)
+            except BrokenProcessPool:
+                # Broke before any of its futures were seen to fail
+                self._discard(executor)
+                executor = self._executor_or_new()
+                future = executor.submit(*args)
+            pending[future] = (chunk, executor, alone)
+
+        def top_up() -> None:
+            if suspects:
+                if not pending:
+                    index = suspects.popleft()
+                    submit(range(index, index + 1), alone=True)
+                return
+            while len(pending) < self.jobs * IN_FLIGHT_PER_WORKER:
+                if (chunk := next(chunks, None)) is None:
+                    break
+                submit(chunk)
+
+        top_up()
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                chunk, executor, alone = pending.pop(future)
+                try:
+                    results = future.result()
+                except BrokenProcessPool:
+                    self._discard(executor)
+                    if alone:
+                        results = [_Failure("Worker died while running the task")]
+                    else:
+                        suspects.extend(chunk)
+                        continue
+                finally:
+                    # Keep workers busy while the consumer handles this chunk
+                    top_up()
+
+                pbar.update(len(chunk))
+                yield chunk, [resolve(i, result) for i, result in zip(chunk, results)]
+
+    def _in_process(self, sizes: Sequence[int]) -> bool:
+        return self.jobs == 1 or len(sizes) <= 1 or sum(sizes) < IN_PROCESS_BELOW
+
+    def _executor_or_new(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs)
+        return self._executor
+
+    def _discard(self, broken: concurrent.futures.ProcessPoolExecutor) -> None:
+        # A broken executor fails all of its futures and accepts no further tasks;
+        # it is replaced once, not for every future that it failed
+        if self._executor is broken:
+            broken.shutdown(wait=False)
+            self._executor = None
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> WorkerPool:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+_project_pool: Optional[WorkerPool] = None
+
+
+@contextlib.contextmanager
+def project_pool(jobs: Optional[int] = None) -> typing.Iterator[WorkerPool]:
+    """Share a single WorkerPool between all stages run inside this context"""
+    global _project_pool
+    assert _project_pool is None, "A project-scoped pool is already active"
+
+    with WorkerPool(jobs) as pool:
+        _project_pool = pool
+        try:
+            yield pool
+        finally:
+            _project_pool = None
+
+
+@contextlib.contextmanager
+def shared_pool(jobs: Optional[int] = None) -> typing.Iterator[WorkerPool]:
+    """The project-scoped pool if active; otherwise, a pool for the duration of this context"""
+    if _project_pool is not None:
+        yield _project_pool
+    else:
+        with WorkerPool(jobs) as pool:
+            yield pool
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import enum
+from typing import Optional
 
 import pandera as pa
 import pandera.typing as pt
@@ -21,6 +22,11 @@ class SymbolSchema(pa.SchemaModel):
     qname_ssa: pt.Series[str] = pa.Field()
 
 
+class SymbolIndexSchema(SymbolSchema):
+    # Stable per project; allows for joining on integers instead of the above strings
+    symbol: pt.Series[int] = pa.Field(ge=0, unique=True)
+
+
 class TypeCollectionSchema(SymbolSchema):
     anno: pt.Series[str] = pa.Field(nullable=True, coerce=True)
 
@@ -32,6 +38,9 @@ class InferredSchema(TypeCollectionSchema):
     method: pt.Series[str] = pa.Field()
     topn: pt.Series[int] = pa.Field(ge=1)
 
+    # Confidence of the inferring tool in its prediction, if it provides one
+    score: Optional[pt.Series[float]] = pa.Field(nullable=True, ge=0.0, le=1.0, coerce=True)
+
 
 # InferredSchemaColumns = list(InferredSchema.to_schema().columns.keys())
 
@@ -21,6 +21,7 @@ import pandera.typing as pt
 
 from .ast_helper import _stringify, generate_qname_ssas_for_project
 from .schemas import (
+    SymbolSchema,
     TypeCollectionCategory,
     TypeCollectionSchema,
 )
@@ -116,7 +117,7 @@ class TypeCollection:
     @staticmethod
     def to_libcst_annotations(
         collection: TypeCollection | pt.DataFrame[TypeCollectionSchema],
-        baseline: pt.DataFrame[TypeCollectionSchema],
+        baseline: pt.DataFrame[SymbolSchema],
     ) -> Annotations:
         """Create a LibCST Annotations object from the provided DataFrame.
         NOTE: The keys of this Annotations object are QNAME_SSAs, not QNAMEs!
@@ -127,7 +128,7 @@ class TypeCollection:
         # Add missing symbols and order by baseline
         ordered = pd.merge(
             left=df,
-            right=baseline.drop(columns=["anno"]),
+            right=baseline.drop(columns=["anno"], errors="ignore"),
             how="right",
             on=[
                 TypeCollectionSchema.file,
@@ -266,3 +267,119 @@ class TypeCollection:
 
     def merge_into(self, other: TypeCollection) -> None:
         self.update(other.df)
+
+
+class MergedAnnotations:
+    """Annotations of the same symbols across repositories, in long format.
+    Symbols are shared between repositories and referred to by their integer code,
+    i.e. their position in `symbols`; repositories are categorical"""
+
+    REPOSITORY = "repository"
+    SYMBOL = "symbol"
+
+    _SYMBOL_KEYS = [
+        TypeCollectionSchema.file,
+        TypeCollectionSchema.category,
+        TypeCollectionSchema.qname,
+        TypeCollectionSchema.qname_ssa,
+    ]
+
+    def __init__(self) -> None:
+        self.symbols = pd.DataFrame(columns=MergedAnnotations._SYMBOL_KEYS)
+        self._frames: list[pd.DataFrame] = []
+        self._annotations: pd.DataFrame | None = None
+
+    @staticmethod
+    def from_collections(
+        collections: list[tuple[pathlib.Path, TypeCollection]]
+    ) -> MergedAnnotations:
+        merged = MergedAnnotations()
+        for repo, collection in collections:
+            merged.add(repo.name, collection)
+        return merged
+
+    @property
+    def repositories(self) -> list[str]:
+        return [frame[MergedAnnotations.REPOSITORY].iloc[0] for frame in self._frames]
+
+    @property
+    def annotations(self) -> pd.DataFrame:
+        """(repository, symbol, anno) for every repository"""
+        if self._annotations is None:
+            repositories = self.repositories
+            frames = [
+                frame.assign(
+                    repository=pd.Categorical(
+                        frame[MergedAnnotations.REPOSITORY], categories=repositories
+                    )
+                )
+                for frame in self._frames
+            ]
+            self._annotations = (
+                pd.concat(frames, ignore_index=True)
+                if frames
+                else pd.DataFrame(
+                    {
+                        MergedAnnotations.REPOSITORY: pd.Categorical([], categories=[]),
+                        MergedAnnotations.SYMBOL: pd.Series([], dtype=int),
+                        TypeCollectionSchema.anno: pd.Series([], dtype=object),
+                    }
+                )
+            )
+        return self._annotations
+
+    def add(self, repository: str, collection: TypeCollection | pd.DataFrame) -> None:
+        """Add a repository's annotations; only symbols that are new to
+        this instance are assigned codes, existing repositories remain untouched"""
+        assert repository not in self.repositories, f"{repository} has already been added"
+        df = collection.df if isinstance(collection, TypeCollection) else collection
+
+        codes = self._symbol_codes(df)
+        unknown = codes.isna()
+        if unknown.any():
+            new_symbols = df.loc[unknown.to_numpy(), MergedAnnotations._SYMBOL_KEYS]
+            new_symbols = new_symbols.drop_duplicates(ignore_index=True)
+            self.symbols = pd.concat([self.symbols, new_symbols], ignore_index=True)
+            codes = self._symbol_codes(df)
+
+        self._frames.append(
+            pd.DataFrame(
+                {
+                    MergedAnnotations.REPOSITORY: repository,
+                    MergedAnnotations.SYMBOL: codes.astype(int).to_numpy(),
+                    TypeCollectionSchema.anno: df[TypeCollectionSchema.anno].to_numpy(),
+                }
+            )
+        )
+        self._annotations = None
+
+    def _symbol_codes(self, df: pd.DataFrame) -> pd.Series:
+        keyed = pd.merge(
+            left=df[MergedAnnotations._SYMBOL_KEYS],
+            right=self.symbols.rename_axis(MergedAnnotations.SYMBOL).reset_index(),
+            how="left",
+            on=MergedAnnotations._SYMBOL_KEYS,
+        )
+        return keyed[MergedAnnotations.SYMBOL]
+
+    def symbol_categories(self) -> pd.Series:
+        """Category of each annotation, looked up by symbol code"""
+        categories = self.symbols[TypeCollectionSchema.category].map(str).to_numpy()
+        return pd.Series(
+            categories[self.annotations[MergedAnnotations.SYMBOL].to_numpy()],
+            index=self.annotations.index,
+            name=TypeCollectionSchema.category,
+        )
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """Long format with symbols spelled out"""
+        return pd.merge(
+            left=self.annotations,
+            right=self.symbols.rename_axis(MergedAnnotations.SYMBOL).reset_index(),
+            how="left",
+            on=MergedAnnotations.SYMBOL,
+        ).drop(columns=MergedAnnotations.SYMBOL)
+
+    def write(self, path: str | pathlib.Path) -> None:
+        self.df.to_csv(path, sep="\t", index=False)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import enum
+import pathlib
+import sys
+import traceback
+import typing
+from typing import Optional
+
+import libcst
+from libcst import codemod, helpers, metadata
+
+from . import cache, pool
+
+
+class _Outcome(enum.Enum):
+    SUCCESS = enum.auto()
+    SKIP = enum.auto()
+    FAILURE = enum.auto()
+
+
+def _transform(
+    state: tuple[codemod.Codemod, metadata.FullRepoManager], file_and_code: tuple[str, str]
+) -> tuple[str, str, _Outcome, int]:
+    transform, manager = state
+    filename, code = file_and_code
+
+    modpkg = helpers.calculate_module_and_package(str(manager.root_path), filename=filename)
+    transform.context = codemod.CodemodContext(
+        filename=filename,
+        full_module_name=modpkg.name,
+        full_package_name=modpkg.package,
+        metadata_manager=manager,
+    )
+
+    try:
+        transformed = transform.transform_module(libcst.parse_module(code))
+    except codemod.SkipFile:
+        return filename, code, _Outcome.SKIP, len(transform.context.warnings)
+    except Exception:
+        print(f"Failed to transform {filename}:\n{traceback.format_exc()}", file=sys.stderr)
+        return filename, code, _Outcome.FAILURE, len(transform.context.warnings)
+
+    return filename, transformed.code, _Outcome.SUCCESS, len(transform.context.warnings)
+
+
+class VirtualProject:
+    """The Python sources of a project held in memory as {relative path: code}.
+    Codemods are chained on these sources without touching the disk;
+    write them out with `materialize` for stages that require a real tree"""
+
+    def __init__(self, root: pathlib.Path, sources: dict[pathlib.Path, str]) -> None:
+        self.root = root
+        self.sources = sources
+        self._content_hash: Optional[str] = None
+
+    @staticmethod
+    def read(root: pathlib.Path, subset: Optional[set[pathlib.Path]] = None) -> VirtualProject:
+        if subset is None:
+            files = [
+                pathlib.Path(f).relative_to(root) for f in codemod.gather_files([str(root)])
+            ]
+        else:
+            files = sorted(s for s in subset if (root / s).is_file())
+
+        sources = dict[pathlib.Path, str]()
+        for file in files:
+            try:
+                sources[file] = (root / file).read_text()
+            except UnicodeDecodeError as e:
+                print(f"WARNING: Could not decode {file} - {e}", file=sys.stderr)
+
+        return VirtualProject(root, sources)
+
+    def content_hash(self) -> str:
+        """Identifies the project by its sources, e.g. to key caches of static analyses"""
+        if self._content_hash is None:
+            self._content_hash = cache.content_hash(
+                *(part for file, code in self.sources.items() for part in (str(file), code))
+            )
+        return self._content_hash
+
+    def filenames(self) -> list[str]:
+        return [str(self.root / file) for file in self.sources]
+
+    def transform(
+        self, transform: codemod.Codemod, jobs: Optional[int] = None
+    ) -> tuple[VirtualProject, codemod.ParallelTransformResult]:
+        """Apply the codemod to every source, akin to parallel_exec_transform_with_prettyprint.
+        Returns the transformed project; this one remains unchanged"""
+        if not self.sources:
+            return self, codemod.ParallelTransformResult(
+                successes=0, failures=0, skips=0, warnings=0
+            )
+
+        filenames = self.filenames()
+        manager = metadata.FullRepoManager(
+            repo_root_dir=str(self.root),
+            paths=filenames,
+            # Transforms may collect types internally, which requires fully qualified names
+            providers={metadata.FullyQualifiedNameProvider}
+            | set(transform.get_inherited_dependencies()),
+        )
+        manager.resolve_cache()
+
+        tasks = list(zip(filenames, self.sources.values()))
+        with pool.shared_pool(jobs) as workers:
+            results = workers.map(
+                _transform,
+                (transform, manager),
+                tasks,
+                sizes=[len(code) for code in self.sources.values()],
+                on_failure=lambda task: (*task, _Outcome.FAILURE, 0),
+            )
+
+        outcomes = [outcome for _, _, outcome, _ in results]
+        transformed = VirtualProject(
+            self.root,
+            {
+                pathlib.Path(filename).relative_to(self.root): code
+                for filename, code, _, _ in results
+            },
+        )
+        return transformed, codemod.ParallelTransformResult(
+            successes=outcomes.count(_Outcome.SUCCESS),
+            failures=outcomes.count(_Outcome.FAILURE),
+            skips=outcomes.count(_Outcome.SKIP),
+            warnings=sum(warnings for *_, warnings in results),
+        )
+
+    def materialize(self, root: pathlib.Path) -> None:
+        """Write all sources into the given folder, replacing rather than truncating
+        existing files, as these may be linked (see utils.mirror)"""
+        for file, code in self.sources.items():
+            path = root / file
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.is_file() or path.is_symlink():
+                path.unlink()
+            path.write_text(code)
+
+    def rooted_at(self, root: pathlib.Path) -> VirtualProject:
+        return VirtualProject(root, self.sources)
+
+    def __iter__(self) -> typing.Iterator[tuple[pathlib.Path, str]]:
+        return iter(self.sources.items())
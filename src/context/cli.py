@@ -2,17 +2,13 @@ import enum
 import pathlib
 
 import click
-from libcst import codemod
-
-from src.common.schemas import InferredSchema, TypeCollectionCategory
+from src.common.schemas import ContextSymbolSchema, InferredSchema, TypeCollectionCategory
 from src.common import output
 
 from src.context.features import RelevantFeatures
 from src.infer.inference import Inference, factory, SUPPORTED_TOOLS
-from src.infer.insertion import TypeAnnotationApplierTransformer
-from utils import format_parallel_exec_result, scratchpad, worker_count
 
-from .visitors import generate_context_vectors_for_project
+from .visitors import iter_context_vectors_for_project, with_annotations
 
 
 class Purpose(str, enum.Enum):
@@ -128,24 +124,26 @@ def cli_entrypoint(
     if remove_ret_annos:
         removed.append(TypeCollectionCategory.CALLABLE_RETURN)
 
-    inferred = output.read_inferred(inpath, tool.method(), removed=removed)
-
-    for _, topx in inferred.groupby(by=InferredSchema.topn):
-        with scratchpad(inpath) as sc:
-            print(f"Using {sc} as a scratchpad for context gathering!")
-            result = codemod.parallel_exec_transform_with_prettyprint(
-                transform=TypeAnnotationApplierTransformer(
-                    codemod.CodemodContext(), annotations=topx
-                ),
-                files=codemod.gather_files([str(sc)]),
-                jobs=worker_count(),
-                repo_root=str(sc),
-            )
-        print(format_parallel_exec_result(action="Annotation Application", result=result))
-
-        df = generate_context_vectors_for_project(features, repo=sc)
-        print(f"Feature set size: {df.shape}; writing to {output.context_vector_path(inpath)}")
-        output.write_context_vectors(df, inpath)
+    inferred = output.read_inferred(inpath, tool.method(), removed=removed, inferred=removed)
+
+    ranks = list(inferred.groupby(by=InferredSchema.topn))
+
+    # Structural features do not depend on annotations, so they are computed once for
+    # the project; each rank's annotations are joined onto them instead of being applied.
+    # Batches are written as soon as workers finish, rather than held until the end
+    cpath = output.context_vector_path(inpath)
+    cpath.unlink(missing_ok=True)
+
+    rows = 0
+    for structural in iter_context_vectors_for_project(features, inpath):
+        for topn, topx in ranks:
+            df = with_annotations(structural, topx, features).assign(topn=topn)
+            output.append_context_vectors(df, inpath)
+            rows += len(df)
+
+    if not rows:
+        output.write_context_vectors(ContextSymbolSchema.example(size=0), inpath)
+    print(f"Feature set size: {rows} rows; written to {cpath}")
 
 
 if __name__ == "__main__":
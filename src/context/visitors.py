@@ -1,5 +1,7 @@
 import builtins
 import collections
+import itertools
+import os
 import pathlib
 import typing
 from typing import Union, Optional
@@ -7,13 +9,11 @@ from typing import Union, Optional
 import libcst
 import pandas as pd
 import pandera.typing as pt
-import tqdm
 from libcst import metadata, codemod as c, matchers as m
-from libcst.helpers import get_full_name_for_node_or_raise
+from libcst.helpers import calculate_module_and_package, get_full_name_for_node_or_raise
 from pandas._libs import missing
-from tqdm.contrib.concurrent import process_map
 
-from src.common import visitors
+from src.common import TypeCollection, pool, visitors
 from src.common._traversal import T
 from src.common.ast_helper import _stringify, generate_qname_ssas_for_file
 from src.common.metadata import anno4inst
@@ -21,39 +21,176 @@ from src.common.schemas import (
     ContextCategory,
     ContextSymbolSchema,
     TypeCollectionCategory,
+    TypeCollectionSchema,
 )
+from src.common.virtual import VirtualProject
 from src.context.features import RelevantFeatures
-from utils import worker_count
+from src.symbols.collector import TypeCollectorVisitor
 
 
-def generate_context_vectors_for_project(
+_BUILTIN_NAMES = frozenset(dir(builtins)) | frozenset(dir(typing))
+
+
+_ContextRecords = list[tuple]
+
+
+def _context_records(
+    features: RelevantFeatures, repo_and_file: tuple[pathlib.Path, str]
+) -> _ContextRecords:
+    # Files are read by the workers; only rows are sent back, not the source code
+    repo, file = repo_and_file
+    try:
+        with open(file) as f:
+            code = f.read()
+        df = generate_context_vectors_for_file(features, repo, (pathlib.Path(file), code))
+    except Exception as e:
+        print(f"WARNING: Could not create context vectors for {file} - {e}")
+        return []
+
+    columns = list(ContextSymbolSchema.to_schema().columns)
+    return list(df[columns].itertuples(index=False, name=None))
+
+
+def iter_context_vectors_for_project(
     features: RelevantFeatures, repo: pathlib.Path
-) -> pt.DataFrame[ContextSymbolSchema]:
+) -> typing.Iterator[pt.DataFrame[ContextSymbolSchema]]:
+    """Context vectors of the project, as batches in no particular order"""
     repo_root = str(repo)
     assert repo.is_dir(), f"Path to folder is required, got {repo_root}"
     files = c.gather_files([repo_root], include_stubs=False)
 
-    file2code = {
-        file: open(file).read()
-        for file in tqdm.tqdm(files, desc=f"Loading files for dataset creating of {repo_root}")
-    }
+    columns = list(ContextSymbolSchema.to_schema().columns)
+    with pool.shared_pool() as workers:
+        for batch in workers.imap_unordered(
+            _context_records,
+            features,
+            [(repo, file) for file in files],
+            sizes=[os.path.getsize(file) for file in files],
+            desc=f"Creating dataset for {repo_root}",
+            on_failure=lambda _: [],
+        ):
+            records = list(itertools.chain.from_iterable(batch))
+            if records:
+                yield pd.DataFrame.from_records(records, columns=columns).pipe(
+                    pt.DataFrame[ContextSymbolSchema]
+                )
+
+
+def generate_context_vectors_for_project(
+    features: RelevantFeatures, repo: pathlib.Path
+) -> pt.DataFrame[ContextSymbolSchema]:
+    batches = list(iter_context_vectors_for_project(features, repo))
+    if not batches:
+        return ContextSymbolSchema.example(size=0)
+    return pd.concat(batches, ignore_index=True).pipe(pt.DataFrame[ContextSymbolSchema])
+
 
-    collector = generate_context_vectors_for_file(
-        features=features, repo_root=repo_root, files=files
+def _collect_types_and_context(
+    state: tuple[RelevantFeatures, metadata.FullRepoManager], file_and_code: tuple[str, str]
+) -> tuple[pt.DataFrame[TypeCollectionSchema], pt.DataFrame[ContextSymbolSchema]]:
+    features, manager = state
+    filename, code = file_and_code
+
+    modpkg = calculate_module_and_package(str(manager.root_path), filename=filename)
+    context = c.CodemodContext(
+        filename=filename,
+        metadata_manager=manager,
+        full_module_name=modpkg.name,
+        full_package_name=modpkg.package,
     )
-    collections = process_map(
-        collector,
-        file2code.items(),
-        total=len(file2code),
-        desc=f"Creating dataset for {repo_root}",
-        position=0,
-        max_workers=worker_count()
+    types = TypeCollectorVisitor.strict(context=context)
+    contexts = ContextVectorVisitor(
+        filepath=str(pathlib.Path(filename).relative_to(manager.root_path)), features=features
     )
 
-    if not collections:
-        return ContextSymbolSchema.example(size=0)
+    # One parse per file; metadata that both visitors depend on, e.g. scopes, is resolved once
+    try:
+        wrapper = metadata.MetadataWrapper(
+            libcst.parse_module(code),
+            unsafe_skip_copy=True,
+            cache=manager.get_cache_for_path(filename),
+        )
+        types.collect(wrapper)
+        wrapper.visit(contexts)
+    except Exception as e:
+        print(f"WARNING: {e}")
+        return TypeCollectionSchema.example(size=0), ContextSymbolSchema.example(size=0)
+
+    return types.collection.df, contexts.build()
+
+
+def generate_types_and_context_vectors(
+    features: RelevantFeatures, project: VirtualProject
+) -> tuple[TypeCollection, pt.DataFrame[ContextSymbolSchema]]:
+    """Build the type collection and the context vectors of a project in the same pass"""
+    filenames = project.filenames()
+    manager = metadata.FullRepoManager(
+        repo_root_dir=str(project.root),
+        paths=filenames,
+        providers={metadata.FullyQualifiedNameProvider},
+    )
+    manager.resolve_cache()
+
+    with pool.shared_pool() as workers:
+        results = workers.map(
+            _collect_types_and_context,
+            (features, manager),
+            list(zip(filenames, project.sources.values())),
+            sizes=[len(code) for code in project.sources.values()],
+            desc=f"Collecting types and context vectors from {project.root}",
+            on_failure=lambda _: (
+                TypeCollectionSchema.example(size=0),
+                ContextSymbolSchema.example(size=0),
+            ),
+        )
+
+    if not results:
+        return TypeCollection.empty(), ContextSymbolSchema.example(size=0)
+
+    types, contexts = zip(*results)
+    return (
+        TypeCollection(
+            pd.concat(types, ignore_index=True).pipe(pt.DataFrame[TypeCollectionSchema])
+        ),
+        pd.concat(contexts, ignore_index=True).pipe(pt.DataFrame[ContextSymbolSchema]),
+    )
+
+
+def with_annotations(
+    structural: pt.DataFrame[ContextSymbolSchema],
+    annotations: pt.DataFrame[TypeCollectionSchema],
+    features: RelevantFeatures,
+) -> pt.DataFrame[ContextSymbolSchema]:
+    """Context vectors as if the annotations had been applied to the project the structural
+    vectors were created from. Only anno and builtin depend on annotations; other features
+    are retained. Existing annotations are kept, as they are not overwritten when applying"""
+    keys = [
+        ContextSymbolSchema.file,
+        ContextSymbolSchema.category,
+        ContextSymbolSchema.qname_ssa,
+    ]
+    applied = annotations[[*keys, TypeCollectionSchema.anno]].drop_duplicates(
+        subset=keys, keep="first"
+    )
+    # Normalised as TypeAnnotationApplierTransformer does before applying
+    applied = applied.assign(
+        anno=applied[TypeCollectionSchema.anno].str.removeprefix("builtins.")
+    )
+    merged = pd.merge(structural, applied, how="left", on=keys, suffixes=("", "_applied"))
+
+    anno = merged[ContextSymbolSchema.anno].fillna(merged[f"{TypeCollectionSchema.anno}_applied"])
+    if features.builtin:
+        # Same as ContextVectorVisitor.is_builtin, i.e. the name of a possibly subscripted type
+        names = anno.str.split("[", n=1).str[0].str.rsplit(".", n=1).str[-1]
+        builtin = names.isin(_BUILTIN_NAMES).astype(int)
     else:
-        return pd.concat(collections, ignore_index=True).pipe(pt.DataFrame[ContextSymbolSchema])
+        builtin = 0
+
+    return (
+        merged.drop(columns=f"{TypeCollectionSchema.anno}_applied")
+        .assign(anno=anno, builtin=builtin)
+        .pipe(pt.DataFrame[ContextSymbolSchema])
+    )
 
 
 def generate_context_vectors_for_file(
@@ -417,7 +554,7 @@ class ContextVectorVisitor(
         else:
             ty = annotation.attr.value
 
-        return ty in dir(builtins) or ty in dir(typing)
+        return ty in _BUILTIN_NAMES
 
     @m.visit(m.FunctionDef() | m.ClassDef())
     def _enter_scope(self, node: Union[libcst.FunctionDef, libcst.ClassDef]) -> None:
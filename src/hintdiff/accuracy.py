@@ -1,5 +1,6 @@
 import pathlib
 
+import numpy as np
 import pandas as pd
 import pandera as pa
 import pandera.typing as pt
@@ -10,31 +11,35 @@ from . import hintstat
 
 class AccuracySchema(pa.SchemaModel):
     repository: pt.Series[str] = pa.Field()
-    # match: pt.Series[bool] = pa.Field()
+    category: pt.Series[str] = pa.Field()
     accuracy: pt.Series[float] = pa.Field(ge=0.0, le=1.0)
 
 
 class Accuracy(hintstat.StatisticImpl):
-    ident = "accuracy"
+    ident = hintstat.Statistic.ACCURACY
 
     def __init__(self, reference: pathlib.Path) -> None:
         self._reference = reference
         super().__init__()
 
-    def forward(self, *, repos: list[pathlib.Path], annotations: MergedAnnotations) -> pd.DataFrame:
-        reference_ser = self._read_anno_for_repo(self._reference, annotations)
-
-        repository = list()
-        accuracy = list()
-
-        for repo in repos:
-            repository.append(repo.name)
-
-            annos = self._read_anno_for_repo(repo=repo, annotations=annotations)
-            acc = (reference_ser.fillna("-") == annos.fillna("-")).sum() / len(annos)
-
-            accuracy.append(float(acc))
+    def forward(
+        self, *, repos: list[pathlib.Path], annotations: MergedAnnotations
+    ) -> pt.DataFrame[AccuracySchema]:
+        annos = annotations.annotations
+
+        # The reference's annotation of every merged symbol; missing annotations and symbols
+        # absent from the reference are both "-", and match each other as they did before
+        reference = annos.loc[annos[MergedAnnotations.REPOSITORY] == self._reference.name]
+        expected = np.full(len(annotations.symbols), "-", dtype=object)
+        expected[reference[MergedAnnotations.SYMBOL].to_numpy()] = (
+            reference["anno"].fillna("-").to_numpy()
+        )
 
-        return pd.DataFrame({"repository": repository, "accuracy": accuracy}).pipe(
-            pt.DataFrame[AccuracySchema]
+        hits = annos["anno"].fillna("-").to_numpy() == expected[annos[MergedAnnotations.SYMBOL]]
+        counts = self.union_counts(
+            annotations,
+            repos,
+            hits=pd.Series(hits, index=annos.index),
+            absent_hits=expected == "-",
         )
+        return self.ratios(counts, name="accuracy").pipe(pt.DataFrame[AccuracySchema])
@@ -1,17 +1,14 @@
 import os
 import pathlib
-import sys
 import typing
 
 import click
 from libcst.codemod import _cli as cstcli
-import libcst.codemod as codemod
 import pandas as pd
 
 
 from src.common import MergedAnnotations
-from src.symbols.collector import TypeCollectorVisitor
-from utils import worker_count
+from src.symbols.collector import build_type_collections
 
 from . import coverage, hintstat
 
@@ -39,7 +36,10 @@ from . import coverage, hintstat
     "-s",
     "--statistic",
     type=click.Choice(choices=list(hintstat.Statistic.__members__.keys()), case_sensitive=False),
-    callback=lambda ctx, _, val: {hintstat.Statistic.COVERAGE: coverage.Coverage()}[val],
+    callback=lambda ctx, _, vals: [
+        {hintstat.Statistic.COVERAGE: coverage.Coverage()}[hintstat.Statistic[val.upper()]]
+        for val in vals
+    ],
     multiple=True,
     required=False,
     help="Compute relevant statistics and store alongside .tsv",
@@ -55,6 +55,8 @@ def cli_entrypoint(
 
     for stat in statistic or []:
         statout = stat.forward(repos=repo, annotations=merged_annotations)
+        statpath = output.with_suffix(f".{str(stat.ident).lower()}.tsv")
+        statout.to_csv(statpath, sep="\t", index=False)
 
 
 def _collect(
@@ -66,8 +68,6 @@ def _collect(
         roots
     ), "Your project roots must all be named differently!"
 
-    results = list()
-
     # sanity check: these roots must be directories containing the same file tree
     files_per_root = dict()
     for root in roots:
@@ -84,27 +84,9 @@ def _collect(
 
     assert deviating.empty, f"Differing folder structures, cannot compute hintdiff!"
 
-    for root in roots:
-        visitor = TypeCollectorVisitor.strict(context=codemod.CodemodContext())
-        result = codemod.parallel_exec_transform_with_prettyprint(
-            transform=visitor,
-            files=cstcli.gather_files([str(root)]),
-            jobs=worker_count(),
-            repo_root=str(root),
-        )
-
-        print(
-            f"Finished codemodding {result.successes + result.skips + result.failures} files!",
-            file=sys.stderr,
-        )
-        print(
-            f" - Collected symbol from {result.successes} files successfully.",
-            file=sys.stderr,
-        )
-        print(f" - Skipped {result.skips} files.", file=sys.stderr)
-        print(f" - Failed to collect from {result.failures} files.", file=sys.stderr)
-        print(f" - {result.warnings} warnings were generated.", file=sys.stderr)
-        results.append(visitor.collection)
+    # All roots are collected by the same pool of workers, each returning the frame
+    # of a single file, which are then reduced into one collection per root
+    results = build_type_collections(roots)
 
     paths_with_collections = [(r, col) for r, col in zip(roots, results)]
     merged_annotations = MergedAnnotations.from_collections(paths_with_collections)
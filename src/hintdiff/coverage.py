@@ -11,6 +11,7 @@ from .hintstat import Statistic, StatisticImpl
 
 class CoverageSchema(pa.SchemaModel):
     repository: pt.Series[str] = pa.Field()
+    category: pt.Series[str] = pa.Field()
     coverage: pt.Series[float] = pa.Field(ge=0.0, le=1.0)
 
 
@@ -20,16 +21,7 @@ class Coverage(StatisticImpl):
     def forward(
         self, *, repos: list[pathlib.Path], annotations: MergedAnnotations
     ) -> pt.DataFrame[CoverageSchema]:
-
-        repository = list()
-        coverage = list()
-        for repo in repos:
-            repository.append(repo.name)
-
-            annos = self._read_anno_for_repo(repo=repo, annotations=annotations)
-            normed = annos.notna().value_counts(normalize=True)[True]
-            coverage.append(float(normed))
-
-        return pd.DataFrame({"repository": repository, "coverage": coverage}).pipe(
-            pt.DataFrame[CoverageSchema]
-        )
+        # Counts for all repositories and categories at once; totals are derived from these.
+        # Symbols that a repository lacks count as not covered
+        counts = self.union_counts(annotations, repos, hits=annotations.annotations["anno"].notna())
+        return self.ratios(counts, name="coverage").pipe(pt.DataFrame[CoverageSchema])
@@ -3,7 +3,9 @@ import enum
 import pathlib
 
 from src.common import MergedAnnotations
+from src.common.schemas import TypeCollectionSchema
 
+import numpy as np
 import pandas as pd
 
 
@@ -16,8 +18,79 @@ class Statistic(enum.Enum):
 
 
 class StatisticImpl:
-    def _read_anno_for_repo(self, repo: pathlib.Path, annotations: MergedAnnotations) -> pd.Series:
-        return annotations.df[f"{repo.name}_anno"]
+    TOTAL = "total"
+
+    @staticmethod
+    def ratios(counts: pd.DataFrame, name: str) -> pd.DataFrame:
+        """Turn per (repository, category) `sum` and `size` counts into ratios,
+        adding a TOTAL category per repository that is derived from said counts"""
+        totals = counts.groupby(level=0, observed=True).sum()
+        totals.index = pd.MultiIndex.from_product(
+            [totals.index, [StatisticImpl.TOTAL]], names=counts.index.names
+        )
+
+        both = pd.concat([counts, totals])
+        return pd.DataFrame(
+            {
+                "repository": both.index.get_level_values(0).astype(str),
+                "category": both.index.get_level_values(1).astype(str),
+                name: (both["sum"] / both["size"]).astype(float).to_numpy(),
+            }
+        )
+
+    @staticmethod
+    def union_counts(
+        annotations: MergedAnnotations,
+        repos: list[pathlib.Path],
+        hits: pd.Series,
+        absent_hits: np.ndarray | None = None,
+    ) -> pd.DataFrame:
+        """Per (repository, category) `sum` of hits and `size` over the union of all merged
+        symbols, as when repositories were merged into columns. `hits` is aligned with the
+        annotations; a symbol that a repository lacks is a hit if `absent_hits` is true
+        for its code, and a miss otherwise"""
+        annos = annotations.annotations
+        names = [repo.name for repo in repos if repo.name in annotations.repositories]
+        selected = annos[MergedAnnotations.REPOSITORY].isin(names).to_numpy()
+
+        rows = annos.loc[selected, [MergedAnnotations.REPOSITORY, MergedAnnotations.SYMBOL]]
+        rows = rows.assign(category=annotations.symbol_categories()[selected], hit=hits[selected])
+        if absent_hits is None:
+            absent_hits = np.zeros(len(annotations.symbols), dtype=bool)
+
+        keys = [MergedAnnotations.REPOSITORY, "category"]
+        counts = rows.groupby(by=keys, observed=True)["hit"].agg(["sum", "size"])
+
+        # Distinct symbols that each repository has, and how many of these would be hits if absent
+        present = rows.drop_duplicates(
+            subset=[MergedAnnotations.REPOSITORY, MergedAnnotations.SYMBOL]
+        )
+        present = present.assign(absent_hit=absent_hits[present[MergedAnnotations.SYMBOL]])
+        present = present.groupby(by=keys, observed=True).agg(
+            symbols=("absent_hit", "size"), absent_hits=("absent_hit", "sum")
+        )
+
+        categories = annotations.symbols[TypeCollectionSchema.category].map(str).to_numpy()
+        union = pd.DataFrame({"category": categories, "absent_hit": absent_hits}).groupby(
+            by="category"
+        )["absent_hit"].agg(["size", "sum"])
+
+        index = pd.MultiIndex.from_product([names, union.index], names=keys)
+        counts = counts.reindex(index, fill_value=0)
+        present = present.reindex(index, fill_value=0)
+        union = union.reindex(index.get_level_values("category"))
+
+        return pd.DataFrame(
+            {
+                "sum": counts["sum"].to_numpy()
+                + union["sum"].to_numpy()
+                - present["absent_hits"].to_numpy(),
+                "size": counts["size"].to_numpy()
+                + union["size"].to_numpy()
+                - present["symbols"].to_numpy(),
+            },
+            index=index,
+        )
 
     @property
     @abc.abstractmethod
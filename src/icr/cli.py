@@ -1,4 +1,3 @@
-import itertools
 import pathlib
 import shutil
 import sys
@@ -7,19 +6,29 @@ from typing import Optional
 import click
 
 import utils
-from src.common import factory
 from src.common import output
-from src.common import TypeCollectionSchema
-from src.infer.inference.hit4py import HiTyper
+from src.common.pool import project_pool
+from src.common.schemas import InferredSchema, SymbolIndexSchema, TypeCollectionCategory
+from src.common.virtual import VirtualProject
 
 from src.icr.resolution import ConflictResolution
-from src.infer.inference import MyPy, PyreInfer, PyreQuery, Type4Py, _TypeWriter
 
 from libcst import codemod
 
-from src.icr.resolution import SubtypeVoting, Delegation
+from src.icr.resolution import SubtypeVoting, Delegation, ConfidenceVoting
 from src.infer.insertion import TypeAnnotationApplierTransformer
-from src.symbols.collector import build_type_collection
+from src.symbols.index import load_symbol_index
+
+
+# Resolved types that are applied to the project at once, rounded up to whole files
+APPLY_BATCH_ROWS = 2**16
+
+
+ENGINES: dict[str, type[ConflictResolution]] = {
+    SubtypeVoting.__name__.lower(): SubtypeVoting,
+    Delegation.__name__.lower(): Delegation,
+    ConfidenceVoting.__name__.lower(): ConfidenceVoting,
+}
 
 
 @click.command(
@@ -29,36 +38,28 @@ from src.symbols.collector import build_type_collection
 @click.option(
     "-s",
     "--static",
-    type=click.Choice(
-        choices=[MyPy.__name__.lower(), PyreInfer.__name__.lower(), PyreQuery.__name__.lower()],
-        case_sensitive=False,
-    ),
+    type=str,
     required=False,
     multiple=True,
-    help="Static inference methods",
+    help="Static inference methods, named as their stored inference outputs are (e.g. mypy)",
 )
 @click.option(
     "-p",
     "--prob",
-    type=click.Choice(
-        choices=[HiTyper.__name__.lower(), _TypeWriter.__name__.lower(), Type4Py.__name__.lower()],
-        case_sensitive=False,
-    ),
+    type=str,
     required=False,
     multiple=True,
-    help="Probabilistic inference methods",
+    help="Probabilistic inference methods, named as their stored inference outputs are "
+    "(e.g. type4pyN1)",
 )
 @click.option(
     "-e",
     "--engine",
     type=click.Choice(
-        choices=[
-            SubtypeVoting.__name__.lower(),
-            Delegation.__name__.lower(),
-        ],
+        choices=list(ENGINES.keys()),
         case_sensitive=False,
     ),
-    callback=lambda ctx, _, value: factory._engine_factory(value) if value else None,
+    callback=lambda ctx, _, value: ENGINES[value.lower()] if value else None,
     required=False,
     help="How differing inferences should be resolved",
 )
@@ -69,6 +70,20 @@ from src.symbols.collector import build_type_collection
     required=True,
     help="(Original) Project to intelligently infer over",
 )
+@click.option(
+    "--remove",
+    type=click.Choice([str(c) for c in TypeCollectionCategory]),
+    help="Annotations that were removed during inference",
+    multiple=True,
+    required=True,
+)
+@click.option(
+    "--infer",
+    type=click.Choice([str(c) for c in TypeCollectionCategory]),
+    help="Annotation categories that were inferred",
+    multiple=True,
+    required=True,
+)
 @click.option(
     "-o",
     "--persist",
@@ -94,6 +109,8 @@ def cli_entrypoint(
     prob: list[str],
     engine: Optional[type[ConflictResolution]],
     inpath: pathlib.Path,
+    remove: list[str],
+    infer: list[str],
     persist: bool,
     overwrite: bool,
     remove_annos: bool,
@@ -107,31 +124,38 @@ def cli_entrypoint(
             engine is not None
         ), "When specifiying multiple inference methods, an engine must be specified!"
 
-    tool2outputdir = {
-        tool: output.inference_output_path(inpath, tool) for tool in itertools.chain(static, prob)
-    }
+    removing = list(map(TypeCollectionCategory.__getitem__, remove))
+    inferring = list(map(TypeCollectionCategory.__getitem__, infer))
 
-    tool2icr = {
-        tool: output.read_inferred(output_dir) for tool, output_dir in tool2outputdir.items()
-    }
+    # Inferred types are streamed file by file from their stored outputs, so that
+    # resolving over many tools is bounded by the largest file, not the entire project;
+    # only the symbol index, i.e. keys without any types, is held for the entire project
+    def stream(tool: str):
+        return output.iter_inferred(inpath, tool, removed=removing, inferred=inferring)
 
+    tool = "+".join((*static, *prob))
+    baseline = load_symbol_index(inpath)
     if engine is not None:
-        baseline = build_type_collection(root=inpath).df
-
-        eng = engine(
-            project=inpath, reference=baseline.drop(columns=[TypeCollectionSchema.anno], axis=1)
+        eng = engine(project=inpath, reference=baseline)
+        resolved = eng.resolve_stream(
+            static={s: stream(s) for s in static},
+            probabilistic={p: stream(p) for p in prob},
         )
 
-        tool = "+".join(tool2icr.keys())
-        inference_df = eng.resolve(tool2icr)
-
     else:
-        tool, icr_df = next((tool, df) for tool, df in tool2icr.items())
+        resolved = (
+            utils.top_preds_only(icr_df).assign(method=tool, topn=1) for _, icr_df in stream(tool)
+        )
 
-        inference_df = utils.top_preds_only(icr_df)
+    if not persist:
+        for inference_df in resolved:
+            print(inference_df)
+        print("Not persisting; exiting...")
 
-    if persist:
-        outdir = output.inference_output_path(original, tool=tool)
+    else:
+        outdir = output.inference_output_path(
+            original, tool=tool, removed=removing, inferred=inferring
+        )
         if outdir.is_dir() and not overwrite:
             raise RuntimeError(
                 f"--overwrite was not given! Refraining from deleting already existing {outdir=}"
@@ -140,22 +164,37 @@ def cli_entrypoint(
         elif outdir.is_dir() and overwrite:
             shutil.rmtree(outdir)
 
-        # outdir.mkdir(exist_ok=True, parents=True)
-        shutil.copytree(inpath, outdir, ignore_dangling_symlinks=True, symlinks=True)
+        utils.mirror(inpath, outdir)
 
-        output.write_inferred(inference_df, outdir)
+        for inference_df in resolved:
+            output.append_inferred(inference_df, outdir)
         print(f"Inferred types have been stored at {outdir}")
 
         print("Applying annotations to code")
-        # Retain top1 for annotating
-        result = codemod.parallel_exec_transform_with_prettyprint(
-            transform=TypeAnnotationApplierTransformer(
-                context=codemod.CodemodContext(), annotations=inference_df
-            ),
-            jobs=utils.worker_count(),
-            files=codemod.gather_files([str(outdir)]),
-            repo_root=str(outdir),
-        )
+        # Resolved types are read back in batches of whole files, so that applying them is
+        # bounded like resolving them; the files of each batch are read, and annotated
+        # in parallel, against their slice of the symbol index alone
+        result = codemod.ParallelTransformResult(successes=0, failures=0, skips=0, warnings=0)
+        with project_pool(utils.worker_count()):
+            for batch in output.iter_file_batches(
+                output.inferred_path(outdir), rows=APPLY_BATCH_ROWS
+            ):
+                files = set(batch[InferredSchema.file])
+                project = VirtualProject.read(outdir, subset=set(map(pathlib.Path, files)))
+                annotated, batch_result = project.transform(
+                    TypeAnnotationApplierTransformer(
+                        context=codemod.CodemodContext(),
+                        annotations=batch,
+                        baseline=baseline[baseline[SymbolIndexSchema.file].isin(files)],
+                    )
+                )
+                annotated.materialize(outdir)
+                result = codemod.ParallelTransformResult(
+                    successes=result.successes + batch_result.successes,
+                    failures=result.failures + batch_result.failures,
+                    skips=result.skips + batch_result.skips,
+                    warnings=result.warnings + batch_result.warnings,
+                )
         print(
             f"Finished codemodding {result.successes + result.skips + result.failures} files!",
             file=sys.stderr,
@@ -168,10 +207,6 @@ def cli_entrypoint(
         print(f" - Failed to collect from {result.failures} files.", file=sys.stderr)
         print(f" - {result.warnings} warnings were generated.", file=sys.stderr)
 
-    else:
-        print(inference_df)
-        print("Not persisting; exiting...")
-
     if remove_annos:
         shutil.rmtree(inpath)
 
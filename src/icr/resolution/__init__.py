@@ -1,13 +1,15 @@
 from ._base import ConflictResolution, BatchResolution, IterativeResolution
 from .voting import SubtypeVoting
 from .delegation import Delegation, DelegationOrder
+from .confidence import ConfidenceVoting
 
 
 __all__ = [
-    "ConflictResolution"
+    "ConflictResolution",
     "BatchResolution",
     "IterativeResolution",
     "SubtypeVoting",
     "Delegation",
-    "DelegationOrder"
+    "DelegationOrder",
+    "ConfidenceVoting",
 ]
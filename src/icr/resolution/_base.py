@@ -1,14 +1,17 @@
 import abc
 from dataclasses import dataclass
 import pathlib
+import typing
 from typing import Optional
 
-from src.common import (
+from src.common import output
+from src.common.schemas import (
+    SymbolIndexSchema,
     SymbolSchema,
     InferredSchema,
-    InferredSchemaColumns,
     TypeCollectionCategory,
 )
+from src.symbols.index import symbol_index, with_symbol_ids
 
 import pandas as pd
 from pandas._libs import missing
@@ -23,63 +26,106 @@ class Metadata:
     qname_ssa: str
 
 
+# Tools to their inferred types, streamed file by file in output.SYMBOL_ORDER
+ToolStreams = typing.Mapping[str, typing.Iterable[output.FileGroup]]
+
+
 class ConflictResolution(abc.ABC):
     UNRESOLVED = missing.NA
 
+    # Reserved stream name for the reference symbols during k-way merges
+    _REFERENCE = "__reference__"
+
     @property
     @abc.abstractmethod
     def method(self) -> str:
         ...
 
     def __init__(
-        self, project: pathlib.Path, reference: pt.DataFrame[SymbolSchema]
+        self,
+        project: pathlib.Path,
+        reference: pt.DataFrame[SymbolIndexSchema] | pt.DataFrame[SymbolSchema],
     ) -> None:
         super().__init__()
         self.project = project
-        self.reference = reference
+
+        # Prefer the index persisted at dataset ingestion; number symbols ad-hoc otherwise
+        if SymbolIndexSchema.symbol not in reference.columns:
+            reference = symbol_index(reference)
+        self.reference: pt.DataFrame[SymbolIndexSchema] = reference
 
     def resolve(
         self,
         static: Optional[pt.DataFrame[InferredSchema]] = None,
         dynamic: Optional[pt.DataFrame[InferredSchema]] = None,
         probabilistic: Optional[pt.DataFrame[InferredSchema]] = None,
+    ) -> pt.DataFrame[InferredSchema]:
+        return self._resolve_against(self.reference, static, dynamic, probabilistic)
+
+    def resolve_stream(
+        self,
+        static: Optional[ToolStreams] = None,
+        dynamic: Optional[ToolStreams] = None,
+        probabilistic: Optional[ToolStreams] = None,
+    ) -> typing.Iterator[pt.DataFrame[InferredSchema]]:
+        """Resolve file by file over streams of inferred types, e.g. from output.iter_inferred.
+        Only a single file of each tool is held in memory at once; the reference is the one
+        structure held whole, as its symbols are numbered over all sources of the project"""
+        kinds: dict[str, str] = {}
+        streams: dict[str, typing.Iterable[tuple[str, pd.DataFrame]]] = {
+            ConflictResolution._REFERENCE: output.group_by_file(self.reference)
+        }
+        for kind, tools in (
+            ("static", static),
+            ("dynamic", dynamic),
+            ("probabilistic", probabilistic),
+        ):
+            for tool, stream in (tools or {}).items():
+                assert tool not in streams, f"{tool} was given more than once"
+                kinds[tool] = kind
+                streams[tool] = stream
+
+        for _, tool2df in output.merge_file_groups(streams):
+            # Symbols that are not in the reference are discarded during resolution anyway
+            if (reference := tool2df.pop(ConflictResolution._REFERENCE, None)) is None:
+                continue
+
+            bykind: dict[str, list[pd.DataFrame]] = {}
+            for tool, df in tool2df.items():
+                bykind.setdefault(kinds[tool], []).append(df)
+
+            yield self._resolve_against(
+                reference,
+                **{
+                    kind: pd.concat(dfs, ignore_index=True).pipe(pt.DataFrame[InferredSchema])
+                    for kind, dfs in bykind.items()
+                },
+            )
+
+    def _resolve_against(
+        self,
+        reference: pt.DataFrame[SymbolIndexSchema],
+        static: Optional[pt.DataFrame[InferredSchema]] = None,
+        dynamic: Optional[pt.DataFrame[InferredSchema]] = None,
+        probabilistic: Optional[pt.DataFrame[InferredSchema]] = None,
     ) -> pt.DataFrame[InferredSchema]:
         # Defaulting
-        static = (
-            static
-            if static is not None
-            else pt.DataFrame[InferredSchema](columns=InferredSchemaColumns)
-        )
-        dynamic = (
-            dynamic
-            if dynamic is not None
-            else pt.DataFrame[InferredSchema](columns=InferredSchemaColumns)
+        static = static if static is not None else InferredSchema.example(size=0)
+        dynamic = dynamic if dynamic is not None else InferredSchema.example(size=0)
+        probabilistic = probabilistic if probabilistic is not None else InferredSchema.example(size=0)
+
+        # Discover common symbols; from hereon, symbols are identified by their ID
+        static_safe: pt.DataFrame[InferredSchema] = with_symbol_ids(static, reference).pipe(
+            pt.DataFrame[InferredSchema]
         )
-        probabilistic = (
-            probabilistic
-            if probabilistic is not None
-            else pt.DataFrame[InferredSchema](columns=InferredSchemaColumns)
+        dynamic_safe: pt.DataFrame[InferredSchema] = with_symbol_ids(dynamic, reference).pipe(
+            pt.DataFrame[InferredSchema]
         )
-
-        # Discover common symbols
-        how = "right"
-        common_cols = [
-            InferredSchema.file,
-            InferredSchema.category,
-            InferredSchema.qname_ssa,
-        ]
-
-        static_safe: pt.DataFrame[InferredSchema] = pd.merge(
-            left=static, right=self.reference, how=how, on=common_cols
-        ).pipe(pt.DataFrame[InferredSchema])
-        dynamic_safe: pt.DataFrame[InferredSchema] = pd.merge(
-            left=dynamic, right=self.reference, how=how, on=common_cols
-        ).pipe(pt.DataFrame[InferredSchema])
-        probabilistic_safe: pt.DataFrame[InferredSchema] = pd.merge(
-            left=probabilistic, right=self.reference, how=how, on=common_cols
+        probabilistic_safe: pt.DataFrame[InferredSchema] = with_symbol_ids(
+            probabilistic, reference
         ).pipe(pt.DataFrame[InferredSchema])
 
-        inferred = self._resolve(static_safe, dynamic_safe, probabilistic_safe)
+        inferred = self._resolve(reference, static_safe, dynamic_safe, probabilistic_safe)
 
         # Readd symbols with unresolved that were removed due to no
         # tool making a prediction
@@ -88,19 +134,20 @@ class ConflictResolution(abc.ABC):
             for inf in [static_safe, dynamic_safe, probabilistic_safe]
             if len(inf)
         ]
-        readd = self.reference.assign(
-            method="+".join(method_names), anno=BatchResolution.UNRESOLVED
+        readd = reference.assign(
+            method="+".join(method_names), anno=BatchResolution.UNRESOLVED, topn=1
         )
 
         return (
             pd.concat([inferred, readd], ignore_index=True)
-            .drop_duplicates(subset=list(self.reference.columns), keep="first")
+            .drop_duplicates(subset=SymbolIndexSchema.symbol, keep="first")
             .pipe(pt.DataFrame[InferredSchema])
         )
 
     @abc.abstractmethod
     def _resolve(
         self,
+        reference: pt.DataFrame[SymbolIndexSchema],
         static: pt.DataFrame[InferredSchema],
         dynamic: pt.DataFrame[InferredSchema],
         probabilistic: pt.DataFrame[InferredSchema],
@@ -113,6 +160,7 @@ class BatchResolution(ConflictResolution):
 
     def _resolve(
         self,
+        reference: pt.DataFrame[SymbolIndexSchema],
         static: pt.DataFrame[InferredSchema],
         dynamic: pt.DataFrame[InferredSchema],
         probabilistic: pt.DataFrame[InferredSchema],
@@ -145,28 +193,32 @@ class IterativeResolution(ConflictResolution):
 
     def _resolve(
         self,
+        reference: pt.DataFrame[SymbolIndexSchema],
         static: pt.DataFrame[InferredSchema],
         dynamic: pt.DataFrame[InferredSchema],
         probabilistic: pt.DataFrame[InferredSchema],
     ) -> pt.DataFrame[InferredSchema]:
         updates: list[pt.DataFrame[InferredSchema]] = []
 
-        for file, category, qname, qname_ssa in self.reference.itertuples(index=False):
-            _static = static[
-                (static[InferredSchema.file] == file)
-                & (static[InferredSchema.category] == category)
-                & (static[InferredSchema.qname_ssa] == qname_ssa)
-            ]
-            _dynamic = dynamic[
-                (dynamic[InferredSchema.file] == file)
-                & (dynamic[InferredSchema.category] == category)
-                & (dynamic[InferredSchema.qname_ssa] == qname_ssa)
-            ]
-            _probabilistic = probabilistic[
-                (probabilistic[InferredSchema.file] == file)
-                & (probabilistic[InferredSchema.category] == category)
-                & (probabilistic[InferredSchema.qname_ssa] == qname_ssa)
+        # Look up each symbol's predictions by its ID instead of comparing strings per symbol
+        frames = (static, dynamic, probabilistic)
+        by_symbol = [
+            dict(list(df.groupby(by=SymbolIndexSchema.symbol, sort=False))) for df in frames
+        ]
+
+        symbols = reference[
+            [
+                SymbolIndexSchema.file,
+                SymbolIndexSchema.category,
+                SymbolIndexSchema.qname,
+                SymbolIndexSchema.qname_ssa,
+                SymbolIndexSchema.symbol,
             ]
+        ]
+        for file, category, qname, qname_ssa, symbol in symbols.itertuples(index=False):
+            _static, _dynamic, _probabilistic = (
+                groups.get(symbol, df.iloc[:0]) for groups, df in zip(by_symbol, frames)
+            )
             _metadata = Metadata(
                 file=file, category=category, qname=qname, qname_ssa=qname_ssa
             )
@@ -198,11 +250,15 @@ class IterativeResolution(ConflictResolution):
                         "file": [_metadata.file],
                         "category": [_metadata.category],
                         "qname": [_metadata.qname],
+                        "qname_ssa": [_metadata.qname_ssa],
                         "anno": [ConflictResolution.UNRESOLVED],
+                        "topn": [1],
                     }
                 )
 
             assert len(update) == 1
-            updates.append(update)
+            updates.append(update.assign(symbol=symbol))
 
+        if not updates:
+            return InferredSchema.example(size=0)
         return pd.concat(updates, ignore_index=True).pipe(pt.DataFrame[InferredSchema])
@@ -0,0 +1,68 @@
+from ._base import BatchResolution
+from src.common.schemas import InferredSchema, SymbolIndexSchema
+
+import pandas as pd
+import pandera.typing as pt
+
+
+_SYMBOL_NAMES = [
+    InferredSchema.file,
+    InferredSchema.category,
+    InferredSchema.qname,
+    InferredSchema.qname_ssa,
+]
+
+
+class ConfidenceVoting(BatchResolution):
+    """Every prediction votes for its annotation with the tool's confidence in it;
+    tools without confidences vote by reciprocal rank, i.e. 1/topn.
+    The annotation with the largest sum of votes per symbol wins"""
+
+    method = "confidence-voting"
+
+    def forward(
+        self,
+        static: pt.DataFrame[InferredSchema],
+        dynamic: pt.DataFrame[InferredSchema],
+        probabilistic: pt.DataFrame[InferredSchema],
+    ) -> pt.DataFrame[InferredSchema]:
+        predictions = [df for df in (static, dynamic, probabilistic) if len(df)]
+        if not predictions:
+            return InferredSchema.example(size=0)
+
+        combined = pd.concat(predictions, ignore_index=True).dropna(
+            subset=InferredSchema.anno
+        )
+        if combined.empty:
+            return InferredSchema.example(size=0)
+
+        reciprocal_rank = 1 / combined[InferredSchema.topn]
+        if InferredSchema.score in combined.columns:
+            weights = combined[InferredSchema.score].fillna(reciprocal_rank)
+        else:
+            weights = reciprocal_rank
+
+        votes = (
+            combined.assign(score=weights)
+            .groupby(by=[SymbolIndexSchema.symbol, InferredSchema.anno], sort=False)
+            .agg(
+                **{name: (name, "first") for name in _SYMBOL_NAMES},
+                score=(InferredSchema.score, "sum"),
+                method=(InferredSchema.method, lambda ms: "+".join(ms.unique())),
+            )
+            .reset_index()
+        )
+
+        # Normalise votes into each symbol's share of the total confidence
+        votes[InferredSchema.score] /= votes.groupby(by=SymbolIndexSchema.symbol, sort=False)[
+            InferredSchema.score
+        ].transform("sum")
+
+        # Stable sorting breaks ties by order of appearance, i.e. static before probabilistic
+        return (
+            votes.sort_values(by=InferredSchema.score, ascending=False, kind="stable")
+            .drop_duplicates(subset=SymbolIndexSchema.symbol, keep="first")
+            .assign(topn=1)
+            .reset_index(drop=True)
+            .pipe(pt.DataFrame[InferredSchema])
+        )
@@ -1,7 +1,7 @@
 import pathlib
 
 from ._base import BatchResolution
-from src.common import InferredSchema, SymbolSchema
+from src.common.schemas import InferredSchema, SymbolIndexSchema, SymbolSchema
 
 import pandas as pd
 import pandera.typing as pt
@@ -21,7 +21,7 @@ class Delegation(BatchResolution):
     def __init__(
         self,
         project: pathlib.Path,
-        reference: pt.DataFrame[SymbolSchema],
+        reference: pt.DataFrame[SymbolIndexSchema] | pt.DataFrame[SymbolSchema],
         order: tuple[DelegationOrder, DelegationOrder, DelegationOrder],
     ) -> None:
         super().__init__(project, reference)
@@ -44,34 +44,24 @@ class Delegation(BatchResolution):
                 ordered.append(probabilistic)
 
         ordered = list(filter(len, ordered))
+        if not ordered:
+            return InferredSchema.example(size=0)
         ordered_df = pd.concat(ordered, ignore_index=True)
 
         # Remove all predictions where no prediction was made,
         # Then retain the first occurrence of every symbol with a hint in a given file
         covered = ordered_df.dropna(subset="anno").drop_duplicates(
-            subset=[
-                InferredSchema.file,
-                InferredSchema.category,
-                InferredSchema.qname_ssa,
-            ],
+            subset=SymbolIndexSchema.symbol,
             keep="first",
         )
 
         # If symbol is missing after dropping all that, that means all agents did not make a prediction for the symbol
         uniq_ordered = ordered_df.drop_duplicates(
-            subset=[
-                InferredSchema.file,
-                InferredSchema.category,
-                InferredSchema.qname_ssa,
-            ],
+            subset=SymbolIndexSchema.symbol,
             keep="first",
         )
         missing = pd.concat((covered, uniq_ordered), ignore_index=True).drop_duplicates(
-            subset=[
-                InferredSchema.file,
-                InferredSchema.category,
-                InferredSchema.qname_ssa,
-            ],
+            subset=SymbolIndexSchema.symbol,
             keep=False,
         )
         missing_method_tag = "+".join(o[InferredSchema.method].iloc[0] for o in ordered)
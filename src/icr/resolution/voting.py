@@ -4,7 +4,7 @@ from typing import Optional
 import pydoc
 
 from ._base import IterativeResolution, Metadata
-from src.common import InferredSchema
+from src.common.schemas import InferredSchema
 
 import pandera.typing as pt
 import pandas as pd
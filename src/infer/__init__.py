@@ -1,3 +1,9 @@
-from .cli import cli_entrypoint
+from .cli import cli_entrypoint, mmap_models_entrypoint, register_models_entrypoint
+from .benchmark import benchmark_entrypoint
 
-__all__ = ["cli_entrypoint"]
\ No newline at end of file
+__all__ = [
+    "cli_entrypoint",
+    "mmap_models_entrypoint",
+    "register_models_entrypoint",
+    "benchmark_entrypoint",
+]
@@ -0,0 +1,150 @@
+import dataclasses
+import pathlib
+import time
+
+import click
+import pandas as pd
+import pandera.typing as pt
+from libcst import codemod
+
+from src.common.annotations import TypeAnnotationRemover
+from src.common.pool import project_pool
+from src.common.schemas import InferredSchema, TypeCollectionSchema
+from src.common.virtual import VirtualProject
+from src.infer.inference import Inference, SUPPORTED_TOOLS, factory
+from src.infer.inference._base import DatasetFolderStructure
+from src.symbols.collector import strip_and_collect
+from utils import scratchpad, worker_count
+
+_SLOT = [InferredSchema.file, InferredSchema.category, InferredSchema.qname_ssa]
+
+
+@dataclasses.dataclass
+class ToolRun:
+    method: str
+    seconds: float
+    inferred: pt.DataFrame[InferredSchema]
+
+    def slots(self) -> int:
+        return len(self.inferred[_SLOT].drop_duplicates())
+
+
+def agreement(
+    baseline: pt.DataFrame[InferredSchema], candidate: pt.DataFrame[InferredSchema], topn: int
+) -> float:
+    """Share of the baseline's top-1 predictions that the candidate ranks within its top-n"""
+    top1 = baseline[
+        (baseline[InferredSchema.topn] == 1) & baseline[InferredSchema.anno].notna()
+    ][[*_SLOT, InferredSchema.anno]].drop_duplicates()
+    if top1.empty:
+        return float("nan")
+
+    candidates = candidate[
+        (candidate[InferredSchema.topn] <= topn) & candidate[InferredSchema.anno].notna()
+    ][[*_SLOT, InferredSchema.anno]].drop_duplicates()
+
+    matched = top1.merge(candidates, on=[*_SLOT, InferredSchema.anno], how="left", indicator=True)
+    return float((matched["_merge"] == "both").mean())
+
+
+def accuracy(
+    inferred: pt.DataFrame[InferredSchema], ground_truth: pt.DataFrame[TypeCollectionSchema]
+) -> float:
+    """Share of the removed annotations that the tool predicts exactly at top-1"""
+    truth = ground_truth[ground_truth[TypeCollectionSchema.anno].notna()].assign(topn=1)
+    return agreement(truth, inferred, topn=1)
+
+
+def run_tool(tool: Inference, dataset: pathlib.Path) -> tuple[ToolRun, pd.DataFrame]:
+    """Infer over every project of the dataset after removing all of its annotations.
+    Only inference itself is timed; the tool's models are loaded beforehand"""
+    structure = DatasetFolderStructure.from_folderpath(dataset)
+
+    seconds = 0.0
+    inferred, ground_truths = list[pd.DataFrame](), list[pd.DataFrame]()
+    for project, subset in structure.test_set(dataset).items():
+        with scratchpad(project, python_only=True) as sc, project_pool(worker_count()):
+            stripped, ground_truth, _ = strip_and_collect(
+                VirtualProject.read(sc),
+                TypeAnnotationRemover(
+                    context=codemod.CodemodContext(), variables=True, parameters=True, rets=True
+                ),
+            )
+            stripped.materialize(sc)
+
+            start = time.perf_counter()
+            result = tool.infer(sc, project, subset)
+            seconds += time.perf_counter() - start
+
+        # Projects may share relative paths
+        inferred.append(result.assign(file=f"{project}/" + result[InferredSchema.file]))
+        ground_truths.append(
+            ground_truth.df.assign(
+                file=f"{project}/" + ground_truth.df[TypeCollectionSchema.file]
+            )
+        )
+
+    return (
+        ToolRun(tool.method(), seconds, pd.concat(inferred, ignore_index=True)),
+        pd.concat(ground_truths, ignore_index=True),
+    )
+
+
+@click.command(
+    name="benchmark",
+    help="Compare the throughput and predictions of a tool against those of a baseline tool",
+)
+@click.option(
+    "-b",
+    "--baseline",
+    type=click.Choice(choices=list(SUPPORTED_TOOLS), case_sensitive=False),
+    callback=lambda ctx, _, value: factory(value),
+    required=True,
+    help="Reference tool, e.g. type4pytop10",
+)
+@click.option(
+    "-c",
+    "--candidate",
+    type=click.Choice(choices=list(SUPPORTED_TOOLS), case_sensitive=False),
+    callback=lambda ctx, _, value: factory(value),
+    required=True,
+    help="Tool to compare, e.g. type4pyint8top10",
+)
+@click.option(
+    "-d",
+    "--dataset",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=pathlib.Path),
+    default=pathlib.Path("tests") / "resources" / "proj1",
+    show_default=True,
+    help="Dataset to iterate over (can also be a singular project!)",
+)
+@click.option("-n", "--topn", type=int, default=10, show_default=True, help="Rank for agreement")
+def benchmark_entrypoint(
+    baseline: type[Inference], candidate: type[Inference], dataset: pathlib.Path, topn: int
+) -> None:
+    # Both tools infer over the same ground truth
+    runs = list[ToolRun]()
+    for tool in (baseline, candidate):
+        run, ground_truth = run_tool(tool(), dataset)
+        runs.append(run)
+
+    reference, compared = runs
+    summary = pd.DataFrame(
+        [
+            {
+                "method": run.method,
+                "seconds": run.seconds,
+                "slots": run.slots(),
+                "slots/s": run.slots() / run.seconds if run.seconds else float("nan"),
+                "top-1 accuracy": accuracy(run.inferred, ground_truth),
+            }
+            for run in runs
+        ]
+    )
+    print(summary.to_string(index=False))
+
+    print(
+        f"{compared.method} agrees with the top-1 predictions of {reference.method} in "
+        f"{agreement(reference.inferred, compared.inferred, topn=1):.2%} of slots at top-1, "
+        f"and {agreement(reference.inferred, compared.inferred, topn=topn):.2%} at top-{topn}"
+    )
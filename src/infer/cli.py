@@ -9,13 +9,25 @@ import tqdm
 from src.common.annotations import TypeAnnotationRemover
 from src.common import output
 from src.common.schemas import TypeCollectionCategory, TypeCollectionSchema
+from src.common.pool import project_pool
+from src.common.virtual import VirtualProject
 from src.infer.inference._base import DatasetFolderStructure
 
 from src.infer.insertion import TypeAnnotationApplierTransformer
+from src.symbols.collector import strip_and_collect
 
-from utils import format_parallel_exec_result, scratchpad, top_preds_only, worker_count
+from utils import (
+    format_parallel_exec_result,
+    mirror,
+    scratchpad,
+    top_preds_only,
+    worker_count,
+)
 
 from .inference import Inference, factory, SUPPORTED_TOOLS
+from .inference import _registry
+from .inference._assets import convert_for_mmap
+from .inference._onnx import quantized_model
 
 from libcst import codemod
 
@@ -130,26 +142,28 @@ def cli_entrypoint(
             continue
 
         inpath = project
-        with scratchpad(inpath) as sc:
+        # Workers are shared by all stages over this project and shut down afterwards
+        with scratchpad(inpath, python_only=True) as sc, project_pool(worker_count()):
             print(f"Using {sc} as a scratchpad for inference!")
 
             if not (files := codemod.gather_files([str(sc)])):
                 print(f"Skipping {project}, no Python files found!")
                 continue
 
+            # Stripped sources are kept, as inference may mutate the scratchpad
+            stripped = VirtualProject.read(sc)
             if removing:
                 print(f"annotation removal flag provided, removing annotations on '{sc}'")
-                result = codemod.parallel_exec_transform_with_prettyprint(
-                    transform=TypeAnnotationRemover(
+                stripped, ground_truth, result = strip_and_collect(
+                    stripped,
+                    TypeAnnotationRemover(
                         context=codemod.CodemodContext(),
                         variables=TypeCollectionCategory.VARIABLE in removing,
                         parameters=TypeCollectionCategory.CALLABLE_PARAMETER in removing,
                         rets=TypeCollectionCategory.CALLABLE_RETURN in removing,
                     ),
-                    jobs=worker_count(),
-                    files=files,
-                    repo_root=str(sc),
                 )
+                stripped.materialize(sc)
                 print(format_parallel_exec_result(action="Annotation Removal", result=result))
 
             # Run inference task for hour before aborting
@@ -194,43 +208,69 @@ def cli_entrypoint(
             output.write_inferred(inferred, outdir)
             print(f"Inferred types have been stored at {outdir}")
 
-            if annotate:
-                # Copy original project
-                shutil.copytree(
-                    inpath, outdir, ignore_dangling_symlinks=True, symlinks=True, dirs_exist_ok=True
-                )
-
-                # Reremove annotations
-                result = codemod.parallel_exec_transform_with_prettyprint(
-                    transform=TypeAnnotationRemover(
-                        context=codemod.CodemodContext(),
-                        variables=TypeCollectionCategory.VARIABLE in removing,
-                        parameters=TypeCollectionCategory.CALLABLE_PARAMETER in removing,
-                        rets=TypeCollectionCategory.CALLABLE_RETURN in removing,
-                    ),
-                    jobs=worker_count(),
-                    files=codemod.gather_files([str(outdir)]),
-                    repo_root=str(outdir),
-                )
-
-                print(
-                    format_parallel_exec_result(
-                        action="Annotation Removal Preservation (in case inference mutated codebase)",
-                        result=result,
-                    )
-                )
+            if removing:
+                output.write_ground_truth(ground_truth.df, outdir)
+                print(f"Removed annotations have been stored at {output.ground_truth_path(outdir)}")
 
+            if annotate:
+                # Annotations are applied to the stripped sources from before inference,
+                # in case inference mutated the codebase; only the result is materialised
                 print(f"Applying Annotations to codebase at {outdir}")
-                result = codemod.parallel_exec_transform_with_prettyprint(
-                    transform=TypeAnnotationApplierTransformer(
+                annotated, result = stripped.transform(
+                    TypeAnnotationApplierTransformer(
                         codemod.CodemodContext(), top_preds_only(inferred)
                     ),
-                    files=codemod.gather_files([str(outdir)]),
-                    jobs=worker_count(),
-                    repo_root=str(outdir),
                 )
                 print(format_parallel_exec_result(action="Annotation Application", result=result))
 
+                mirror(inpath, outdir, exclude=annotated.sources.keys())
+                annotated.materialize(outdir)
+
+
+@click.command(
+    name="mmap-models",
+    help="Convert model assets in place, so that processes can memory-map and share them",
+)
+@click.option(
+    "-m",
+    "--models",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=pathlib.Path),
+    default=_registry.models_root,
+    show_default="$MDTI4PY_MODELS, or ./models",
+    help="Folder of pretrained models, e.g. models/type4py and models/typewriter",
+)
+def mmap_models_entrypoint(models: pathlib.Path) -> None:
+    for converted in convert_for_mmap(models):
+        print(f"Converted {converted}")
+
+
+@click.command(
+    name="register-models",
+    help="Prepare a model store for offline use: download TypeT5, convert assets into their "
+    "fast-loading formats and record their hashes in the store's manifest",
+)
+@click.option(
+    "-m",
+    "--models",
+    type=click.Path(file_okay=False, dir_okay=True, path_type=pathlib.Path),
+    default=_registry.models_root,
+    show_default="$MDTI4PY_MODELS, or ./models",
+    help="Model store, with the pretrained models of Type4Py, TypeWriter and Typilus",
+)
+@click.option("--fetch/--no-fetch", default=True, help="Download TypeT5 into the model store")
+def register_models_entrypoint(models: pathlib.Path, fetch: bool) -> None:
+    if fetch:
+        print(f"Downloaded TypeT5 to {_registry.fetch_typet5(models)}")
+
+    for converted in convert_for_mmap(models):
+        print(f"Converted {converted}")
+
+    if (type4py := models / "type4py" / "type4py_complete_model.onnx").is_file():
+        print(f"Quantized {type4py} to {quantized_model(type4py)}")
+
+    manifest = _registry.write_manifest(models)
+    print(f"Recorded {len(manifest)} assets in {models / _registry.MANIFEST}")
+
 
 if __name__ == "__main__":
     cli_entrypoint()
@@ -6,8 +6,8 @@ from .pyrequery import PyreQuery
 
 from .typewriter import TypeWriterTop10
 from .typilus import TypilusTop10
-from .t4py import Type4PyTop10
-from .tt5 import TypeT5Top10
+from .t4py import Type4PyTop10, Type4PyInt8Top10
+from .tt5 import TypeT5Top10, TypeT5FastTop10
 
 from .hit4py import HiType4PyTop10
 from .hitypilus import HiTypilusTop10
@@ -21,11 +21,13 @@ SUPPORTED_TOOLS: dict[str, type[Inference]] = {
 
     # ML Models
     Type4PyTop10.__name__.lower(): Type4PyTop10,
+    Type4PyInt8Top10.__name__.lower(): Type4PyInt8Top10,
     TypilusTop10.__name__.lower(): TypilusTop10,
     TypeWriterTop10.__name__.lower(): TypeWriterTop10,
 
     # Hybrid TypeT5
     TypeT5Top10.__name__.lower(): TypeT5Top10,
+    TypeT5FastTop10.__name__.lower(): TypeT5FastTop10,
 
     # Hybrid HiTyper integrations
     HiType4PyTop10.__name__.lower(): HiType4PyTop10,
@@ -45,6 +47,7 @@ __all__ = [
     "PyreQuery",
     "TypeWriterTop10",
     "Type4PyTop10",
+    "Type4PyInt8Top10",
     "HiType4PyTop10",
     "SUPPORTED_TOOLS",
     "factory",
@@ -1,15 +1,18 @@
 import logging
 import pathlib
+import typing
 from typing import Optional
 
 import libcst
+import pandas as pd
 import pandera.typing as pt
 from libcst import codemod
 from libcst.codemod import visitors
 
 import utils
-from src.common.schemas import TypeCollectionSchema
-from src.symbols.collector import build_type_collection
+from src.common.schemas import InferredSchema, TypeCollectionCategory, TypeCollectionSchema
+from src.common.virtual import VirtualProject
+from src.symbols.collector import build_type_collection, build_type_collection_from_sources
 
 
 def hints2df(
@@ -66,20 +69,46 @@ def stubs2df(
     stubs_folder: pathlib.Path,
     subset: set[pathlib.Path],
 ) -> pt.DataFrame[TypeCollectionSchema]:
-    files = list(map(lambda p: str(project_folder / p), subset))
-    stubbing_result = codemod.parallel_exec_transform_with_prettyprint(
-        transform=ParallelStubber(
+    # Stubs are applied in memory, as only the collection of the stubbed project is of interest
+    project = VirtualProject.read(project_folder, subset=subset)
+    stubbed, stubbing_result = project.transform(
+        ParallelStubber(
             context=codemod.CodemodContext(),
             project_folder=project_folder,
             stub_folder=stubs_folder,
         ),
-        jobs=utils.worker_count(),
-        repo_root=str(project_folder),
-        files=files,
     )
     print(utils.format_parallel_exec_result("Applying Stubs", result=stubbing_result))
 
-    collection = build_type_collection(project_folder, allow_stubs=False, subset=subset)
-    df = collection.df
+    return build_type_collection_from_sources(stubbed).df
 
-    return df
+
+# (file, category, qname, topn, score); qnames are those of the symbol collector
+ScoreRow = tuple[str, TypeCollectionCategory, str, int, float]
+
+_SCORE_KEYS = [
+    InferredSchema.file,
+    InferredSchema.category,
+    InferredSchema.qname,
+    InferredSchema.topn,
+]
+
+
+def scores2df(rows: typing.Iterable[ScoreRow]) -> pd.DataFrame:
+    return pd.DataFrame(list(rows), columns=[*_SCORE_KEYS, InferredSchema.score])
+
+
+def with_scores(
+    df: pt.DataFrame[InferredSchema], scores: pd.DataFrame
+) -> pt.DataFrame[InferredSchema]:
+    """Attach model confidences to collected predictions.
+    Symbols without a (matching) score, or without an annotation, are left as missing"""
+    scored = df.drop(columns=InferredSchema.score, errors="ignore").merge(
+        scores.drop_duplicates(subset=_SCORE_KEYS, keep="first"),
+        how="left",
+        on=_SCORE_KEYS,
+    )
+    scored[InferredSchema.score] = scored[InferredSchema.score].where(
+        scored[InferredSchema.anno].notna()
+    )
+    return scored.pipe(pt.DataFrame[InferredSchema])
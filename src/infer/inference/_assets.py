@@ -0,0 +1,78 @@
+import functools
+import os
+import pathlib
+import pickle
+import tempfile
+import typing
+
+import numpy as np
+from annoy import AnnoyIndex
+from gensim.models import Word2Vec
+
+# Model assets are loaded once per process and, where possible, memory-mapped read-only,
+# so that processes on the same node share their pages rather than each holding a copy.
+# Run convert_for_mmap over a model folder once to store assets in a form that allows this
+
+
+@functools.lru_cache(maxsize=None)
+def word2vec(path: pathlib.Path) -> Word2Vec:
+    # Only vectors stored as separate arrays are mapped; others are loaded as usual
+    return Word2Vec.load(str(path), mmap="r")
+
+
+@functools.lru_cache(maxsize=None)
+def array(path: pathlib.Path) -> np.ndarray:
+    try:
+        return np.load(str(path), mmap_mode="r")
+    except ValueError:
+        # Arrays of Python objects cannot be mapped
+        return np.load(str(path), allow_pickle=True)
+
+
+@functools.lru_cache(maxsize=None)
+def unpickled(path: pathlib.Path) -> typing.Any:
+    with path.open("rb") as f:
+        return pickle.load(f)
+
+
+@functools.lru_cache(maxsize=None)
+def annoy_index(path: pathlib.Path, dimensions: int, metric: str) -> AnnoyIndex:
+    # Annoy maps its index natively; do not fault in every page up front
+    index = AnnoyIndex(dimensions, metric)
+    index.load(str(path), prefault=False)
+    return index
+
+
+def convert_for_mmap(model_folder: pathlib.Path) -> list[pathlib.Path]:
+    """Rewrite the assets of the model folder in place so that they can be memory-mapped:
+    Word2Vec models store their vectors as separate .npy files, and arrays of strings are
+    stored with a fixed-width dtype instead of as Python objects. Arrays of other objects
+    cannot be converted without loss and are left as they are. Returns converted assets"""
+    converted = list[pathlib.Path]()
+
+    for path in sorted(model_folder.rglob("w2v_*.bin")):
+        Word2Vec.load(str(path)).save(str(path), sep_limit=0)
+        converted.append(path)
+
+    for path in sorted(model_folder.rglob("*.npy")):
+        if path.name.startswith("w2v_"):
+            # Vectors that were just separated from their Word2Vec model
+            continue
+        arr = np.load(str(path), allow_pickle=True)
+        if arr.dtype == object and all(isinstance(element, str) for element in arr.flat):
+            _replace_array(path, arr.astype(str))
+            converted.append(path)
+
+    return converted
+
+
+def _replace_array(path: pathlib.Path, arr: np.ndarray) -> None:
+    # Written under a temporary name first, so that readers never see a partial array and
+    # a failed conversion leaves the asset intact
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".npy")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, path)
+    finally:
+        pathlib.Path(tmp).unlink(missing_ok=True)
@@ -42,12 +42,20 @@ class DatasetFolderStructure(enum.Enum):
                 if author.is_dir() and not author.name.startswith(".")
             )
             for author in authors:
-                repos = (repo for repo in author.iterdir() if repo.is_dir())
+                repos = (
+                    repo
+                    for repo in author.iterdir()
+                    if repo.is_dir() and not repo.name.startswith(".")
+                )
                 yield from repos
 
         elif self == DatasetFolderStructure.BETTERTYPES4PY:
             repo_suffix = dataset_root / "repos" / "test"
-            repos = (repo for repo in repo_suffix.iterdir() if repo.is_dir())
+            repos = (
+                repo
+                for repo in repo_suffix.iterdir()
+                if repo.is_dir() and not repo.name.startswith(".")
+            )
             yield from repos
         elif self == DatasetFolderStructure.PROJECT:
             yield dataset_root
@@ -95,6 +103,8 @@ class DatasetFolderStructure(enum.Enum):
             mapping = dict[pathlib.Path, set[pathlib.Path]]()
 
             for repo in repo_suffix.iterdir():
+                if repo.name.startswith("."):
+                    continue
                 if repo.is_dir() and (fs := codemod.gather_files([repo_suffix / repo])):
                     mapping[repo_suffix / repo] = set(
                         map(lambda p: pathlib.Path(p).relative_to(repo_suffix / repo), fs)
@@ -0,0 +1,54 @@
+import concurrent.futures
+import queue
+import threading
+import time
+import typing
+
+
+Q = typing.TypeVar("Q")
+A = typing.TypeVar("A")
+
+
+class Coalescer(typing.Generic[Q, A]):
+    """Merge requests that are made concurrently from many threads into single calls of fn,
+    which answers a list of requests in order. Calls are made by a single thread, so fn,
+    e.g. a model's decoder, never runs concurrently with itself"""
+
+    def __init__(
+        self, fn: typing.Callable[[list[Q]], list[A]], max_batch: int, wait: float
+    ) -> None:
+        self.fn = fn
+        self.max_batch = max_batch
+        # Seconds that the first request of a batch waits for others to join it
+        self.wait = wait
+
+        self._requests = queue.SimpleQueue[tuple[Q, concurrent.futures.Future[A]]]()
+        self._caller = threading.Thread(target=self._serve, daemon=True)
+        self._caller.start()
+
+    def __call__(self, request: Q) -> A:
+        answer = concurrent.futures.Future[A]()
+        self._requests.put((request, answer))
+        return answer.result()
+
+    def _serve(self) -> None:
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + self.wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._requests.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            try:
+                answers = self.fn([request for request, _ in batch])
+                if len(answers) != len(batch):
+                    raise RuntimeError(f"{len(answers)} answers to {len(batch)} requests")
+            except BaseException as e:
+                for _, answer in batch:
+                    answer.set_exception(e)
+                continue
+
+            for (_, answer), result in zip(batch, answers):
+                answer.set_result(result)
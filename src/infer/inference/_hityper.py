@@ -1,21 +1,27 @@
 from __future__ import annotations
 
 import abc
-import collections
+import ast
+import contextlib
 import enum
-import json
+import functools
+import importlib.metadata
 import logging
 import pathlib
+import typing
 from abc import ABC
 from dataclasses import dataclass
 from typing import Optional
 
 import hityper
-import hityper.__main__ as htm
 import libcst
 import pandas as pd
 import pandera.typing as pt
 import pydantic
+from hityper.config import config
+from hityper.tdg_generator import TDGGenerator
+from hityper.usertype_finder import UsertypeFinder
+from hityper.utils import SimModel, detectChange, formatUserTypes
 from libcst import codemod, metadata
 from libcst.codemod.visitors._apply_type_annotations import (
     Annotations,
@@ -24,9 +30,11 @@ from libcst.codemod.visitors._apply_type_annotations import (
 )
 
 import utils
+from src.common import cache
 from src.common.annotations import ApplyTypeAnnotationsVisitor
 from src.common.schemas import InferredSchema
-from src.symbols.collector import build_type_collection
+from src.common.virtual import VirtualProject
+from src.symbols.collector import build_type_collection_from_sources
 from ._base import ProjectWideInference
 
 
@@ -54,17 +62,6 @@ class _GenTDGArguments:
     call_analysis = True
 
 
-@dataclass
-class _InferenceArguments:
-    repo: str
-    output_directory: str
-    topn: int
-    recommendations: str
-
-    type4py = False
-    source = None
-
-
 class _HiTyperPredictionCategory(str, enum.Enum):
     ARG = "arg"
     LOCAL = "local"
@@ -90,6 +87,81 @@ class _HiTyperPredictions(pydantic.BaseModel):
     __root__: dict[pathlib.Path, _HiTyperScope2Prediction]
 
 
+# HiTyper's output for a single file, as returned by its API, i.e. plain dicts of
+# {scope: [{"category": ..., "name": ..., "type": [...]}]}; _HiTyperPredictions validates these
+_RawScope2Prediction = dict[str, list[dict]]
+
+
+# User types and type dependency graph of a file, as computed by HiTyper's static analysis
+_StaticAnalysis = tuple[dict, typing.Any]
+
+
+def _static_analysis_key(project: VirtualProject, relative: pathlib.Path) -> str:
+    return cache.content_hash(project.content_hash(), str(relative))
+
+
+def _static_analysis(
+    tdgs: cache.DiskCache[_StaticAnalysis],
+    project: VirtualProject,
+    relative: pathlib.Path,
+    tree: Optional[ast.Module] = None,
+) -> _StaticAnalysis:
+    """HiTyper's static analysis depends on the project's sources only, not on recommendations.
+    Analyses are therefore cached by the project's content and reused by every model adaptor
+    and run; cached entries are unpickled anew, as inference mutates the dependency graphs.
+    Pass the source's tree if it has already been parsed"""
+    key = _static_analysis_key(project, relative)
+    if (analysis := tdgs.get(key)) is not None:
+        return analysis
+
+    filename = str(project.root / relative)
+    root = tree if tree is not None else ast.parse(project.sources[relative])
+    usertypes, _ = UsertypeFinder(filename, str(project.root), True).run(root)
+    global_tg = TDGGenerator(filename, True, None, usertypes, alias=0, repo=None).run(root)
+
+    tdgs.put(key, (usertypes, global_tg))
+    return usertypes, global_tg
+
+
+def _infer_file(
+    analysis: _StaticAnalysis,
+    recommendations: Optional[dict],
+    topn: int,
+    simmodel: Optional[SimModel],
+) -> _RawScope2Prediction:
+    # Same as the per-file loop of hityper.__main__.infertypes over a repository
+    usertypes, global_tg = analysis
+
+    str_results = dict[str, list[dict]]()
+    global_tg.passTypes(debug=False)
+    str_results["global@global"] = global_tg.dumptypes()
+
+    for tg in global_tg.tgs:
+        if recommendations is not None:
+            changed, iters = True, 0
+            while changed and iters < config["max_recommendation_iteration"]:
+                iters += 1
+                tg.passTypes(debug=False)
+                types = tg.findHotTypes()
+                tg.recommendType(
+                    types,
+                    recommendations,
+                    formatUserTypes(usertypes),
+                    usertypes["module"],
+                    topn,
+                    simmodel=simmodel,
+                )
+                tg.passTypes(debug=False)
+                changed = detectChange(types, tg.findHotTypes())
+                tg.simplifyTypes()
+        else:
+            tg.passTypes(debug=False)
+            tg.simplifyTypes()
+        str_results[tg.name] = tg.dumptypes()
+
+    return str_results
+
+
 class ParallelTypeApplier(codemod.ContextAwareTransformer):
     def __init__(
         self,
@@ -139,6 +211,13 @@ class ModelAdaptor(abc.ABC):
     class ProjectPredictions(pydantic.BaseModel):
         __root__: dict[str, ModelAdaptor.FilePredictions]
 
+    # Plain dicts in the shape of ProjectPredictions, keyed by resolved path, which are
+    # handed to HiTyper as they are; ProjectPredictions only validates them when debugging
+    RawPredictions = dict[str, dict]
+
+    # Parse of a source of the project, by relative path; see predict
+    Parsed = typing.Callable[[pathlib.Path], typing.ContextManager[ast.Module]]
+
     def __init__(self, model_path: pathlib.Path) -> None:
         self.model_path = model_path
         super().__init__()
@@ -148,7 +227,12 @@ class ModelAdaptor(abc.ABC):
         ...
 
     @abc.abstractmethod
-    def predict(self, project: pathlib.Path, subset: set[pathlib.Path]) -> ModelAdaptor.ProjectPredictions:
+    def predict(
+        self, project: VirtualProject, parsed: ModelAdaptor.Parsed
+    ) -> ModelAdaptor.RawPredictions:
+        """Predict for every source of the project. Do not parse sources; walk the tree of
+        `with parsed(relative) as tree` instead, which is the same parse that HiTyper's static
+        analysis of the file uses once the adaptor is done with it"""
         ...
 
 ModelAdaptor.FuncPrediction.update_forward_refs()
@@ -166,10 +250,6 @@ class HiTyper(ProjectWideInference, ABC):
     def _infer_project(
         self, mutable: pathlib.Path, subset: set[pathlib.Path]
     ) -> pt.DataFrame[InferredSchema]:
-        output_dir = mutable / ".hityper"
-        if not output_dir.is_dir():
-            output_dir.mkdir(parents=True, exist_ok=True)
-
         # Create model predictions and pass to HiTyper
         self.logger.info(
             f"Inferring over {len(subset)} files in {mutable} with {self.adaptor.__class__.__qualname__}"
@@ -177,56 +257,68 @@ class HiTyper(ProjectWideInference, ABC):
 
         # Provide ML predictions for ALL files
         # so that static analysis has best chance
-        model_preds = self.adaptor.predict(mutable, subset=set(map(
-            lambda r: pathlib.Path(r).relative_to(mutable),
-            codemod.gather_files([str(mutable)])
-        )))
-
-        outpath = output_dir / f"__{self.adaptor.__class__.__qualname__}__.json"
-        assert not outpath.is_file()
-
-        self.logger.info(f"Writing model predictions to {outpath} for HiTyper to use")
-        with outpath.open("w") as f:
-            json.dump(model_preds.dict(exclude_none=True)["__root__"], f)
-
-        htm.infertypes(
-            _InferenceArguments(
-                repo=str(mutable),
-                output_directory=str(output_dir),
-                topn=self.adaptor.topn(),
-                recommendations=str(outpath),
-            )
+        everything = VirtualProject.read(mutable)
+        tdgs = cache.DiskCache[_StaticAnalysis](
+            "hityper", version=importlib.metadata.version("hityper")
         )
 
-        inferred_types_path = (
-            str(output_dir) + "/" + str(mutable).replace("/", "_") + "_INFERREDTYPES.json"
+        @contextlib.contextmanager
+        def parsed(relative: pathlib.Path) -> typing.Iterator[ast.Module]:
+            tree = ast.parse(everything.sources[relative])
+            yield tree
+            # Analysed while its only parse is at hand, and read back from the cache below;
+            # trees are not retained until then
+            if not tdgs.path(_static_analysis_key(everything, relative)).is_file():
+                _static_analysis(tdgs, everything, relative, tree)
+
+        model_preds = self.adaptor.predict(everything, parsed)
+
+        # Predictions are handed to HiTyper in memory, rather than through JSON files
+        simmodel = (
+            SimModel(config[config["simmodel"]], config["tokenizer"])
+            if config["simmodel"] is not None
+            else None
+        )
+        repo_predictions = dict[pathlib.Path, _RawScope2Prediction]()
+        for relative in everything.sources:
+            try:
+                repo_predictions[relative] = _infer_file(
+                    _static_analysis(tdgs, everything, relative),
+                    model_preds.get(str((mutable / relative).resolve())),
+                    topn=self.adaptor.topn(),
+                    simmodel=simmodel,
+                )
+            except Exception as e:
+                self.logger.error(f"HiTyper failed to infer types for {relative} - {e}")
+
+        if utils.validate_predictions():
+            ModelAdaptor.ProjectPredictions.parse_obj(model_preds)
+            _HiTyperPredictions.parse_obj(repo_predictions)
+
+        predictions = self._parse_predictions(repo_predictions)
+
+        project = VirtualProject(
+            mutable, {s: everything.sources[s] for s in sorted(subset) if s in everything.sources}
         )
-        repo_predictions = _HiTyperPredictions.parse_file(inferred_types_path)
-        predictions = self._parse_predictions(repo_predictions, mutable)
 
         collections = []
         for topn in range(1, self.adaptor.topn() + 1):
-            with utils.scratchpad(mutable) as sc:
-                tw_hint_res = codemod.parallel_exec_transform_with_prettyprint(
-                    transform=ParallelTypeApplier(
-                        context=codemod.CodemodContext(),
-                        path2batches=predictions,
-                        topn=topn - 1,
-                    ),
-                    jobs=utils.worker_count(),
-                    repo_root=str(sc),
-                    files=[sc / s for s in subset],
-                )
-                self.logger.info(
-                    utils.format_parallel_exec_result(
-                        f"Annotated with HiTyper @ topn={topn}", result=tw_hint_res
-                    )
-                )
-                collections.append(
-                    build_type_collection(root=sc, allow_stubs=False, subset=subset).df.assign(
-                        topn=topn
-                    )
+            annotated, tw_hint_res = project.transform(
+                ParallelTypeApplier(
+                    context=codemod.CodemodContext(),
+                    path2batches=predictions,
+                    topn=topn - 1,
+                ),
+                jobs=utils.worker_count(),
+            )
+            self.logger.info(
+                utils.format_parallel_exec_result(
+                    f"Annotated with HiTyper @ topn={topn}", result=tw_hint_res
                 )
+            )
+            collections.append(
+                build_type_collection_from_sources(annotated).df.assign(topn=topn)
+            )
         return (
             pd.concat(collections, ignore_index=True)
             .assign(method=self.method())
@@ -234,92 +326,71 @@ class HiTyper(ProjectWideInference, ABC):
         )
 
     def _parse_predictions(
-        self, predictions: _HiTyperPredictions, project: pathlib.Path
+        self, predictions: dict[pathlib.Path, _RawScope2Prediction]
     ) -> dict[pathlib.Path, list[Annotations]]:
-        path2batchpreds: collections.defaultdict[
-            pathlib.Path, list[Annotations]
-        ] = collections.defaultdict(list)
-        for file, scopes in predictions.__root__.items():
-            for batch in self._batchify_scopes(scopes):
-                annotations = Annotations.empty()
-
-                for scope, predictions in batch.items():
-                    scope_components = _derive_qname(scope)
-                    for prediction in filter(
-                        lambda p: p.category == _HiTyperPredictionCategory.LOCAL, predictions
-                    ):
-                        if (ty := prediction.type[0]) is None:
+        """Annotations of every file for each rank, built in a single pass over HiTyper's output.
+        Ranks without a prediction for a slot leave it unannotated"""
+        topn = self.adaptor.topn()
+
+        path2batchpreds = dict[pathlib.Path, list[Annotations]]()
+        for file, scopes in predictions.items():
+            batches = [Annotations.empty() for _ in range(topn)]
+
+            for scope, scope_predictions in scopes.items():
+                scope_components = _derive_qname(scope)
+
+                signature = list[dict]()
+                for prediction in scope_predictions:
+                    if prediction["category"] != _HiTyperPredictionCategory.LOCAL:
+                        signature.append(prediction)
+                        continue
+
+                    plain_key = ".".join((*scope_components, prediction["name"]))
+                    self_key = ".".join((*scope_components, "self", prediction["name"]))
+                    for annotations, ty in zip(batches, prediction["type"]):
+                        if ty is None:
                             continue
-                        annotation = libcst.Annotation(libcst.parse_expression(ty))
-
-                        scope_key = ".".join((*scope_components, prediction.name))
-                        annotations.attributes[scope_key] = annotation
+                        annotation = _annotation(ty)
+                        annotations.attributes[plain_key] = annotation
+                        annotations.attributes[self_key] = annotation
+
+                if scope == "global@global":
+                    continue
+
+                scope_key = ".".join(scope_components)
+                for n, annotations in enumerate(batches):
+                    # hityper does not infer self, so add it manually for non-global functions
+                    parameters = [] if scope.endswith("@global") else [_param("self", None)]
+                    returns: Optional[libcst.Annotation] = None
+
+                    for prediction in signature:
+                        types = prediction["type"]
+                        ty = types[n] if n < len(types) else None
+                        if prediction["category"] == _HiTyperPredictionCategory.ARG:
+                            parameters.append(_param(prediction["name"], ty))
+                        else:
+                            returns = _annotation(ty) if ty is not None else None
 
-                        scope_key = ".".join((*scope_components, "self", prediction.name))
-                        annotations.attributes[scope_key] = annotation
+                    ps = libcst.Parameters(parameters)
+                    fkey = FunctionKey.make(scope_key, ps)
+                    annotations.functions[fkey] = FunctionAnnotation(ps, returns)
 
-                    if scope != "global@global":
-                        # hityper does not infer self, so add it manually for non-global functions
-                        if not scope.endswith("@global"):
-                            parameters: list[libcst.Param] = [
-                                libcst.Param(name=libcst.Name("self"))
-                            ]
-                        else:
-                            parameters = []
-                        returns: Optional[libcst.Annotation] = None
-
-                        for prediction in filter(
-                            lambda p: p.category != _HiTyperPredictionCategory.LOCAL, predictions
-                        ):
-                            ty = prediction.type[0]
-                            if prediction.category == _HiTyperPredictionCategory.ARG:
-                                parameters.append(
-                                    libcst.Param(
-                                        name=libcst.Name(prediction.name),
-                                        annotation=(
-                                            libcst.Annotation(libcst.parse_expression(ty))
-                                            if ty is not None
-                                            else None
-                                        ),
-                                    )
-                                )
-
-                            else:
-                                returns = (
-                                    libcst.Annotation(libcst.parse_expression(ty))
-                                    if ty is not None
-                                    else None
-                                )
-
-                        scope_key = ".".join(scope_components)
-
-                        ps = libcst.Parameters(parameters)
-                        fkey = FunctionKey.make(scope_key, ps)
-                        annotations.functions[fkey] = FunctionAnnotation(ps, returns)
-
-                path2batchpreds[pathlib.Path(file).relative_to(project)].append(annotations)
+            path2batchpreds[file] = batches
         return path2batchpreds
 
-    def _batchify_scopes(self, scopes: _HiTyperScope2Prediction) -> list[_HiTyperScope2Prediction]:
-        batches: list[_HiTyperScope2Prediction] = []
-
-        for n in range(self.adaptor.topn()):
-            batch = _HiTyperScope2Prediction()
-
-            for scope, predictions in scopes.items():
-                batch_predictions: list = []
-                for prediction in predictions:
-                    batch_predictions.append(
-                        _HiTyperPrediction(
-                            category=prediction.category,
-                            name=prediction.name,
-                            type=[prediction.type[n] if n < len(prediction.type) else None],
-                        )
-                    )
-
-                batch[scope] = batch_predictions
-            batches.append(batch)
-        return batches
+
+# HiTyper predicts the same few types throughout a project; libcst nodes are immutable,
+# so parsed annotations are shared between slots and ranks
+@functools.lru_cache(maxsize=4096)
+def _annotation(ty: str) -> libcst.Annotation:
+    return libcst.Annotation(libcst.parse_expression(ty))
+
+
+@functools.lru_cache(maxsize=4096)
+def _param(name: str, ty: Optional[str]) -> libcst.Param:
+    return libcst.Param(
+        name=libcst.Name(name), annotation=_annotation(ty) if ty is not None else None
+    )
 
 
 def _derive_qname(scope: str) -> list[str]:
@@ -0,0 +1,112 @@
+import functools
+import os
+import pathlib
+import tempfile
+import typing
+
+import numpy as np
+import onnxruntime
+import torch
+
+import utils
+from src.common import cache
+
+
+def quantized_model(model: pathlib.Path) -> pathlib.Path:
+    """Dynamically quantized (int8 weights) copy of the ONNX model, which is created next to it
+    on first use, or in the cache if the model store is read-only. Activations are quantized
+    at runtime, so no calibration data is needed"""
+    beside = model.with_suffix(".int8.onnx")
+    # Keyed by the model's identity, so that a replaced model is quantized anew
+    stat = model.stat()
+    cached = (
+        cache.cache_root()
+        / "onnx"
+        / cache.content_hash(str(model.resolve()), str(stat.st_size), str(stat.st_mtime_ns))
+        / beside.name
+    )
+    for target in (beside, cached):
+        if target.is_file():
+            return target
+
+    if os.access(model.parent, os.W_OK):
+        target = beside
+    else:
+        target = cached
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            pass
+        if not os.access(target.parent, os.W_OK):
+            raise RuntimeError(
+                f"Cannot quantize {model}: neither {model.parent} nor {target.parent} is writable; "
+                f"run register-models against a writable store, or point MDTI4PY_CACHE elsewhere"
+            )
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    # Written under a temporary name first, so that concurrent runs never load partial models
+    fd, tmp = tempfile.mkstemp(dir=target.parent, suffix=".onnx")
+    os.close(fd)
+    try:
+        quantize_dynamic(model, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, target)
+    finally:
+        pathlib.Path(tmp).unlink(missing_ok=True)
+    return target
+
+
+def session_options() -> onnxruntime.SessionOptions:
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    # Batches are evaluated one at a time, in the parent process, once workers have finished
+    # extracting their features; parallelise within operators over the same cores instead
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = utils.worker_count() or 0
+    options.inter_op_num_threads = 1
+    return options
+
+
+class BoundSession:
+    """InferenceSession that binds inputs and outputs to preallocated buffers, rather than
+    having onnxruntime copy them on every call; a drop-in replacement for run"""
+
+    def __init__(self, session: onnxruntime.InferenceSession) -> None:
+        self.session = session
+        self.device = "cuda" if "CUDAExecutionProvider" in session.get_providers() else "cpu"
+
+    def run(
+        self,
+        output_names: typing.Optional[list[str]],
+        input_feed: dict[str, typing.Any],
+        run_options: typing.Optional[onnxruntime.RunOptions] = None,
+    ) -> list[np.ndarray]:
+        binding = self.session.io_binding()
+        for name, value in input_feed.items():
+            binding.bind_cpu_input(name, np.ascontiguousarray(value))
+        for name in output_names or [o.name for o in self.session.get_outputs()]:
+            binding.bind_output(name, self.device)
+
+        self.session.run_with_iobinding(binding, run_options)
+        return binding.copy_outputs_to_cpu()
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.session, name)
+
+
+@functools.lru_cache(maxsize=None)
+def session(model: pathlib.Path, quantized: bool = False) -> BoundSession:
+    # Quantized operators are only implemented for CPUs
+    if quantized or not torch.cuda.is_available():
+        providers = ["CPUExecutionProvider"]
+    else:
+        providers = ["CUDAExecutionProvider"]
+
+    return BoundSession(
+        onnxruntime.InferenceSession(
+            str(quantized_model(model) if quantized else model),
+            sess_options=session_options(),
+            providers=providers,
+        )
+    )
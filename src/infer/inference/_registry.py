@@ -0,0 +1,91 @@
+import functools
+import hashlib
+import json
+import os
+import pathlib
+
+from src.common import cache
+
+# Models are resolved from a local store only, e.g. a shared read-only folder on compute nodes:
+#   $MDTI4PY_MODELS/{type4py,typewriter,typilus,typet5}/...
+#   $MDTI4PY_MODELS/manifest.json, mapping each asset to its sha256
+# The store is populated once, on a node with network access, by the register-models command.
+# Resolving a model only locates and verifies its folder; assets are loaded by the tools
+
+MANIFEST = "manifest.json"
+
+TYPET5_REPOSITORY = "MrVPlusOne/TypeT5-v7"
+
+
+def models_root() -> pathlib.Path:
+    if root := os.getenv("MDTI4PY_MODELS"):
+        return pathlib.Path(root)
+    return pathlib.Path.cwd() / "models"
+
+
+def _sha256(path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _verified_sha256(path: pathlib.Path) -> str:
+    # Hashing gigabytes of weights on every start is slow; files that have not changed since
+    # they were last hashed are not read again
+    stat = path.stat()
+    hashes = cache.DiskCache[str]("model-registry", version="1")
+    key = cache.content_hash(str(path.resolve()), str(stat.st_size), str(stat.st_mtime_ns))
+
+    if (sha := hashes.get(key)) is None:
+        sha = _sha256(path)
+        hashes.put(key, sha)
+    return sha
+
+
+@functools.lru_cache(maxsize=None)
+def resolve(name: str) -> pathlib.Path:
+    """Folder of the named model in the store, whose assets are checked against the manifest"""
+    root = models_root()
+    folder = root / name
+    if not folder.is_dir():
+        raise RuntimeError(
+            f"Model {name} is not in the model store at {root}; "
+            f"populate it with register-models or point MDTI4PY_MODELS at an existing store"
+        )
+
+    if not (root / MANIFEST).is_file():
+        return folder
+
+    manifest: dict[str, str] = json.loads((root / MANIFEST).read_text())
+    for asset, expected in manifest.items():
+        if pathlib.Path(asset).parts[0] != name:
+            continue
+        if (actual := _verified_sha256(root / asset)) != expected:
+            raise RuntimeError(
+                f"Model asset {root / asset} is corrupt: expected sha256 {expected}, got {actual}"
+            )
+    return folder
+
+
+def fetch_typet5(root: pathlib.Path) -> pathlib.Path:
+    # The only step that touches the network
+    from huggingface_hub import snapshot_download
+
+    folder = root / "typet5"
+    snapshot_download(TYPET5_REPOSITORY, local_dir=str(folder), local_dir_use_symlinks=False)
+    return folder
+
+
+def write_manifest(root: pathlib.Path) -> dict[str, str]:
+    manifest = {
+        str(path.relative_to(root)): _sha256(path)
+        for path in sorted(root.rglob("*"))
+        # Skips bookkeeping of downloads, e.g. .huggingface/
+        if path.is_file()
+        and path.name != MANIFEST
+        and not any(part.startswith(".") for part in path.relative_to(root).parts)
+    }
+    (root / MANIFEST).write_text(json.dumps(manifest, indent=2))
+    return manifest
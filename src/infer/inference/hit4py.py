@@ -1,12 +1,10 @@
 import pathlib
 
-from libsa4py.cst_extractor import Extractor
-from type4py.deploy.infer import (
-    get_dps_single_file,
-    get_type_preds_single_file,
-)
+from type4py.deploy.infer import get_type_preds_single_file
 
-from src.infer.inference.t4py import PTType4Py
+from src.common.virtual import VirtualProject
+from src.infer.inference.t4py import PTType4Py, create_or_load_datapoints
+from . import _registry
 from ._hityper import ModelAdaptor, HiTyper
 
 
@@ -19,42 +17,30 @@ class Type4PyAdaptor(ModelAdaptor):
         return self.type4py.topn
 
     def predict(
-        self, project: pathlib.Path, subset: set[pathlib.Path]
-    ) -> ModelAdaptor.ProjectPredictions:
-        r = ModelAdaptor.ProjectPredictions(__root__=dict())
-
-        for file in subset:
-            with (project / file).open() as f:
-                src_f_read = f.read()
-            type_hints = Extractor.extract(src_f_read, include_seq2seq=False).to_dict()
-
-            (
-                all_type_slots,
-                vars_type_hints,
-                params_type_hints,
-                rets_type_hints,
-            ) = get_dps_single_file(type_hints)
-
-            if not any(h for h in (vars_type_hints, params_type_hints, rets_type_hints)):
+        self, project: VirtualProject, parsed: ModelAdaptor.Parsed
+    ) -> ModelAdaptor.RawPredictions:
+        r = ModelAdaptor.RawPredictions()
+
+        # Shares cached datapoints with Type4Py, whose slots are keyed by scope already
+        for file, dps in create_or_load_datapoints(project).items():
+            if not dps.has_type_hints():
                 continue
 
             p = get_type_preds_single_file(
-                type_hints,
-                all_type_slots,
-                (vars_type_hints, params_type_hints, rets_type_hints),
+                dps.ext_type_hints,
+                dps.all_type_slots,
+                (dps.vars_type_hints, dps.param_type_hints, dps.rets_type_hints),
                 self.type4py,
                 filter_pred_types=False,
             )
-
-            parsed = ModelAdaptor.FilePredictions.parse_obj(p)
-            r.__root__[str(project.resolve() / file)] = parsed
+            r[str(project.root.resolve() / file)] = p
 
         return r
 
 
 class _HiType4PyTopN(HiTyper):
     def __init__(self, topn: int) -> None:
-        super().__init__(Type4PyAdaptor(model_path=pathlib.Path("models") / "type4py", topn=topn))
+        super().__init__(Type4PyAdaptor(model_path=_registry.resolve("type4py"), topn=topn))
 
     def method(self) -> str:
         return f"HiType4PyN{self.adaptor.topn()}"
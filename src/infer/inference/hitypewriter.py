@@ -1,15 +1,16 @@
+import ast
 import dataclasses
 import pathlib
 
-import libcst
-from libcst import metadata
 from typewriter.dltpy.preprocessing.pipeline import preprocessor
 
+from src.common.virtual import VirtualProject
+from src.infer.inference import _registry
 from src.infer.inference._hityper import ModelAdaptor, HiTyper
 from src.infer.inference.typewriter import _TypeWriter, Parameter, Return
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class FuncPred:
     q_name: str
     params_p: ModelAdaptor.VarPrediction = dataclasses.field(default_factory=dict)
@@ -17,33 +18,28 @@ class FuncPred:
     variables_p: dict = dataclasses.field(default_factory=dict)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class ClassPred:
     q_name: str
     funcs: list[FuncPred] = dataclasses.field(default_factory=list)
     variables_p: dict = dataclasses.field(default_factory=dict)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class FilePredictions:
     classes: list[ClassPred] = dataclasses.field(default_factory=list)
     funcs: list[FuncPred] = dataclasses.field(default_factory=list)
     variables_p: dict = dataclasses.field(default_factory=dict)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class TypeWriterFuncPreds:
     fname: str
     param_types: list[list[tuple[str, str]]]
     ret_types: list[list[str]]
 
 
-class _TypeWriter2HiTyper(libcst.CSTVisitor):
-    METADATA_DEPENDENCIES = (
-        metadata.ScopeProvider,
-        metadata.QualifiedNameProvider,
-    )
-
+class _TypeWriter2HiTyper(ast.NodeVisitor):
     def __init__(
         self, parameters: list[list[Parameter]], returns: list[list[Return]], topn: int
     ) -> None:
@@ -58,38 +54,50 @@ class _TypeWriter2HiTyper(libcst.CSTVisitor):
         self.file_predictions = FilePredictions()
         self.insertion_point_stack: list[ClassPred | FilePredictions] = [self.file_predictions]
 
+        # Enclosing classes and functions; qualified names omit <locals>
+        self.scope = list[str]()
+
         self.topn = topn
 
-    def visit_ClassDef(self, node: libcst.ClassDef) -> None:
-        self.file_predictions.classes.append(ClassPred(self._retrieve_qname(node)))
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self.file_predictions.classes.append(ClassPred(self._qname(node.name)))
         self.insertion_point_stack.append(self.file_predictions.classes[-1])
 
-    def leave_ClassDef(self, node: libcst.ClassDef) -> None:
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+
         self.insertion_point_stack.pop()
 
-    def visit_FunctionDef(self, f: libcst.FunctionDef) -> None:
+    def visit_FunctionDef(self, f: ast.FunctionDef | ast.AsyncFunctionDef) -> None:
         params_p = ModelAdaptor.VarPrediction()
         ret_type_p = self._visit_rettype(f)
 
         # TypeWriter only looks at normal arguments, as demonstrated by extraction code:
         # arg_names: List[str] = [arg.arg for arg in node.args.args]
         # arg_types: List[str] = [self.pretty_print(arg.annotation) for arg in node.args.args]
-        for param in f.params.params:
-            params_p[param.name.value] = self._visit_param(param)
+        for param in f.args.args:
+            params_p[param.arg] = self._visit_param(param)
 
         self.insertion_point_stack[-1].funcs.append(
             FuncPred(
-                q_name=self._retrieve_qname(f),
+                q_name=self._qname(f.name),
                 params_p=params_p,
                 ret_type_p=ret_type_p,
             )
         )
 
-    def _visit_param(self, param: libcst.Param) -> list[ModelAdaptor.Prediction]:
-        if param.name.value == "self":
+        self.scope.append(f.name)
+        self.generic_visit(f)
+        self.scope.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _visit_param(self, param: ast.arg) -> list[ModelAdaptor.Prediction]:
+        if param.arg == "self":
             return []
 
-        name = preprocessor.process_identifier(param.name.value)
+        name = preprocessor.process_identifier(param.arg)
 
         pc = self.param_cursor
         try:
@@ -105,8 +113,10 @@ class _TypeWriter2HiTyper(libcst.CSTVisitor):
         ]
         return list(filter(lambda prediction: prediction[0] is not None, predictions))
 
-    def _visit_rettype(self, f: libcst.FunctionDef) -> list[ModelAdaptor.Prediction]:
-        name = preprocessor.process_identifier(f.name.value)
+    def _visit_rettype(
+        self, f: ast.FunctionDef | ast.AsyncFunctionDef
+    ) -> list[ModelAdaptor.Prediction]:
+        name = preprocessor.process_identifier(f.name)
 
         rc = self.ret_cursor
         try:
@@ -127,11 +137,8 @@ class _TypeWriter2HiTyper(libcst.CSTVisitor):
             return None
         return annotation
 
-    def _retrieve_qname(self, node: libcst.FunctionDef | libcst.ClassDef) -> str:
-        qnames = self.get_metadata(metadata.QualifiedNameProvider, node)
-        qname = next(iter(qnames))
-
-        return qname.name.replace(".<locals>.", ".")
+    def _qname(self, name: str) -> str:
+        return ".".join((*self.scope, name))
 
 
 class TypeWriterAdaptor(ModelAdaptor):
@@ -143,31 +150,22 @@ class TypeWriterAdaptor(ModelAdaptor):
         return self.typewriter.topn
 
     def predict(
-        self, project: pathlib.Path, subset: set[pathlib.Path]
-    ) -> ModelAdaptor.ProjectPredictions:
-        file2predictions: dict[pathlib.Path, tuple | None] = {
-            project / s: self.typewriter.infer_for_file(project, s) for s in subset
-        }
-
-        hityper_predictions = dict[str, FilePredictions]()
-
-        for path, model_preds in file2predictions.items():
-            if not model_preds:
-                continue
+        self, project: VirtualProject, parsed: ModelAdaptor.Parsed
+    ) -> ModelAdaptor.RawPredictions:
+        hityper_predictions = ModelAdaptor.RawPredictions()
 
+        for relative, model_preds in self.typewriter.infer_for_project(project):
             parameters, returns = self.transform_predictions(*model_preds)
             visitor = _TypeWriter2HiTyper(parameters, returns, self.topn())
 
-            metadata.MetadataWrapper(
-                module=libcst.parse_module(path.read_text()), unsafe_skip_copy=True
-            ).visit(visitor)
+            with parsed(relative) as tree:
+                visitor.visit(tree)
 
-            file_predictions = dataclasses.asdict(visitor.file_predictions)
-            hityper_predictions[str(path.resolve())] = ModelAdaptor.FilePredictions.parse_obj(
-                file_predictions
+            hityper_predictions[str((project.root / relative).resolve())] = dataclasses.asdict(
+                visitor.file_predictions
             )
 
-        return ModelAdaptor.ProjectPredictions(__root__=hityper_predictions)
+        return hityper_predictions
 
     def transform_predictions(
         self,
@@ -189,7 +187,7 @@ class _HiTwTopN(HiTyper):
     def __init__(self, topn: int) -> None:
         super().__init__(
             TypeWriterAdaptor(
-                model_path=pathlib.Path("models") / "typewriter",
+                model_path=_registry.resolve("typewriter"),
                 topn=topn,
             )
         )
@@ -1,20 +1,10 @@
 from __future__ import annotations
 
-import codecs
 import dataclasses
 import enum
-import gzip
-import itertools
-import json
 import math
-import operator
 import pathlib
-from typing import Iterator
-
-import astunparse
-import typed_ast.ast3
-from type_check.annotater import AnnotationKind
-from typed_ast.ast3 import (
+from ast import (
     AnnAssign,
     Assign,
     Attribute,
@@ -26,11 +16,22 @@ from typed_ast.ast3 import (
     ClassDef,
 )
 
+import astunparse
+from type_check.annotater import AnnotationKind
+
+from src.common.virtual import VirtualProject
+from src.infer.inference import _registry
 from src.infer.inference._hityper import ModelAdaptor, HiTyper
-from src.infer.inference.typilus import TypilusPrediction, Typilus
+from src.infer.inference.typilus import (
+    TypilusPrediction,
+    Typilus,
+    read_prediction_shard,
+    stream_prediction_shards,
+    typed_ast_lineno,
+)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class FuncPred:
     q_name: str
     params_p: ModelAdaptor.VarPrediction = dataclasses.field(
@@ -42,7 +43,7 @@ class FuncPred:
     )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class ClassPred:
     q_name: str
     funcs: list[FuncPred] = dataclasses.field(default_factory=list)
@@ -51,7 +52,7 @@ class ClassPred:
     )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class FilePredictions:
     classes: list[ClassPred] = dataclasses.field(default_factory=list)
     funcs: list[FuncPred] = dataclasses.field(default_factory=list)
@@ -66,7 +67,12 @@ class TypilusHiTyperVisitor(NodeVisitor):
         CLASS = enum.auto()
 
     def __init__(self, predictions: list[TypilusPrediction]) -> None:
-        self.predictions = predictions
+        # Index predictions by (name, lineno, annotation_type); like a linear scan,
+        # the first prediction for each key wins
+        self.predictions = dict[tuple[str, int, str], TypilusPrediction]()
+        for prediction in predictions:
+            key = (prediction["name"], prediction["location"][0], prediction["annotation_type"])
+            self.predictions.setdefault(key, prediction)
         self.hityper_json = FilePredictions()
 
         self.qnames = list[str]()
@@ -145,7 +151,8 @@ class TypilusHiTyperVisitor(NodeVisitor):
         self.insertion_point.funcs.append(FuncPred(q_name=fqname))
 
         for pred_type, pred_prob in (
-            self.__extract_types_and_probs(node.name, node.lineno, AnnotationKind.FUNC) or []
+            self.__extract_types_and_probs(node.name, typed_ast_lineno(node), AnnotationKind.FUNC)
+            or []
         ):
             self.add_inferred(
                 symbol=fqname,
@@ -213,24 +220,11 @@ class TypilusHiTyperVisitor(NodeVisitor):
     def __extract_types_and_probs(
         self, identifier, lineno, kind
     ) -> list[ModelAdaptor.Prediction] | None:
-        pred_idx = self.__get_index(identifier, lineno, kind)
-        if pred_idx == -1:
+        pred_info = self.predictions.get((identifier, lineno, kind.value))
+        if pred_info is None:
             return None
 
-        pred_info = self.predictions[pred_idx]
-        preds = pred_info["predicted_annotation_logprob_dist"]
-
-        return preds
-
-    def __get_index(self, name, lineno, kind):
-        for idx, predline in enumerate(self.predictions):
-            if (
-                predline["name"] == name
-                and predline["location"][0] == lineno
-                and predline["annotation_type"] == kind.value
-            ):
-                return idx
-        return -1
+        return pred_info["predicted_annotation_logprob_dist"]
 
 
 class Typilus2HiTyper(ModelAdaptor):
@@ -242,54 +236,43 @@ class Typilus2HiTyper(ModelAdaptor):
         return self.typilus.topn
 
     def predict(
-        self, project: pathlib.Path, subset: set[pathlib.Path]
-    ) -> ModelAdaptor.ProjectPredictions:
-        dataset = self.typilus.repo_to_dataset(project)
-        predictions = self.typilus.predict(dataset, project / "typilus-predictions.json.gz")
-
-        # Load predictions from disk and perform same sifting
-        # that annotator from typilus does, i.e. select using fpath
-        sifted = list[TypilusPrediction](
-            filter(
-                lambda p: any(f"/{s}" == p["provenance"] for s in subset),
-                (prediction for batch in _load_json_gz(predictions.path) for prediction in batch),
-            )
+        self, project: VirtualProject, parsed: ModelAdaptor.Parsed
+    ) -> ModelAdaptor.RawPredictions:
+        dataset = self.typilus.repo_to_dataset(project.root)
+
+        # Perform same sifting that annotator from typilus does, i.e. select using fpath
+        provenances = {f"/{s}" for s in project.sources}
+        sifted = (
+            p for p in self.typilus.iter_predictions(dataset) if p["provenance"] in provenances
         )
 
-        project_predictions = dict[str, ModelAdaptor.FilePredictions]()
+        project_predictions = ModelAdaptor.RawPredictions()
 
-        for provenance, predictions in itertools.groupby(sifted, key=operator.itemgetter("provenance")):
-            provenance = pathlib.Path(provenance[1:])
-            predictions = list[TypilusPrediction](predictions)
-
-            fullpath = project / provenance
+        # Files are converted as soon as the model has moved past them
+        for provenance, shard in stream_prediction_shards(
+            sifted, folder=project.root / "typilus-predictions"
+        ):
+            relative = pathlib.Path(provenance[1:])
 
-            visitor = TypilusHiTyperVisitor(predictions)
+            visitor = TypilusHiTyperVisitor(list(read_prediction_shard(shard)))
 
-            typilus_ast = typed_ast.ast3.parse(source=fullpath.read_text())
-            visitor.visit(typilus_ast)
+            # The graph extractor does not expose its trees; walk HiTyper's instead, whose lines
+            # are converted to those of typed_ast where they differ
+            with parsed(relative) as tree:
+                visitor.visit(tree)
 
-            hity_json = dataclasses.asdict(visitor.hityper_json)
-            project_predictions[str(fullpath.resolve())] = ModelAdaptor.FilePredictions.parse_obj(
-                hity_json
+            project_predictions[str((project.root / relative).resolve())] = dataclasses.asdict(
+                visitor.hityper_json
             )
 
-        return ModelAdaptor.ProjectPredictions(__root__=project_predictions)
-
-
-
-def _load_json_gz(filename: str) -> Iterator[TypilusPrediction]:
-    reader = codecs.getreader("utf-8")
-    with gzip.open(filename) as f:
-        for line in reader(f):
-            yield json.loads(line, object_pairs_hook=TypilusPrediction)
+        return project_predictions
 
 
 class _HiTypilusTopN(HiTyper):
     def __init__(self, topn: int) -> None:
         super().__init__(
             Typilus2HiTyper(
-                model_folder=pathlib.Path("models") / "typilus",
+                model_folder=_registry.resolve("typilus"),
                 topn=topn,
             )
         )
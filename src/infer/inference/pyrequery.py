@@ -1,6 +1,9 @@
+import json
 import pathlib
 import re
 import shutil
+import subprocess
+import typing
 from typing import Union, Optional
 
 from pandas._libs import missing
@@ -20,11 +23,18 @@ from pyre_check.client.identifiers import PyreFlavor
 from ...common import ast_helper, visitors
 from src.common.schemas import InferredSchema, TypeCollectionCategory, TypeCollectionSchema
 
-from ._base import PerFileInference
+from ._base import ProjectWideInference
 import utils
 
+# Files whose types are requested by a single query to the server
+_QUERY_CHUNK_SIZE = 64
 
-class PyreQuery(PerFileInference):
+# Budget of a query, per file therein, and of any query as a whole
+_QUERY_TIMEOUT_PER_FILE = 60
+_QUERY_TIMEOUT_MAX = 10 * 60
+
+
+class PyreQuery(ProjectWideInference):
     def method(self) -> str:
         return "pyre-query"
 
@@ -68,23 +78,69 @@ class PyreQuery(PerFileInference):
                 if (dotdir := mutable / ".pyre").is_dir():
                     shutil.rmtree(str(dotdir))
 
-    def _infer_file(
-        self, root: pathlib.Path, relative: pathlib.Path
+    def _infer_project(
+        self, mutable: pathlib.Path, subset: set[pathlib.Path]
     ) -> pt.DataFrame[InferredSchema]:
-        repomanager = metadata.FullRepoManager(
-            repo_root_dir=str(root),
-            paths=[str(relative)],
-            providers={metadata.TypeInferenceProvider},
-            timeout=60,
-        )
-
-        try:
-            # Calculates type inference data here
-            module = repomanager.get_metadata_wrapper_for_path(str(relative))
-        except Exception as e:
-            self.logger.error(f"failed for {relative}: {e}")
+        paths = sorted(map(str, subset))
+
+        updates = list[pt.DataFrame[InferredSchema]]()
+        for offset in range(0, len(paths), _QUERY_CHUNK_SIZE):
+            chunk = paths[offset : offset + _QUERY_CHUNK_SIZE]
+            for relative, module in self._query(mutable, chunk):
+                self.logger.info(f"Collecting types of {relative} @ {mutable}")
+                updates.append(self._collect(pathlib.Path(relative), module))
+
+        if updates:
+            return pd.concat(updates, ignore_index=True).pipe(pt.DataFrame[InferredSchema])
+        else:
             return InferredSchema.example(size=0)
 
+    def _query(
+        self, root: pathlib.Path, paths: list[str]
+    ) -> typing.Iterator[tuple[str, metadata.MetadataWrapper]]:
+        """Types of the files from the running server, with their metadata resolved.
+        Pyre rejects the whole query if it fails on any file, so failed queries are split
+        in halves and retried, down to single files. Queries that time out are retried file
+        by file instead, as a file that hangs pyre would time out every half it is part of"""
+        timeout = min(_QUERY_TIMEOUT_PER_FILE * len(paths), _QUERY_TIMEOUT_MAX)
+        try:
+            types = _query_types(root, paths, timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            if len(paths) == 1:
+                self.logger.error(f"failed for {paths[0]}: {e}")
+                return
+            for path in paths:
+                yield from self._query(root, [path])
+            return
+        except OSError as e:
+            # E.g. pyre is missing; retrying with fewer files is of no use
+            self.logger.error(f"failed for {len(paths)} files, e.g. {paths[0]}: {e}")
+            return
+        except (subprocess.SubprocessError, ValueError, KeyError) as e:
+            if len(paths) == 1:
+                self.logger.error(f"failed for {paths[0]}: {e}")
+                return
+            yield from self._query(root, paths[: len(paths) // 2])
+            yield from self._query(root, paths[len(paths) // 2 :])
+            return
+
+        for relative in paths:
+            try:
+                module = libcst.parse_module((root / relative).read_text())
+            except Exception as e:
+                self.logger.error(f"failed for {relative}: {e}")
+                continue
+
+            # Files without any inferred types are missing from the response
+            yield relative, metadata.MetadataWrapper(
+                module,
+                unsafe_skip_copy=True,
+                cache={metadata.TypeInferenceProvider: types.get(relative, {"types": []})},
+            )
+
+    def _collect(
+        self, relative: pathlib.Path, module: metadata.MetadataWrapper
+    ) -> pt.DataFrame[InferredSchema]:
         visitor = _PyreQuery2Annotations()
         module.visit(visitor)
 
@@ -101,6 +157,36 @@ class PyreQuery(PerFileInference):
         return df.assign(method=self.method(), topn=1).pipe(pt.DataFrame[InferredSchema])
 
 
+def _query_types(root: pathlib.Path, paths: list[str], timeout: int) -> dict[str, dict]:
+    # A single types(...) query for all files, as FullRepoManager would issue
+    params = ",".join(f"path='{root / path}'" for path in paths)
+    result = subprocess.run(
+        ["pyre", "--noninteractive", "query", f"types({params})"],
+        capture_output=True,
+        timeout=timeout,
+        text=True,
+    )
+    result.check_returncode()
+    return _index_types(root, json.loads(result.stdout)["response"])
+
+
+def _index_types(root: pathlib.Path, response: list[dict]) -> dict[str, dict]:
+    """Index pyre's response by file relative to root, in the shape of TypeInferenceProvider's
+    cache. FullRepoManager matches the response to its paths by order instead, which
+    attributes types to the wrong files whenever pyre omits one"""
+    index = dict[str, dict]()
+    for entry in response:
+        path = pathlib.Path(entry["path"])
+        if path.is_absolute():
+            try:
+                path = path.relative_to(root)
+            except ValueError:
+                # Pyre reports paths with symlinks resolved, e.g. of temporary folders
+                path = path.relative_to(root.resolve())
+        index[str(path)] = {"types": entry["types"]}
+    return index
+
+
 class _PyreQuery2Annotations(
     visitors.HintableDeclarationVisitor,
     visitors.HintableParameterVisitor,
@@ -1,18 +1,13 @@
 import dataclasses
+import importlib.metadata
 import json
 import pathlib
-import pickle
 import typing
+from typing import Optional
 
 import libcst
-import numpy as np
-import onnxruntime
 import pandas as pd
 import pandera.typing as pt
-import torch
-import tqdm
-from annoy import AnnoyIndex
-from gensim.models import Word2Vec
 from libcst import codemod
 from libcst import metadata
 from libsa4py.cst_extractor import Extractor
@@ -23,8 +18,11 @@ from type4py.deploy.infer import (
 )
 
 import utils
-from src.common.schemas import InferredSchema
-from src.symbols.collector import build_type_collection
+from src.common import cache, pool
+from src.common.schemas import InferredSchema, TypeCollectionCategory
+from src.common.virtual import VirtualProject
+from src.symbols.collector import build_type_collection_from_sources
+from . import _adaptors, _assets, _onnx, _registry
 from ._base import ProjectWideInference
 
 
@@ -36,25 +34,94 @@ class FileDatapoints:
     param_type_hints: list
     rets_type_hints: list
 
+    def has_type_hints(self) -> bool:
+        return any(
+            dp_hint
+            for dp_hint in (self.vars_type_hints, self.param_type_hints, self.rets_type_hints)
+        )
+
+
+def _extract_datapoints(_, file_and_code: tuple[pathlib.Path, str]) -> Optional[FileDatapoints]:
+    file, src_f_read = file_and_code
+    try:
+        type_hints = Extractor.extract(src_f_read, include_seq2seq=False).to_dict()
+    except SyntaxError as e:
+        print(f"WARNING: Skipping {file} during datapoint calculation - {e}")
+        return None
+
+    (
+        all_type_slots,
+        vars_type_hints,
+        params_type_hints,
+        rets_type_hints,
+    ) = get_dps_single_file(type_hints)
+
+    return FileDatapoints(
+        ext_type_hints=type_hints,
+        all_type_slots=all_type_slots,
+        vars_type_hints=vars_type_hints,
+        param_type_hints=params_type_hints,
+        rets_type_hints=rets_type_hints,
+    )
+
+
+def create_or_load_datapoints(project: VirtualProject) -> dict[pathlib.Path, FileDatapoints]:
+    """Datapoints of every source in the project. Extraction depends on a file's content only,
+    so datapoints are cached by it and shared by Type4Py, HiType4Py and every removal
+    configuration; files that are not cached yet are extracted in parallel"""
+    store = cache.DiskCache[FileDatapoints](
+        "type4py-datapoints",
+        version=f"libsa4py-{importlib.metadata.version('libsa4py')}"
+        f"+type4py-{importlib.metadata.version('type4py')}",
+    )
+    keys = {file: cache.content_hash(code) for file, code in project}
+
+    datapoints = dict[pathlib.Path, FileDatapoints]()
+    misses = list[tuple[pathlib.Path, str]]()
+    for file, code in project:
+        if (dps := store.get(keys[file])) is not None:
+            datapoints[file] = dps
+        else:
+            misses.append((file, code))
+
+    with pool.shared_pool() as workers:
+        extracted = workers.map(
+            _extract_datapoints,
+            None,
+            misses,
+            sizes=[len(code) for _, code in misses],
+            desc=f"Computing datapoints for {project.root}",
+            on_failure=lambda _: None,
+        )
+
+    for (file, _), dps in zip(misses, extracted):
+        if dps is not None:
+            store.put(keys[file], dps)
+            datapoints[file] = dps
+
+    return datapoints
+
 
 class PTType4Py:
-    def __init__(self, pre_trained_model_path: pathlib.Path, topn: int):
+    def __init__(self, pre_trained_model_path: pathlib.Path, topn: int, quantized: bool = False):
         self.model_path = pre_trained_model_path
 
-        self.type4py_model = onnxruntime.InferenceSession(
-            str(self.model_path / f"type4py_complete_model.onnx"),
-            providers=[
-                "CUDAExecutionProvider" if torch.cuda.is_available() else "CPUExecutionProvider"
-            ],
+        # If quantized, an int8 copy of the model is evaluated on CPU
+        self.type4py_model = _onnx.session(
+            self.model_path / "type4py_complete_model.onnx", quantized=quantized
         )
         self.type4py_model_params = json.load((self.model_path / "model_params.json").open())
         self.type4py_model_params["k"] = topn
 
-        self.w2v_model = Word2Vec.load(fname=str(self.model_path / "w2v_token_model.bin"))
-        self.type_clusters_idx = AnnoyIndex(self.type4py_model_params["output_size"], "euclidean")
-        self.type_clusters_idx.load(str(self.model_path / "type4py_complete_type_cluster"))
-        self.type_clusters_labels = np.load(str(self.model_path / f"type4py_complete_true.npy"))
-        self.label_enc = pickle.load((self.model_path / "label_encoder_all.pkl").open("rb"))
+        # Shared by all instances within a process, and mapped across processes
+        self.w2v_model = _assets.word2vec(self.model_path / "w2v_token_model.bin")
+        self.type_clusters_idx = _assets.annoy_index(
+            self.model_path / "type4py_complete_type_cluster",
+            dimensions=self.type4py_model_params["output_size"],
+            metric="euclidean",
+        )
+        self.type_clusters_labels = _assets.array(self.model_path / "type4py_complete_true.npy")
+        self.label_enc = _assets.unpickled(self.model_path / "label_encoder_all.pkl")
 
         self.topn = topn
         self.vths = None
@@ -112,6 +179,48 @@ def _batchify(predictions: dict, topn: int) -> list[dict]:
     return batches
 
 
+def _scores(
+    path: pathlib.Path, predictions: dict, topn: int
+) -> typing.Iterator[_adaptors.ScoreRow]:
+    """Type4Py's KNN search yields (type, score) pairs per slot; retain the scores
+    under the qnames that the symbol collector derives for said slots"""
+    file = str(path)
+
+    def slot(
+        category: TypeCollectionCategory, qname: str, preds: list
+    ) -> typing.Iterator[_adaptors.ScoreRow]:
+        # libcst's qualified names mark nested scopes, the collector does not
+        qname = qname.replace(".<locals>", "")
+        for n, (_, score) in enumerate(preds[:topn], start=1):
+            yield file, category, qname, n, float(score)
+
+    def variables(scope: list[str], d: dict) -> typing.Iterator[_adaptors.ScoreRow]:
+        for v in d["variables"]:
+            yield from slot(
+                TypeCollectionCategory.VARIABLE, ".".join((*scope, v)), d["variables_p"][v]
+            )
+
+    def funcs(d: dict) -> typing.Iterator[_adaptors.ScoreRow]:
+        for fn in d["funcs"]:
+            for p in fn["params"]:
+                yield from slot(
+                    TypeCollectionCategory.CALLABLE_PARAMETER,
+                    f"{fn['q_name']}.{p}",
+                    fn["params_p"][p],
+                )
+            if "ret_type_p" in fn:
+                yield from slot(
+                    TypeCollectionCategory.CALLABLE_RETURN, fn["q_name"], fn["ret_type_p"]
+                )
+            yield from variables([fn["q_name"]], fn)
+
+    yield from variables([], predictions)
+    yield from funcs(predictions)
+    for clazz in predictions["classes"]:
+        yield from variables([clazz["q_name"]], clazz)
+        yield from funcs(clazz)
+
+
 class ParallelTypeApplier(codemod.ContextAwareTransformer):
     def __init__(
         self,
@@ -147,122 +256,77 @@ class _Type4Py(ProjectWideInference):
         self,
         model_path: pathlib.Path,
         topn: int,
+        quantized: bool = False,
     ):
         super().__init__()
 
         self.topn = topn
-        self.pretrained = PTType4Py(model_path, topn=topn)
+        self.quantized = quantized
+        self.pretrained = PTType4Py(model_path, topn=topn, quantized=quantized)
 
     def method(self) -> str:
-        return f"type4pyN{self.topn}"
+        return f"type4pyint8N{self.topn}" if self.quantized else f"type4pyN{self.topn}"
 
     def _infer_project(
         self, mutable: pathlib.Path, subset: set[pathlib.Path]
     ) -> pt.DataFrame[InferredSchema]:
-        proj_files = subset
+        project = VirtualProject.read(mutable, subset=subset)
 
-        paths2datapoints = self._create_or_load_datapoints(mutable, proj_files)
         paths_with_predictions = {
-            p: dp
-            for p, dp in paths2datapoints.items()
-            if dp is not None
-            and any(
-                dp_hint
-                for dp_hint in (
-                    dp.vars_type_hints,
-                    dp.param_type_hints,
-                    dp.rets_type_hints,
-                )
-            )
+            p: dps for p, dps in create_or_load_datapoints(project).items() if dps.has_type_hints()
         }
 
-        paths2batches = {
-            p: _batchify(
-                get_type_preds_single_file(
-                    dps.ext_type_hints,
-                    dps.all_type_slots,
-                    (dps.vars_type_hints, dps.param_type_hints, dps.rets_type_hints),
-                    self.pretrained,
-                    filter_pred_types=False,
-                ),
-                topn=self.topn,
+        paths2predictions = {
+            p: get_type_preds_single_file(
+                dps.ext_type_hints,
+                dps.all_type_slots,
+                (dps.vars_type_hints, dps.param_type_hints, dps.rets_type_hints),
+                self.pretrained,
+                filter_pred_types=False,
             )
             for p, dps in paths_with_predictions.items()
         }
+        paths2batches = {
+            p: _batchify(predictions, topn=self.topn)
+            for p, predictions in paths2predictions.items()
+        }
+        scores = _adaptors.scores2df(
+            row
+            for p, predictions in paths2predictions.items()
+            for row in _scores(p, predictions, topn=self.topn)
+        )
 
         collections = []
         for topn in range(1, self.topn + 1):
-            with utils.scratchpad(mutable) as sc:
-                t4p_hint_res = codemod.parallel_exec_transform_with_prettyprint(
-                    transform=ParallelTypeApplier(
-                        context=codemod.CodemodContext(),
-                        path2batches=paths2batches,
-                        topn=topn - 1,
-                    ),
-                    jobs=utils.worker_count(),
-                    repo_root=str(sc),
-                    files=[str(sc / p) for p in subset],
-                )
-                self.logger.info(
-                    utils.format_parallel_exec_result(
-                        f"Annotated with Type4Py @ topn={topn}", result=t4p_hint_res
-                    )
-                )
-                collections.append(
-                    build_type_collection(
-                        root=sc, allow_stubs=False, subset=set(proj_files)
-                    ).df.assign(topn=topn)
+            annotated, t4p_hint_res = project.transform(
+                ParallelTypeApplier(
+                    context=codemod.CodemodContext(),
+                    path2batches=paths2batches,
+                    topn=topn - 1,
+                ),
+                jobs=utils.worker_count(),
+            )
+            self.logger.info(
+                utils.format_parallel_exec_result(
+                    f"Annotated with Type4Py @ topn={topn}", result=t4p_hint_res
                 )
+            )
+            collections.append(
+                build_type_collection_from_sources(annotated).df.assign(topn=topn)
+            )
 
         return (
             pd.concat(collections, ignore_index=True)
             .assign(method=self.method())
-            .pipe(pt.DataFrame[InferredSchema])
+            .pipe(_adaptors.with_scores, scores)
         )
 
-    def _create_or_load_datapoints(
-        self, project: pathlib.Path, proj_files: set[pathlib.Path]
-    ) -> dict[pathlib.Path, FileDatapoints]:
-        datapoints = dict[pathlib.Path, FileDatapoints]()
-
-        for file in (pbar := tqdm.tqdm(proj_files)):
-            pbar.set_description(desc=f"Computing datapoints for {file}")
-            filepath = project / file
-
-            try:
-                with filepath.open() as f:
-                    src_f_read = f.read()
-                type_hints = Extractor.extract(src_f_read, include_seq2seq=False).to_dict()
-
-                (
-                    all_type_slots,
-                    vars_type_hints,
-                    params_type_hints,
-                    rets_type_hints,
-                ) = get_dps_single_file(type_hints)
-
-                datapoints[file] = FileDatapoints(
-                    ext_type_hints=type_hints,
-                    all_type_slots=all_type_slots,
-                    vars_type_hints=vars_type_hints,
-                    param_type_hints=params_type_hints,
-                    rets_type_hints=rets_type_hints,
-                )
-
-            except (
-                UnicodeDecodeError,
-                FileNotFoundError,
-                IsADirectoryError,
-                SyntaxError,
-            ) as e:
-                self.logger.warning(f"Skipping {file} during datapoint calculation - {e}")
-
-        return datapoints
-
 
 class _Type4PyTopN(_Type4Py):
-    def __init__(self, topn: int):
-        super().__init__(model_path=pathlib.Path.cwd() / "models" / "type4py", topn=topn)
+    def __init__(self, topn: int, quantized: bool = False):
+        super().__init__(
+            model_path=_registry.resolve("type4py"), topn=topn, quantized=quantized
+        )
 
 
 class Type4PyTop1(_Type4PyTopN):
@@ -283,3 +347,8 @@ class Type4PyTop5(_Type4PyTopN):
 class Type4PyTop10(_Type4PyTopN):
     def __init__(self):
         super().__init__(topn=10)
+
+
+class Type4PyInt8Top10(_Type4PyTopN):
+    def __init__(self):
+        super().__init__(topn=10, quantized=True)
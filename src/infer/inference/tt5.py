@@ -1,3 +1,5 @@
+import concurrent.futures
+import dataclasses
 import pathlib
 import torch
 
@@ -7,6 +9,7 @@ from typet5.utils import *
 from typet5.function_decoding import (
     RolloutCtx,
     PreprocessArgs,
+    DecodingOrder,
     DecodingOrders,
     RolloutPredictionTopN,
     SignatureMap,
@@ -26,8 +29,10 @@ from libcst import codemod
 import pandera.typing as pt
 
 from src.common.schemas import InferredSchema
+from src.infer.inference import _batching, _registry
 from src.infer.inference._base import ProjectWideInference
-from src.symbols.collector import build_type_collection
+from src.common.virtual import VirtualProject
+from src.symbols.collector import build_type_collection_from_sources
 import utils
 
 
@@ -59,59 +64,166 @@ class TypeT5Configs:
     )
 
 
+@dataclasses.dataclass(frozen=True)
+class DecodingProfile:
+    # Beams searched per function; None ties them to the number of requested predictions
+    num_beams: Optional[int]
+    decode_order: Callable[[], DecodingOrder]
+    # Dynamically quantize the model's linear layers to int8 when running on CPU
+    quantize: bool
+    # Functions whose decoder calls are merged into one; only of use if the decoding order
+    # lets functions be decoded concurrently
+    decode_batch: int = 1
+
+
+class DecodingProfiles:
+    # As evaluated by TypeT5's authors; every function is decoded twice, one at a time
+    Accurate = DecodingProfile(
+        num_beams=16, decode_order=DecodingOrders.DoubleTraversal, quantize=False
+    )
+
+    # For CPU-only nodes: each function is decoded once, without waiting on the predictions
+    # for its callees and callers, and the decoder calls of up to 8 functions are batched
+    Throughput = DecodingProfile(
+        num_beams=None,
+        decode_order=DecodingOrders.IndependentOrder,
+        quantize=True,
+        decode_batch=8,
+    )
+
+
+class _BatchedDecoder:
+    """Stands in for TypeT5's ModelWrapper in the rollout. The rollout decodes each function
+    with its own predict_on_batch call over the function's chunks; calls that are made
+    concurrently are merged into a single decoder call over the chunks of all functions"""
+
+    # Seconds that a function's call waits for those of others to join it
+    WAIT = 0.05
+
+    def __init__(self, wrapper: ModelWrapper, max_batch: int) -> None:
+        self.wrapper = wrapper
+        self.coalescer = _batching.Coalescer(self._predict, max_batch=max_batch, wait=self.WAIT)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.wrapper, name)
+
+    def predict_on_batch(self, batch: dict, num_return_sequences: Optional[int] = None):
+        return self.coalescer((batch, num_return_sequences))
+
+    def _predict(self, requests: list[tuple[dict, Optional[int]]]) -> list[tuple]:
+        sequences = {n for _, n in requests}
+        if len(requests) == 1 or len(sequences) > 1 or not all(map(_mergeable, requests)):
+            return [self.wrapper.predict_on_batch(batch, n) for batch, n in requests]
+
+        # Rows are right-padded to the longest; generate masks out padding of the inputs
+        inputs = [batch["input_ids"] for batch, _ in requests]
+        width = max(ids.shape[1] for ids in inputs)
+        pad = self.wrapper.tokenizer.pad_token_id
+        merged = {
+            "input_ids": torch.cat(
+                [
+                    torch.nn.functional.pad(ids, (0, width - ids.shape[1]), value=pad)
+                    for ids in inputs
+                ]
+            ),
+            "n_labels": [n for batch, _ in requests for n in batch["n_labels"]],
+        }
+        (num_return_sequences,) = sequences
+        pred_types, output_ids = self.wrapper.predict_on_batch(merged, num_return_sequences)
+
+        # Split by rows of each function; generate returns num_return_sequences outputs per row
+        per_row = num_return_sequences or 1
+        answers, start = list[tuple](), 0
+        for batch, _ in requests:
+            end = start + len(batch["n_labels"])
+            answers.append((pred_types[start:end], output_ids[start * per_row : end * per_row]))
+            start = end
+        return answers
+
+
+def _mergeable(request: tuple[dict, Optional[int]]) -> bool:
+    batch, _ = request
+    return batch.keys() == {"input_ids", "n_labels"} and isinstance(
+        batch["input_ids"], torch.Tensor
+    )
+
+
 class _TypeT5(ProjectWideInference):
-    def __init__(self, topn: int) -> None:
+    def __init__(self, topn: int, profile: DecodingProfile = DecodingProfiles.Accurate) -> None:
         super().__init__()
-        self.wrapper = ModelWrapper.load_from_hub("MrVPlusOne/TypeT5-v7")
+        self.wrapper = ModelWrapper.load(_registry.resolve("typet5"))
         self.wrapper.args = DecodingArgs(
             sampling_max_tokens=TypeT5Configs.Default.ctx_size,
             ctx_args=TypeT5Configs.Default.dec_ctx_args(),
             do_sample=False,
             top_p=1.0,
-            num_beams=16,
+            # Beam search cannot return more sequences than it has beams
+            num_beams=max(profile.num_beams or topn, topn),
         )
-        self.wrapper.to(torch.device(f"cuda" if torch.cuda.is_available() else "cpu"))
+
+        if torch.cuda.is_available():
+            self.wrapper.to(torch.device("cuda"))
+        else:
+            self.wrapper.to(torch.device("cpu"))
+            if profile.quantize:
+                self.wrapper.model = torch.quantization.quantize_dynamic(
+                    self.wrapper.model, {torch.nn.Linear}, dtype=torch.qint8
+                )
 
         self.topn = topn
+        self.profile = profile
+
+        # Shared by the rollouts of all projects, as is the thread that calls the decoder
+        self.model = (
+            self.wrapper
+            if profile.decode_batch == 1
+            else _BatchedDecoder(self.wrapper, max_batch=profile.decode_batch)
+        )
 
     def method(self) -> str:
+        if self.profile == DecodingProfiles.Throughput:
+            return f"TypeT5FastTopN{self.topn}"
         return f"TypeT5TopN{self.topn}"
 
     def _infer_project(
         self, mutable: pathlib.Path, subset: set[pathlib.Path]
     ) -> pt.DataFrame[InferredSchema]:
         project = PythonProject.parse_from_root(root=mutable)
-        rctx = RolloutCtx(model=self.wrapper)
-
-        rollout: RolloutPredictionTopN = asyncio.run(
-            rctx.run_on_project(
-                project,
-                pre_args=PreprocessArgs(),
-                decode_order=DecodingOrders.DoubleTraversal(),
-                num_return_sequences=self.topn,
+
+        rctx = RolloutCtx(model=self.model)
+
+        # The rollout runs the model on a single thread by default, i.e. one function at a time;
+        # give it as many threads as there are functions to batch, so that their calls overlap
+        with concurrent.futures.ThreadPoolExecutor(self.profile.decode_batch) as model_executor:
+            rollout: RolloutPredictionTopN = asyncio.run(
+                rctx.run_on_project(
+                    project,
+                    pre_args=PreprocessArgs(),
+                    decode_order=self.profile.decode_order(),
+                    model_executor=model_executor,
+                    num_return_sequences=self.topn,
+                )
             )
-        )
+
+        sources = VirtualProject.read(mutable, subset=subset)
 
         collections = []
         for topn, batch in enumerate(_batchify(rollout.final_sigmap, self.topn), start=1):
-            with utils.scratchpad(mutable) as sc:
-                res = codemod.parallel_exec_transform_with_prettyprint(
-                    transform=TypeT5Applier(
-                        context=codemod.CodemodContext(),
-                        predictions=batch,
-                    ),
-                    jobs=utils.worker_count(),
-                    repo_root=str(sc),
-                    files=[str(sc / f) for f in subset],
-                )
-                self.logger.info(
-                    utils.format_parallel_exec_result(
-                        f"Annotated with TypeT5 @ topn={topn}", result=res
-                    )
+            annotated, res = sources.transform(
+                TypeT5Applier(
+                    context=codemod.CodemodContext(),
+                    predictions=batch,
+                ),
+                jobs=utils.worker_count(),
+            )
+            self.logger.info(
+                utils.format_parallel_exec_result(
+                    f"Annotated with TypeT5 @ topn={topn}", result=res
                 )
+            )
 
-                collected = build_type_collection(root=sc, allow_stubs=False, subset=subset).df
-                collections.append(collected.assign(topn=topn))
+            collected = build_type_collection_from_sources(annotated).df
+            collections.append(collected.assign(topn=topn))
         return (
             pd.concat(collections, ignore_index=True)
             .assign(method=self.method())
@@ -144,3 +256,8 @@ class TypeT5Top5(_TypeT5):
 class TypeT5Top10(_TypeT5):
     def __init__(self) -> None:
         super().__init__(topn=10)
+
+
+class TypeT5FastTop10(_TypeT5):
+    def __init__(self) -> None:
+        super().__init__(topn=10, profile=DecodingProfiles.Throughput)
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 import dataclasses
+import functools
 import logging
 import os
 import pathlib
-import pickle
 import re
 import tempfile
+import typing
 from ast import literal_eval
 from os.path import splitext, basename, join
 from typing import List, no_type_check, Optional
@@ -38,8 +39,11 @@ from typewriter.prepocessing import (
 )
 
 import utils
-from src.common.schemas import InferredSchema
-from src.symbols.collector import build_type_collection
+from src.common import pool
+from src.common.schemas import InferredSchema, TypeCollectionCategory
+from src.common.virtual import VirtualProject
+from src.symbols.collector import build_type_collection_from_sources
+from . import _adaptors, _assets, _registry
 from ._base import ProjectWideInference
 
 # Device configuration
@@ -49,15 +53,16 @@ pd.set_option("display.max_columns", 20)
 
 # Credits go to the original Author: Amir M. Mir (TU Delft)
 @no_type_check
-def process_py_src_file(src_file_path):
+def process_py_src_file(src_file_path, src=None):
     """
     It extracts and process functions from a given Python source file
 
     :param src_file_path:
+    :param src: contents of the file, if already read
     :return:
     """
     try:
-        functions, _ = extractor.extract(read_file(src_file_path))
+        functions, _ = extractor.extract(src if src is not None else read_file(src_file_path))
         preprocessed_funcs = [preprocessor.preprocess(f) for f in functions]
         return preprocessed_funcs
 
@@ -168,10 +173,12 @@ def load_ret_data(vector_dir: str):
 
 @no_type_check
 def evaluate_TW(model: torch.nn.Module, data_loader: DataLoader, top_n=1):
+    """Top-n labels of each datapoint, and their probabilities under the model's softmax"""
     predicted_labels = torch.tensor([], dtype=torch.long).to(device)
+    predicted_probs = torch.tensor([], dtype=torch.float).to(device)
 
     for i, (batch_id, batch_tok, batch_cm, batch_type) in enumerate(data_loader):
-        _, batch_labels = make_batch_prediction_TW(
+        output, batch_labels = make_batch_prediction_TW(
             model.to(device),
             batch_id.to(device),
             batch_tok.to(device),
@@ -180,11 +187,13 @@ def evaluate_TW(model: torch.nn.Module, data_loader: DataLoader, top_n=1):
             top_n=top_n,
         )
 
-        predicted_labels = torch.cat((predicted_labels, batch_labels), 0)
+        # The model emits logits, as it is trained against a cross-entropy loss
+        batch_probs = torch.softmax(output, dim=-1).gather(1, batch_labels)
 
-    predicted_labels = predicted_labels.data.cpu().numpy()
+        predicted_labels = torch.cat((predicted_labels, batch_labels), 0)
+        predicted_probs = torch.cat((predicted_probs, batch_probs), 0)
 
-    return predicted_labels
+    return predicted_labels.data.cpu().numpy(), predicted_probs.data.cpu().numpy()
 
 
 @dataclasses.dataclass
@@ -192,12 +201,14 @@ class Parameter:
     fname: str
     pname: str
     ty: str
+    score: Optional[float] = None
 
 
 @dataclasses.dataclass
 class Return:
     fname: str
     ty: str
+    score: Optional[float] = None
 
 
 class ParallelTypeApplier(codemod.ContextAwareTransformer):
@@ -243,14 +254,11 @@ class _TypeWriter(ProjectWideInference):
         self.topn = topn
         self.model_path = model_path
 
-        self.w2v_token_model = Word2Vec.load(str(self.model_path / "w2v_token_model.bin"))
-        self.w2v_comments_model = Word2Vec.load(str(self.model_path / "w2v_comments_model.bin"))
-
         self.tw_model = torch.load(
             self.model_path / "tw_pretrained_model_combined.pt",
             map_location=device,
         )
-        self.label_encoder = pickle.load(open(join(self.model_path, "label_encoder.pkl"), "rb"))
+        self.label_encoder = _assets.unpickled(self.model_path / "label_encoder.pkl")
 
         if not torch.cuda.is_available():
             self.tw_model = self.tw_model.module
@@ -258,304 +266,380 @@ class _TypeWriter(ProjectWideInference):
     def _infer_project(
         self, mutable: pathlib.Path, subset: set[pathlib.Path]
     ) -> pt.DataFrame[InferredSchema]:
-        proj_files = subset
-
-        file2topnpreds: dict[pathlib.Path, tuple[list[list[Parameter]], list[list[Return]]]] = {}
-        for file in proj_files:
-            if (predictions := self.infer_for_file(mutable, file)) is None:
-                continue
-            file2topnpreds[file] = predictions
+        project = VirtualProject.read(mutable, subset=subset)
+        file2topnpreds = dict(self.infer_for_project(project))
+        scores = _adaptors.scores2df(
+            row
+            for relative, (parameters, returns) in file2topnpreds.items()
+            for row in _scores(project, relative, parameters, returns, self.logger)
+        )
 
         collections = []
         for topn in range(1, self.topn + 1):
-            with utils.scratchpad(mutable) as sc:
-                tw_hint_res = codemod.parallel_exec_transform_with_prettyprint(
-                    transform=ParallelTypeApplier(
-                        context=codemod.CodemodContext(),
-                        path2batches=file2topnpreds,
-                        topn=topn - 1,
-                        logger=self.logger,
-                    ),
-                    jobs=utils.worker_count(),
-                    repo_root=str(sc),
-                    files=[sc / f for f in subset],
-                )
-                self.logger.info(
-                    utils.format_parallel_exec_result(
-                        f"Annotated with TypeWriter @ topn={topn}", result=tw_hint_res
-                    )
-                )
-                collections.append(
-                    build_type_collection(
-                        root=sc, allow_stubs=False, subset=subset
-                    ).df.assign(topn=topn)
+            annotated, tw_hint_res = project.transform(
+                ParallelTypeApplier(
+                    context=codemod.CodemodContext(),
+                    path2batches=file2topnpreds,
+                    topn=topn - 1,
+                    logger=self.logger,
+                ),
+                jobs=utils.worker_count(),
+            )
+            self.logger.info(
+                utils.format_parallel_exec_result(
+                    f"Annotated with TypeWriter @ topn={topn}", result=tw_hint_res
                 )
+            )
+            collections.append(
+                build_type_collection_from_sources(annotated).df.assign(topn=topn)
+            )
         return (
             pd.concat(collections, ignore_index=True)
             .assign(method=self.method())
             .pipe(pt.DataFrame[InferredSchema])
+            .pipe(_adaptors.with_scores, scores)
         )
 
-    def infer_for_file(
-        self, root: pathlib.Path, relative: pathlib.Path
-    ) -> Optional[tuple[list[list[Parameter]], list[list[Return]]]]:
-        filename = str(root / relative)
+    def infer_for_project(
+        self, project: VirtualProject
+    ) -> typing.Iterator[tuple[pathlib.Path, tuple[list[list[Parameter]], list[list[Return]]]]]:
+        """Predictions for each file that has functions, in no particular order.
+        Features are extracted by the workers of the shared pool while the model predicts
+        over those of files that are already done"""
+        with pool.shared_pool() as workers:
+            for batch in workers.imap_unordered(
+                _extract_features,
+                self.model_path,
+                list(project),
+                sizes=[len(code) for _, code in project],
+                desc=f"Extracting TypeWriter features for {project.root}",
+                on_failure=lambda _: None,
+            ):
+                for features in batch:
+                    if features is not None:
+                        yield features.relative, self._predict(features)
+
+    def _predict(
+        self, features: _FileFeatures
+    ) -> tuple[list[list[Parameter]], list[list[Return]]]:
+        # self.logger.info("--------------------Argument Types Prediction--------------------")
+        params_data_loader = DataLoader(
+            TensorDataset(*map(torch.from_numpy, features.params))
+        )
 
-        with tempfile.TemporaryDirectory() as TEMP_DIR:
-            ext_funcs = process_py_src_file(filename)
-            if not ext_funcs:
-                self.logger.warning(
-                    f"Did not find any functions in {relative}, therefore no types to infer"
-                )
-                return None
+        params_pred, params_probs = evaluate_TW(self.tw_model, params_data_loader, self.topn)
 
-            # self.logger.debug(f"Number of the extracted functions: {len(ext_funcs)}")
+        # (function, parameter, [type]s, [probability]s)
+        param_inf: list[tuple[str, str, list[str], list[float]]] = []
+        for (fname, param), p, probs in zip(features.param_names, params_pred, params_probs):
+            predictions = list(self.label_encoder.inverse_transform(p))
 
-            write_ext_funcs(ext_funcs, filename, TEMP_DIR)
+            #p = " ".join(["%d. %s" % (j, t) for j, t in enumerate(predictions, start=1)])
+            #self.logger.debug(f"{fname}: {param} -> {p}")
 
-            ext_funcs_df = pd.read_csv(
-                os.path.join(TEMP_DIR, f"ext_funcs_{relative.with_suffix('').name}.csv")
-            )
-            ext_funcs_df = filter_functions(ext_funcs_df)
-            ext_funcs_df_params = gen_argument_df_TW(ext_funcs_df)
-
-            # self.logger.debug(
-            #    f"Number of extracted arguments: {ext_funcs_df_params['arg_name'].count()}"
-            # )
-            ext_funcs_df_params = ext_funcs_df_params[
-                (ext_funcs_df_params["arg_name"] != "self")
-                & (
-                    (ext_funcs_df_params["arg_type"] != "Any")
-                    & (ext_funcs_df_params["arg_type"] != "None")
-                )
-            ]
+            param_inf.append((fname, param, predictions, list(map(float, probs))))
 
-            # self.logger.debug(
-            #    f"Number of Arguments after ignoring self and types with Any and None: {ext_funcs_df_params.shape[0]}"
-            # )
+        # self.logger.info("--------------------Return Types Prediction--------------------")
+        ret_data_loader = DataLoader(TensorDataset(*map(torch.from_numpy, features.rets)))
 
-            ext_funcs_df_ret = filter_ret_funcs(ext_funcs_df)
-            ext_funcs_df_ret = format_df(ext_funcs_df_ret)
+        ret_pred, ret_probs = evaluate_TW(self.tw_model, ret_data_loader, self.topn)
 
-            ext_funcs_df_ret["arg_names_str"] = ext_funcs_df_ret["arg_names"].apply(
-                lambda l: " ".join([v for v in l if v != "self"])
-            )
-            ext_funcs_df_ret["return_expr_str"] = ext_funcs_df_ret["return_expr"].apply(
-                lambda l: " ".join([re.sub(r"self\.?", "", v) for v in l])
-            )
-            ext_funcs_df_ret = ext_funcs_df_ret.drop(
-                columns=[
-                    "has_type",
-                    "arg_names",
-                    "arg_types",
-                    "arg_descrs",
-                    "return_expr",
-                ]
-            )
+        ret_inf: list[tuple[str, list[str], list[float]]] = []
+        for fname, p, probs in zip(features.ret_names, ret_pred, ret_probs):
+            predictions = list(self.label_encoder.inverse_transform(p))
 
-            df_avl_types = pd.read_csv(join(self.model_path, "top_999_types.csv"))
-            ext_funcs_df_params, ext_funcs_df_ret = encode_aval_types_TW(
-                ext_funcs_df_params, ext_funcs_df_ret, df_avl_types
-            )
+            # p = " ".join(["%d. %s" % (j, t) for j, t in enumerate(predictions, start=1)])
+            #self.logger.debug(f"{fname} -> {p}")
 
-            ext_funcs_df_params.to_csv(os.path.join(TEMP_DIR, "ext_funcs_params.csv"), index=False)
-            ext_funcs_df_ret.to_csv(os.path.join(TEMP_DIR, "ext_funcs_ret.csv"), index=False)
+            ret_inf.append((fname, predictions, list(map(float, probs))))
 
-            # Arguments transformers
-            id_trans_func_param = lambda row: IdentifierSequence(
-                self.w2v_token_model, row.arg_name, row.other_args, row.func_name
-            )
-            token_trans_func_param = lambda row: TokenSequence(
-                self.w2v_token_model, 7, 3, row.arg_occur, None
-            )
-            cm_trans_func_param = lambda row: CommentSequence(
-                self.w2v_comments_model, row.func_descr, row.arg_comment, None
-            )
+        arg_batches: list[list[Parameter]] = []
+        ret_batches: list[list[Return]] = []
 
-            # Returns transformers
-            id_trans_func_ret = lambda row: IdentifierSequence(
-                self.w2v_token_model, None, row.arg_names_str, row.name
-            )
-            token_trans_func_ret = lambda row: TokenSequence(
-                self.w2v_token_model, 7, 3, None, row.return_expr_str
-            )
-            cm_trans_func_ret = lambda row: CommentSequence(
-                self.w2v_comments_model, row.func_descr, None, row.return_descr
-            )
+        for n in range(self.topn):
+            arg_batch: list[Parameter] = []
+            ret_batch: list[Return] = []
 
-            # print("Generating identifiers sequences")
-            dp_ids_params = process_datapoints_TW(
-                os.path.join(TEMP_DIR, "ext_funcs_params.csv"),
-                TEMP_DIR,
-                "identifiers_",
-                "params",
-                id_trans_func_param,
-            )
+            for fname, argname, ppreds, pprobs in param_inf:
+                arg_batch.append(
+                    Parameter(fname=fname, pname=argname, ty=ppreds[n], score=pprobs[n])
+                )
 
-            dp_ids_ret = process_datapoints_TW(
-                os.path.join(TEMP_DIR, "ext_funcs_ret.csv"),
-                TEMP_DIR,
-                "identifiers_",
-                "ret",
-                id_trans_func_ret,
-            )
+            for fname, rp, rprobs in ret_inf:
+                ret_batch.append(Return(fname=fname, ty=rp[n], score=rprobs[n]))
 
-            # print("Generating tokens sequences")
-            dp_tokens_params = process_datapoints_TW(
-                os.path.join(TEMP_DIR, "ext_funcs_params.csv"),
-                TEMP_DIR,
-                "tokens_",
-                "params",
-                token_trans_func_param,
-            )
-            dp_tokens_ret = process_datapoints_TW(
-                os.path.join(TEMP_DIR, "ext_funcs_ret.csv"),
-                TEMP_DIR,
-                "tokens_",
-                "ret",
-                token_trans_func_ret,
-            )
+            arg_batches.append(arg_batch)
+            ret_batches.append(ret_batch)
 
-            # print("Generating comments sequences")
-            dp_cms_params = process_datapoints_TW(
-                join(TEMP_DIR, "ext_funcs_params.csv"),
-                TEMP_DIR,
-                "comments_",
-                "params",
-                cm_trans_func_param,
-            )
-            dp_cms_ret = process_datapoints_TW(
-                join(TEMP_DIR, "ext_funcs_ret.csv"),
-                TEMP_DIR,
-                "comments_",
-                "ret",
-                cm_trans_func_ret,
-            )
+        return arg_batches, ret_batches
 
-            # print("Generating sequences for available types hints")
-            dp_params_aval_types, dp_ret__aval_types = gen_aval_types_datapoints(
-                join(TEMP_DIR, "ext_funcs_params.csv"),
-                join(TEMP_DIR, "ext_funcs_ret.csv"),
-                "",
-                TEMP_DIR,
-            )
 
-            # self.logger.info("--------------------Argument Types Prediction--------------------")
-            id_params, tok_params, com_params, aval_params = load_param_data(TEMP_DIR)
-            params_data_loader = DataLoader(
-                TensorDataset(id_params, tok_params, com_params, aval_params)
-            )
+@functools.lru_cache(maxsize=None)
+def _feature_assets(model_path: pathlib.Path) -> tuple[Word2Vec, Word2Vec, pd.DataFrame]:
+    # Loaded once per process, rather than once per file
+    return (
+        _assets.word2vec(model_path / "w2v_token_model.bin"),
+        _assets.word2vec(model_path / "w2v_comments_model.bin"),
+        pd.read_csv(join(model_path, "top_999_types.csv")),
+    )
 
-            params_pred = [p for p in evaluate_TW(self.tw_model, params_data_loader, self.topn)]
 
-            # (function, parameter, [type]s)
-            param_inf: list[tuple[str, str, list[str]]] = []
-            for i, p in enumerate(params_pred):
-                fname = ext_funcs_df_params["func_name"].iloc[i]
-                param = ext_funcs_df_params["arg_name"].iloc[i]
-                predictions = list(self.label_encoder.inverse_transform(p))
+@dataclasses.dataclass
+class _FileFeatures:
+    relative: pathlib.Path
+
+    # (function, parameter) and function of each datapoint, in order
+    param_names: list[tuple[str, str]]
+    ret_names: list[str]
+
+    # Identifier, token, comment and available type sequences; sent back to the parent
+    # as arrays, as tensors would be shared through file descriptors
+    params: tuple[np.ndarray, ...]
+    rets: tuple[np.ndarray, ...]
+
+
+def _extract_features(
+    model_path: pathlib.Path, file_and_code: tuple[pathlib.Path, str]
+) -> Optional[_FileFeatures]:
+    relative, code = file_and_code
+    filename = str(relative)
+    w2v_token_model, w2v_comments_model, df_avl_types = _feature_assets(model_path)
+
+    with tempfile.TemporaryDirectory() as TEMP_DIR:
+        ext_funcs = process_py_src_file(filename, src=code)
+        if not ext_funcs:
+            print(f"WARNING: Did not find any functions in {relative}, therefore no types to infer")
+            return None
 
-                #p = " ".join(["%d. %s" % (j, t) for j, t in enumerate(predictions, start=1)])
-                #self.logger.debug(f"{fname}: {param} -> {p}")
+        # self.logger.debug(f"Number of the extracted functions: {len(ext_funcs)}")
 
-                param_inf.append((fname, param, predictions))
+        write_ext_funcs(ext_funcs, filename, TEMP_DIR)
 
-            # self.logger.info("--------------------Return Types Prediction--------------------")
-            id_ret, tok_ret, com_ret, aval_ret = load_ret_data(TEMP_DIR)
-            ret_data_loader = DataLoader(TensorDataset(id_ret, tok_ret, com_ret, aval_ret))
+        ext_funcs_df = pd.read_csv(
+            os.path.join(TEMP_DIR, f"ext_funcs_{relative.with_suffix('').name}.csv")
+        )
+        ext_funcs_df = filter_functions(ext_funcs_df)
+        ext_funcs_df_params = gen_argument_df_TW(ext_funcs_df)
+
+        # self.logger.debug(
+        #    f"Number of extracted arguments: {ext_funcs_df_params['arg_name'].count()}"
+        # )
+        ext_funcs_df_params = ext_funcs_df_params[
+            (ext_funcs_df_params["arg_name"] != "self")
+            & (
+                (ext_funcs_df_params["arg_type"] != "Any")
+                & (ext_funcs_df_params["arg_type"] != "None")
+            )
+        ]
 
-            ret_pred = [p for p in evaluate_TW(self.tw_model, ret_data_loader, self.topn)]
+        # self.logger.debug(
+        #    f"Number of Arguments after ignoring self and types with Any and None: {ext_funcs_df_params.shape[0]}"
+        # )
 
-            ret_inf: list[tuple[str, list[str]]] = []
-            for i, p in enumerate(ret_pred):
-                fname = ext_funcs_df_ret["name"].iloc[i]
-                predictions = list(self.label_encoder.inverse_transform(p))
+        ext_funcs_df_ret = filter_ret_funcs(ext_funcs_df)
+        ext_funcs_df_ret = format_df(ext_funcs_df_ret)
 
-                # p = " ".join(["%d. %s" % (j, t) for j, t in enumerate(predictions, start=1)])
-                #self.logger.debug(f"{fname} -> {p}")
+        ext_funcs_df_ret["arg_names_str"] = ext_funcs_df_ret["arg_names"].apply(
+            lambda l: " ".join([v for v in l if v != "self"])
+        )
+        ext_funcs_df_ret["return_expr_str"] = ext_funcs_df_ret["return_expr"].apply(
+            lambda l: " ".join([re.sub(r"self\.?", "", v) for v in l])
+        )
+        ext_funcs_df_ret = ext_funcs_df_ret.drop(
+            columns=[
+                "has_type",
+                "arg_names",
+                "arg_types",
+                "arg_descrs",
+                "return_expr",
+            ]
+        )
 
-                ret_inf.append((fname, predictions))
+        ext_funcs_df_params, ext_funcs_df_ret = encode_aval_types_TW(
+            ext_funcs_df_params, ext_funcs_df_ret, df_avl_types
+        )
 
-            arg_batches: list[list[Parameter]] = []
-            ret_batches: list[list[Return]] = []
+        ext_funcs_df_params.to_csv(os.path.join(TEMP_DIR, "ext_funcs_params.csv"), index=False)
+        ext_funcs_df_ret.to_csv(os.path.join(TEMP_DIR, "ext_funcs_ret.csv"), index=False)
 
-            for n in range(self.topn):
-                arg_batch: list[Parameter] = []
-                ret_batch: list[Return] = []
+        # Arguments transformers
+        id_trans_func_param = lambda row: IdentifierSequence(
+            w2v_token_model, row.arg_name, row.other_args, row.func_name
+        )
+        token_trans_func_param = lambda row: TokenSequence(
+            w2v_token_model, 7, 3, row.arg_occur, None
+        )
+        cm_trans_func_param = lambda row: CommentSequence(
+            w2v_comments_model, row.func_descr, row.arg_comment, None
+        )
 
-                for fname, argname, ppreds in param_inf:
-                    arg_batch.append(Parameter(fname=fname, pname=argname, ty=ppreds[n]))
+        # Returns transformers
+        id_trans_func_ret = lambda row: IdentifierSequence(
+            w2v_token_model, None, row.arg_names_str, row.name
+        )
+        token_trans_func_ret = lambda row: TokenSequence(
+            w2v_token_model, 7, 3, None, row.return_expr_str
+        )
+        cm_trans_func_ret = lambda row: CommentSequence(
+            w2v_comments_model, row.func_descr, None, row.return_descr
+        )
 
-                for fname, rp in ret_inf:
-                    ret_batch.append(Return(fname=fname, ty=rp[n]))
+        # print("Generating identifiers sequences")
+        dp_ids_params = process_datapoints_TW(
+            os.path.join(TEMP_DIR, "ext_funcs_params.csv"),
+            TEMP_DIR,
+            "identifiers_",
+            "params",
+            id_trans_func_param,
+        )
 
-                arg_batches.append(arg_batch)
-                ret_batches.append(ret_batch)
+        dp_ids_ret = process_datapoints_TW(
+            os.path.join(TEMP_DIR, "ext_funcs_ret.csv"),
+            TEMP_DIR,
+            "identifiers_",
+            "ret",
+            id_trans_func_ret,
+        )
 
-            return arg_batches, ret_batches
+        # print("Generating tokens sequences")
+        dp_tokens_params = process_datapoints_TW(
+            os.path.join(TEMP_DIR, "ext_funcs_params.csv"),
+            TEMP_DIR,
+            "tokens_",
+            "params",
+            token_trans_func_param,
+        )
+        dp_tokens_ret = process_datapoints_TW(
+            os.path.join(TEMP_DIR, "ext_funcs_ret.csv"),
+            TEMP_DIR,
+            "tokens_",
+            "ret",
+            token_trans_func_ret,
+        )
 
+        # print("Generating comments sequences")
+        dp_cms_params = process_datapoints_TW(
+            join(TEMP_DIR, "ext_funcs_params.csv"),
+            TEMP_DIR,
+            "comments_",
+            "params",
+            cm_trans_func_param,
+        )
+        dp_cms_ret = process_datapoints_TW(
+            join(TEMP_DIR, "ext_funcs_ret.csv"),
+            TEMP_DIR,
+            "comments_",
+            "ret",
+            cm_trans_func_ret,
+        )
+
+        # print("Generating sequences for available types hints")
+        dp_params_aval_types, dp_ret__aval_types = gen_aval_types_datapoints(
+            join(TEMP_DIR, "ext_funcs_params.csv"),
+            join(TEMP_DIR, "ext_funcs_ret.csv"),
+            "",
+            TEMP_DIR,
+        )
+
+        return _FileFeatures(
+            relative=relative,
+            param_names=list(
+                zip(ext_funcs_df_params["func_name"], ext_funcs_df_params["arg_name"])
+            ),
+            ret_names=list(ext_funcs_df_ret["name"]),
+            params=tuple(t.numpy() for t in load_param_data(TEMP_DIR)),
+            rets=tuple(t.numpy() for t in load_ret_data(TEMP_DIR)),
+        )
+
+
+class _PredictionCursor:
+    """TypeWriter's predictions are in the order of its extractor; match them to the nodes
+    of a file by name, skipping over predictions whose nodes cannot be found"""
 
-class Typewriter2Annotations(libcst.codemod.ContextAwareTransformer):
     def __init__(
         self,
-        context: codemod.CodemodContext,
         parameters: list[Parameter],
         returns: list[Return],
+        filename: Optional[str],
         logger: logging.Logger,
     ) -> None:
-        super().__init__(context)
-
         self.parameters = parameters
         self.param_cursor = 0
 
         self.returns = returns
         self.ret_cursor = 0
 
+        self.filename = filename
         self.logger = logger
 
-    def leave_FunctionDef(self, _, f: libcst.FunctionDef) -> libcst.FunctionDef:
+    def ret(self, f: libcst.FunctionDef) -> Optional[int]:
         name = preprocessor.process_identifier(f.name.value)
 
         rc = self.ret_cursor
         try:
-            while (r := self.returns[rc]).fname != name:
+            while self.returns[rc].fname != name:
                 rc += 1
         except IndexError:
             self.logger.warning(
-                f"Cannot find prediction for function {f.name.value} in {self.context.filename}, assuming no prediction made"
+                f"Cannot find prediction for function {f.name.value} in {self.filename}, assuming no prediction made"
             )
-            return f
+            return None
 
         if rc - self.ret_cursor > 1:
             self.logger.warning(
-                f"Had to skip {rc - self.ret_cursor} ret entries to find {f.name.value}  in {self.context.filename}"
+                f"Had to skip {rc - self.ret_cursor} ret entries to find {f.name.value}  in {self.filename}"
             )
         self.ret_cursor = rc + 1
-        return f.with_changes(returns=self._read_tw_pred(r.ty))
+        return rc
 
-    def leave_Param(self, _, param: libcst.Param) -> libcst.Param:
+    def parameter(self, param: libcst.Param) -> Optional[int]:
         if param.name.value == "self":
             # TypeWriter simply ignores self, with no further context checking
-            return param
+            return None
 
         name = preprocessor.process_identifier(param.name.value)
 
         pc = self.param_cursor
         try:
-            while (p := self.parameters[pc]).pname != name:
+            while self.parameters[pc].pname != name:
                 pc += 1
         except IndexError:
             self.logger.warning(
-                f"Cannot find prediction for parameter {param.name.value} in {self.context.filename}, assuming no prediction made"
+                f"Cannot find prediction for parameter {param.name.value} in {self.filename}, assuming no prediction made"
             )
-            return param
+            return None
 
         if pc - self.param_cursor > 1:
             self.logger.warning(
-                f"Had to skip {pc - self.param_cursor} ret entries to find {param.name.value} in {self.context.filename}"
+                f"Had to skip {pc - self.param_cursor} ret entries to find {param.name.value} in {self.filename}"
             )
         self.param_cursor = pc + 1
-        return param.with_changes(annotation=self._read_tw_pred(p.ty))
+        return pc
+
+
+class Typewriter2Annotations(libcst.codemod.ContextAwareTransformer):
+    def __init__(
+        self,
+        context: codemod.CodemodContext,
+        parameters: list[Parameter],
+        returns: list[Return],
+        logger: logging.Logger,
+    ) -> None:
+        super().__init__(context)
+
+        self.parameters = parameters
+        self.returns = returns
+        self.cursor = _PredictionCursor(parameters, returns, context.filename, logger)
+
+    def leave_FunctionDef(self, _, f: libcst.FunctionDef) -> libcst.FunctionDef:
+        if (rc := self.cursor.ret(f)) is None:
+            return f
+        return f.with_changes(returns=self._read_tw_pred(self.returns[rc].ty))
+
+    def leave_Param(self, _, param: libcst.Param) -> libcst.Param:
+        if (pc := self.cursor.parameter(param)) is None:
+            return param
+        return param.with_changes(annotation=self._read_tw_pred(self.parameters[pc].ty))
 
     def _read_tw_pred(self, annotation: Optional[str]) -> Optional[libcst.Annotation]:
         if annotation is None or annotation == "other":
@@ -565,9 +649,75 @@ class Typewriter2Annotations(libcst.codemod.ContextAwareTransformer):
             return libcst.Annotation(annotation=libcst.parse_expression(annotation))
 
 
+class _TypeWriterScores(libcst.CSTVisitor):
+    """Visits the nodes in the same order as Typewriter2Annotations, so that predictions are
+    matched identically, and retains each prediction's probability under the collector's qname"""
+
+    def __init__(
+        self,
+        file: str,
+        topn_parameters: list[list[Parameter]],
+        topn_returns: list[list[Return]],
+        logger: logging.Logger,
+    ) -> None:
+        super().__init__()
+        self.file = file
+        self.topn_parameters = topn_parameters
+        self.topn_returns = topn_returns
+
+        # Matching is by name only, which is the same for each top-n
+        self.cursor = _PredictionCursor(topn_parameters[0], topn_returns[0], file, logger)
+        self.scope = list[str]()
+        self.rows = list[_adaptors.ScoreRow]()
+
+    def visit_ClassDef(self, node: libcst.ClassDef) -> None:
+        self.scope.append(node.name.value)
+
+    def leave_ClassDef(self, _: libcst.ClassDef) -> None:
+        self.scope.pop()
+
+    def visit_FunctionDef(self, node: libcst.FunctionDef) -> None:
+        self.scope.append(node.name.value)
+
+    def leave_FunctionDef(self, node: libcst.FunctionDef) -> None:
+        if (rc := self.cursor.ret(node)) is not None:
+            qname = ".".join(self.scope)
+            for n, returns in enumerate(self.topn_returns, start=1):
+                self._add(TypeCollectionCategory.CALLABLE_RETURN, qname, n, returns[rc].score)
+        self.scope.pop()
+
+    def leave_Param(self, node: libcst.Param) -> None:
+        if (pc := self.cursor.parameter(node)) is not None:
+            qname = ".".join((*self.scope, node.name.value))
+            for n, parameters in enumerate(self.topn_parameters, start=1):
+                self._add(
+                    TypeCollectionCategory.CALLABLE_PARAMETER, qname, n, parameters[pc].score
+                )
+
+    def _add(
+        self, category: TypeCollectionCategory, qname: str, n: int, score: Optional[float]
+    ) -> None:
+        if score is not None:
+            self.rows.append((self.file, category, qname, n, score))
+
+
+def _scores(
+    project: VirtualProject,
+    relative: pathlib.Path,
+    topn_parameters: list[list[Parameter]],
+    topn_returns: list[list[Return]],
+    logger: logging.Logger,
+) -> list[_adaptors.ScoreRow]:
+    if not topn_parameters or not topn_returns:
+        return []
+    visitor = _TypeWriterScores(str(relative), topn_parameters, topn_returns, logger)
+    libcst.parse_module(project.sources[relative]).visit(visitor)
+    return visitor.rows
+
+
 class _TypeWriterTopN(_TypeWriter):
     def __init__(self, topn: int):
-        super().__init__(model_path=pathlib.Path("models") / "typewriter", topn=topn)
+        super().__init__(model_path=_registry.resolve("typewriter"), topn=topn)
 
 
 class TypeWriterTop1(_TypeWriterTopN):
@@ -1,7 +1,15 @@
+import ast
+import gzip
+import itertools
 import json
+import logging
+import math
+import operator
 import pathlib
+import shutil
 import typing
 
+import astunparse
 import libcst
 import pandas as pd
 import pandera.typing as pt
@@ -13,7 +21,9 @@ from typilus.model import model_restore_helper
 from typilus.utils.predict import ignore_annotation
 
 import utils
-from src.common.schemas import InferredSchema
+from src.common.schemas import InferredSchema, TypeCollectionCategory
+from src.common.virtual import VirtualProject
+from src.infer.inference import _adaptors, _registry
 from src.infer.inference._base import ProjectWideInference
 from src.symbols.collector import build_type_collection
 
@@ -68,6 +78,139 @@ class TypilusPrediction(typing.TypedDict):
     provenance: str
 
 
+def stream_prediction_shards(
+    predictions: typing.Iterable[TypilusPrediction], folder: pathlib.Path
+) -> typing.Iterator[tuple[str, pathlib.Path]]:
+    """Write predictions into one gzipped JSON-lines shard per provenance as they arrive,
+    yielding each provenance and its shard once the model has moved on to another file.
+    Only the predictions of a single file are held in memory at a time.
+    Should a file's predictions be interleaved with others, the remainder is appended to its
+    shard and it is yielded again; re-read the shard to see all of its predictions"""
+    # Shards are appended to, so those of previous runs must not linger
+    shutil.rmtree(folder, ignore_errors=True)
+
+    for provenance, run in itertools.groupby(predictions, key=operator.itemgetter("provenance")):
+        shard = prediction_shard_path(folder, provenance)
+        shard.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(shard, "at", encoding="utf-8") as f:
+            for prediction in run:
+                f.write(json.dumps(prediction))
+                f.write("\n")
+        yield provenance, shard
+
+
+def prediction_shard_path(folder: pathlib.Path, provenance: str) -> pathlib.Path:
+    # Provenances are paths relative to the project, with a leading slash
+    return folder / f"{provenance.lstrip('/')}.jsonl.gz"
+
+
+def typed_ast_lineno(node: ast.stmt | ast.arg) -> int:
+    """Line of the node in typed_ast, which Typilus' graph extractor locates predictions by.
+    Its grammar is that of Python 3.7, where definitions start at their first decorator"""
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return min((d.lineno for d in node.decorator_list), default=node.lineno)
+    return node.lineno
+
+
+class _ScoreVisitor(ast.NodeVisitor):
+    """Resolve Typilus' (name, lineno, kind) keys to the qnames of the symbol collector,
+    in the same manner as hitypilus' visitor; the first prediction for each key wins"""
+
+    def __init__(self, file: str, predictions: typing.Iterable[TypilusPrediction]) -> None:
+        self.file = file
+        self.predictions = dict[tuple[str, int, str], TypilusPrediction]()
+        for prediction in predictions:
+            key = (prediction["name"], prediction["location"][0], prediction["annotation_type"])
+            self.predictions.setdefault(key, prediction)
+
+        self.scope = list[str]()
+        self.rows = list[_adaptors.ScoreRow]()
+
+    def _add(
+        self,
+        key: tuple[str, int, annotater.AnnotationKind],
+        category: TypeCollectionCategory,
+        qname: str,
+    ) -> None:
+        name, lineno, kind = key
+        if (prediction := self.predictions.get((name, lineno, kind.value))) is None:
+            return
+        for n, (_, logprob) in enumerate(prediction["predicted_annotation_logprob_dist"], 1):
+            self.rows.append((self.file, category, qname, n, math.exp(logprob)))
+
+    def _qname(self, name: str) -> str:
+        return ".".join((*self.scope, name))
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visit_FunctionDef(self, node: ast.FunctionDef | ast.AsyncFunctionDef) -> None:
+        fqname = self._qname(node.name)
+        self._add(
+            (node.name, typed_ast_lineno(node), annotater.AnnotationKind.FUNC),
+            TypeCollectionCategory.CALLABLE_RETURN,
+            fqname,
+        )
+        for a in node.args.args:
+            self._add(
+                (a.arg, a.lineno, annotater.AnnotationKind.PARA),
+                TypeCollectionCategory.CALLABLE_PARAMETER,
+                f"{fqname}.{a.arg}",
+            )
+
+        self.scope.append(node.name)
+        for s in node.body:
+            self.visit(s)
+        self.scope.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
+        self._variable(node.target, node.lineno)
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        # ! Consider only the case when "targets" has only one non-Tuple element
+        if len(node.targets) == 1 and not isinstance(node.targets[0], ast.Tuple):
+            self._variable(node.targets[0], node.lineno)
+
+    def _variable(self, target: ast.expr, lineno: int) -> None:
+        if not isinstance(target, (ast.Name, ast.Attribute)):
+            return
+        name = astunparse.unparse(target).strip()
+        self._add(
+            (name, lineno, annotater.AnnotationKind.VAR),
+            TypeCollectionCategory.VARIABLE,
+            self._qname(name),
+        )
+
+
+def _scores(
+    project: VirtualProject,
+    relative: pathlib.Path,
+    predictions: typing.Iterable[TypilusPrediction],
+    logger: logging.Logger,
+) -> list[_adaptors.ScoreRow]:
+    """Typilus yields a log-probability per predicted type; retain them as probabilities
+    under the qnames that the symbol collector derives for the annotated slots"""
+    try:
+        tree = ast.parse(project.sources[relative])
+    except SyntaxError as e:
+        logger.warning(f"Cannot score Typilus' predictions for {relative} - {e}")
+        return []
+
+    visitor = _ScoreVisitor(str(relative), predictions)
+    visitor.visit(tree)
+    return visitor.rows
+
+
+def read_prediction_shard(shard: pathlib.Path) -> typing.Iterator[TypilusPrediction]:
+    with gzip.open(shard, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line, object_pairs_hook=TypilusPrediction)
+
+
 class Typilus(ProjectWideInference):
     def __init__(self, model_folder: pathlib.Path, topn: int) -> None:
         super().__init__()
@@ -98,13 +241,16 @@ class Typilus(ProjectWideInference):
         test_dataset_path = self.repo_to_dataset(mutable)
 
         # Predict over transformed dataset
-        pred_path = self.predict(
+        pred_path, scores = self.predict(
             dataset=test_dataset_path,
+            project=VirtualProject.read(mutable, subset=subset),
             predictions_out=mutable / "typilus-predictions.json.gz",
         )
 
         # Apply annotations
-        return self.annotate_and_collect(mutable, subset, pred_path)
+        return self.annotate_and_collect(mutable, subset, pred_path).pipe(
+            _adaptors.with_scores, scores
+        )
 
     def repo_to_dataset(self, repo: pathlib.Path) -> RichPath:
         test_dataset = repo / "inference-dataset"
@@ -122,9 +268,8 @@ class Typilus(ProjectWideInference):
         )
         return RichPath.create(path=str(test_dataset))
 
-    def predict(self, dataset: RichPath, predictions_out: pathlib.Path) -> RichPath:
-        ps = []
-
+    def iter_predictions(self, dataset: RichPath) -> typing.Iterator[TypilusPrediction]:
+        """Lazily yield the topn predictions of each annotatable, in the model's output order"""
         chunks = dataset.get_filtered_files_in_dir("*.jsonl.gz")
         for annotation in self.model.annotate(chunks):
             if ignore_annotation(annotation.original_annotation):
@@ -148,11 +293,34 @@ class Typilus(ProjectWideInference):
             filtered_logprobs.extend([("typing.Any", -1000)] * (self.topn - len(filtered_logprobs)))
             annotation_dict["predicted_annotation_logprob_dist"] = filtered_logprobs
 
-            ps.append(annotation_dict)
-
-        output = RichPath.create(str(predictions_out))
-        output.save_as_compressed_file(ps)
-        return output
+            yield annotation_dict
+
+    def predict(
+        self, dataset: RichPath, project: VirtualProject, predictions_out: pathlib.Path
+    ) -> tuple[RichPath, pd.DataFrame]:
+        """Write the predictions for Typilus' annotator, and score them file by file against
+        the sources in memory; only files of the project are scored, all are predicted for"""
+        scores = list[_adaptors.ScoreRow]()
+
+        # Same layout as RichPath.save_as_compressed_file, i.e. a single JSON list,
+        # as Typilus' annotator expects; predictions are written as they are made
+        with gzip.open(predictions_out, "wt", encoding="utf-8") as f:
+            f.write("[")
+            predictions = enumerate(self.iter_predictions(dataset))
+            for provenance, run in itertools.groupby(
+                predictions, key=lambda ip: ip[1]["provenance"]
+            ):
+                shard = list[TypilusPrediction]()
+                for i, prediction in run:
+                    if i:
+                        f.write(", ")
+                    f.write(json.dumps(prediction))
+                    shard.append(prediction)
+                if (relative := pathlib.Path(provenance.lstrip("/"))) in project.sources:
+                    scores.extend(_scores(project, relative, shard, self.logger))
+            f.write("]")
+
+        return RichPath.create(str(predictions_out)), _adaptors.scores2df(scores)
 
     def annotate_and_collect(
         self,
@@ -163,7 +331,7 @@ class Typilus(ProjectWideInference):
         collections = [InferredSchema.example(size=0)]
 
         for topn in range(1, self.topn + 1):
-            with utils.scratchpad(repo) as sc:
+            with utils.scratchpad(repo, python_only=True) as sc:
                 anno_res = codemod.parallel_exec_transform_with_prettyprint(
                     transform=TypilusAnnotationApplier(
                         context=codemod.CodemodContext(),
@@ -196,7 +364,7 @@ class Typilus(ProjectWideInference):
 
 class _TypilusTopN(Typilus):
     def __init__(self, topn: int) -> None:
-        super().__init__(model_folder=pathlib.Path("models") / "typilus", topn=topn)
+        super().__init__(model_folder=_registry.resolve("typilus"), topn=topn)
 
 
 class TypilusTop1(_TypilusTopN):
@@ -1,11 +1,12 @@
 import pathlib
+from typing import Optional
 
 import libcst
 import pandera.typing as pt
 from libcst import codemod
 
 from src.common.annotations import ApplyTypeAnnotationsVisitor
-from src.common.schemas import TypeCollectionSchema
+from src.common.schemas import SymbolIndexSchema, TypeCollectionSchema
 from src.common.storage import TypeCollection
 
 from .qname_transforms import QName2SSATransformer, SSA2QNameTransformer
@@ -18,10 +19,15 @@ class TypeAnnotationApplierTransformer(codemod.ContextAwareTransformer):
         self,
         context: codemod.CodemodContext,
         annotations: pt.DataFrame[TypeCollectionSchema],
+        baseline: Optional[pt.DataFrame[SymbolIndexSchema]] = None,
     ) -> None:
         super().__init__(context)
         self.annotations = annotations
 
+        # Symbols of the unannotated codebase, e.g. src.symbols.index.load_symbol_index;
+        # if not given, they are collected from each module before applying
+        self.baseline = baseline
+
         self.annotations[TypeCollectionSchema.anno] = self.annotations[
             TypeCollectionSchema.anno
         ].str.removeprefix("builtins.")
@@ -43,11 +49,13 @@ class TypeAnnotationApplierTransformer(codemod.ContextAwareTransformer):
 
         # removed = tree.visit(TypeAnnotationRemover(context=self.context))
 
-        symbol_collector = TypeCollectorVisitor.strict(context=self.context)
-        tree.visit(symbol_collector)
-        annotations = TypeCollection.to_libcst_annotations(
-            module_tycol, symbol_collector.collection.df
-        )
+        if self.baseline is not None:
+            module_symbols = self.baseline[self.baseline[SymbolIndexSchema.file] == str(relative)]
+        else:
+            symbol_collector = TypeCollectorVisitor.strict(context=self.context)
+            tree.visit(symbol_collector)
+            module_symbols = symbol_collector.collection.df
+        annotations = TypeCollection.to_libcst_annotations(module_tycol, module_symbols)
 
         # lowered = LoweringTransformer(context=self.context).transform_module(tree)
 
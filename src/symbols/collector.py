@@ -3,44 +3,60 @@ from __future__ import annotations
 import logging
 import os
 import pathlib
+import typing
 from typing import Optional
 
 import libcst as cst
 from libcst import codemod, metadata, helpers
 import tqdm
-from tqdm.contrib.concurrent import process_map
 
 import pandas as pd
 from pandera import typing as pt
 
-from src.common import TypeCollection
-from src.common.schemas import TypeCollectionSchema
-from utils import worker_count
+from src.common import TypeCollection, TypeAnnotationRemover
+from src.common import pool
+from src.common.schemas import TypeCollectionCategory, TypeCollectionSchema
+from src.common.virtual import VirtualProject
 
 
 # from infer.inference._base import DatasetFolderStructure
 
 
 class _ParallelTypeCollector:
-    def __init__(self, repo_root: str, files: list[str]) -> None:
-        self.repo_root = repo_root
-        self.files = files
-        self.metadata_manager = metadata.FullRepoManager(
-            repo_root_dir=self.repo_root,
-            paths=self.files,
-            providers={metadata.FullyQualifiedNameProvider},
-        )
-        self.metadata_manager.resolve_cache()
+    """Map step of the type collection; every task is a single file of any of the given
+    repositories, for which its DataFrame is returned. Workers share no state with the parent,
+    so results must be reduced from the return values"""
+
+    def __init__(self, root2files: dict[str, list[str]]) -> None:
+        self.metadata_managers = dict[str, metadata.FullRepoManager]()
+        for repo_root, files in root2files.items():
+            manager = metadata.FullRepoManager(
+                repo_root_dir=repo_root,
+                paths=files,
+                providers={metadata.FullyQualifiedNameProvider},
+            )
+            manager.resolve_cache()
+            self.metadata_managers[repo_root] = manager
 
     def __call__(
-        self, filename2code: tuple[str, str]
-    ) -> pt.DataFrame[TypeCollectionSchema]:
-        file, code = filename2code
-        modpkg = helpers.calculate_module_and_package(self.repo_root, filename=file)
+        self, task: tuple[str, str, Optional[str]]
+    ) -> tuple[str, pt.DataFrame[TypeCollectionSchema]]:
+        # Code is given for in-memory projects, otherwise it is read from disk
+        repo_root, file, code = task
+
+        if code is None:
+            try:
+                with open(file) as f:
+                    code = f.read()
+            except UnicodeDecodeError as e:
+                print(f"WARNING: Could not decode {file} - {e}")
+                return repo_root, TypeCollectionSchema.example(size=0)
+
+        modpkg = helpers.calculate_module_and_package(repo_root, filename=file)
 
         context = codemod.CodemodContext(
             filename=file,
-            metadata_manager=self.metadata_manager,
+            metadata_manager=self.metadata_managers[repo_root],
             full_module_name=modpkg.name,
             full_package_name=modpkg.package,
         )
@@ -51,9 +67,56 @@ class _ParallelTypeCollector:
             module.visit(visitor)
         except Exception as e:
             print(f"WARNING: {e}")
-            return TypeCollectionSchema.example(size=0)
+            return repo_root, TypeCollectionSchema.example(size=0)
+
+        return repo_root, visitor.collection.df
+
+
+def _collect(
+    root2files: dict[str, list[str]],
+    desc: str,
+    file2code: Optional[dict[str, str]] = None,
+) -> dict[str, TypeCollection]:
+    if file2code is None:
+        tasks = [
+            (repo_root, file, None)
+            for repo_root, files in root2files.items()
+            for file in files
+            if not os.path.isdir(file)
+        ]
+    else:
+        tasks = [
+            (repo_root, file, file2code[file])
+            for repo_root, files in root2files.items()
+            for file in files
+        ]
+    # Size by length of code, so that chunks of large files are split up across workers
+    sizes = [
+        len(code) if code is not None else os.path.getsize(file) for _, file, code in tasks
+    ]
+    with pool.shared_pool() as workers:
+        collections = workers.map(
+            _ParallelTypeCollector.__call__,
+            _ParallelTypeCollector(root2files),
+            tasks,
+            sizes=sizes,
+            desc=desc,
+            on_failure=lambda task: (task[0], TypeCollectionSchema.example(size=0)),
+        )
+
+    # Reduce step; results are in task order, so files remain ordered per repository
+    root2collections = {repo_root: [] for repo_root in root2files}
+    for repo_root, df in collections:
+        root2collections[repo_root].append(df)
 
-        return visitor.collection.df
+    return {
+        repo_root: TypeCollection(
+            pd.concat(dfs, ignore_index=True).pipe(pt.DataFrame[TypeCollectionSchema])
+            if dfs
+            else TypeCollectionSchema.example(size=0)
+        )
+        for repo_root, dfs in root2collections.items()
+    }
 
 
 def build_type_collection(
@@ -71,33 +134,125 @@ def build_type_collection(
         files = list(map(lambda p: str(root / p), subset))
         files = list(filter(lambda p: os.path.isfile(p), files))
 
-    file2code = dict()
-    for file in tqdm.tqdm(files):
-        if os.path.isdir(file):
-            continue
-        try:
-            file2code[file] = open(file).read()
-        
-        except UnicodeDecodeError as e:
-            print(f"WARNING: Could not decode {file} - {e}")
-            continue
-
-    collector = _ParallelTypeCollector(repo_root=repo_root, files=files)
-    collections = process_map(
-        collector,
-        file2code.items(),
-        total=len(file2code),
-        desc=f"Building Type Collection from {root}",
-        max_workers=worker_count(),
+    return _collect({repo_root: files}, desc=f"Building Type Collection from {root}")[repo_root]
+
+
+def build_type_collections(
+    roots: typing.Sequence[pathlib.Path], allow_stubs=False
+) -> list[TypeCollection]:
+    """Collect from multiple repositories at once, sharing a single pool of workers
+    instead of collecting from each repository in sequence"""
+    assert len(set(roots)) == len(roots), "Cannot collect from the same repository twice!"
+
+    root2files = {
+        str(root): codemod.gather_files([str(root)], include_stubs=allow_stubs) for root in roots
+    }
+    root2collection = _collect(
+        root2files, desc=f"Building Type Collections from {len(roots)} repositories"
     )
+    return [root2collection[str(root)] for root in roots]
 
-    if not collections:
-        cs = TypeCollectionSchema.example(size=0)
-    else:
-        cs = pd.concat(collections, ignore_index=True).pipe(
-            pt.DataFrame[TypeCollectionSchema]
+
+def build_type_collection_from_sources(project: VirtualProject) -> TypeCollection:
+    """Collect from the in-memory sources of a project, e.g. after chaining codemods on it"""
+    repo_root = str(project.root)
+    file2code = dict(zip(project.filenames(), project.sources.values()))
+
+    return _collect(
+        {repo_root: list(file2code)},
+        desc=f"Building Type Collection from {project.root} (in memory)",
+        file2code=file2code,
+    )[repo_root]
+
+
+def _strip_and_collect(
+    state: tuple[TypeAnnotationRemover, metadata.FullRepoManager], file_and_code: tuple[str, str]
+) -> tuple[str, str, pt.DataFrame[TypeCollectionSchema], bool]:
+    remover, manager = state
+    filename, code = file_and_code
+
+    modpkg = helpers.calculate_module_and_package(str(manager.root_path), filename=filename)
+    context = codemod.CodemodContext(
+        filename=filename,
+        metadata_manager=manager,
+        full_module_name=modpkg.name,
+        full_package_name=modpkg.package,
+    )
+    visitor = TypeCollectorVisitor.strict(context=context)
+    remover.context = context
+
+    # Collect from and strip the same parsed module
+    try:
+        module = cst.parse_module(code)
+        module.visit(visitor)
+        stripped = remover.transform_module(module)
+    except Exception as e:
+        print(f"WARNING: {e}")
+        return filename, code, TypeCollectionSchema.example(size=0), False
+
+    return filename, stripped.code, visitor.collection.df, True
+
+
+def strip_and_collect(
+    project: VirtualProject, remover: TypeAnnotationRemover
+) -> tuple[VirtualProject, TypeCollection, codemod.ParallelTransformResult]:
+    """Remove annotations from the project and collect the removed annotations,
+    i.e. the ground truth, with a single parse per file.
+    Returns the stripped project, the ground truth and a summary akin to
+    parallel_exec_transform_with_prettyprint"""
+    removed = [
+        category
+        for category, flag in (
+            (TypeCollectionCategory.VARIABLE, remover.variables),
+            (TypeCollectionCategory.CALLABLE_PARAMETER, remover.parameters),
+            (TypeCollectionCategory.CALLABLE_RETURN, remover.rets),
+        )
+        if flag
+    ]
+
+    filenames = project.filenames()
+    manager = metadata.FullRepoManager(
+        repo_root_dir=str(project.root),
+        paths=filenames,
+        providers={metadata.FullyQualifiedNameProvider}
+        | set(remover.get_inherited_dependencies()),
+    )
+    manager.resolve_cache()
+
+    with pool.shared_pool() as workers:
+        results = workers.map(
+            _strip_and_collect,
+            (remover, manager),
+            list(zip(filenames, project.sources.values())),
+            sizes=[len(code) for code in project.sources.values()],
+            desc=f"Removing and collecting annotations from {project.root}",
+            on_failure=lambda task: (*task, TypeCollectionSchema.example(size=0), False),
         )
-    return TypeCollection(cs)
+
+    stripped = VirtualProject(
+        project.root,
+        {
+            pathlib.Path(filename).relative_to(project.root): code
+            for filename, code, _, _ in results
+        },
+    )
+
+    dfs = [df for _, _, df, _ in results]
+    ground_truth = (
+        pd.concat(dfs, ignore_index=True) if dfs else TypeCollectionSchema.example(size=0)
+    )
+    ground_truth = ground_truth[
+        ground_truth[TypeCollectionSchema.category].isin(removed)
+    ].reset_index(drop=True)
+
+    successes = sum(ok for *_, ok in results)
+    return (
+        stripped,
+        TypeCollection(ground_truth.pipe(pt.DataFrame[TypeCollectionSchema])),
+        codemod.ParallelTransformResult(
+            successes=successes, failures=len(results) - successes, skips=0, warnings=0
+        ),
+    )
 
 
 # def build_type_collection_from_test_set(
@@ -149,6 +304,20 @@ class TypeCollectorVisitor(codemod.ContextAwareVisitor):
         assert self.context.filename is not None
         assert self.context.metadata_manager is not None
 
+        self.collect(
+            metadata.MetadataWrapper(
+                tree,
+                unsafe_skip_copy=True,
+                cache=self.context.metadata_manager.get_cache_for_path(self.context.filename),
+            )
+        )
+
+    def collect(self, wrapper: metadata.MetadataWrapper) -> None:
+        """Collect from an already wrapped module; metadata resolved by the wrapper
+        is shared with any other visitor that visits the same wrapper"""
+        assert self.context.filename is not None
+        assert self.context.metadata_manager is not None
+
         file = pathlib.Path(self.context.filename).relative_to(
             self.context.metadata_manager.root_path
         )
@@ -161,7 +330,7 @@ class TypeCollectorVisitor(codemod.ContextAwareVisitor):
         )
 
         imports_visitor = GatherImportsVisitor(context=self.context)
-        tree.visit(imports_visitor)
+        wrapper.module.visit(imports_visitor)
 
         existing_imports = set(
             item.module for item in imports_visitor.symbol_mapping.values()
@@ -173,13 +342,7 @@ class TypeCollectorVisitor(codemod.ContextAwareVisitor):
             context=self.context,
         )
 
-        metadata.MetadataWrapper(
-            tree,
-            unsafe_skip_copy=True,
-            cache=self.context.metadata_manager.get_cache_for_path(
-                self.context.filename
-            ),
-        ).visit(type_collector)
+        wrapper.visit(type_collector)
         update = TypeCollection.from_annotations(
             file=file, annos=type_collector.annotations, strict=self._strict
         )
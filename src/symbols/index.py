@@ -0,0 +1,55 @@
+import pathlib
+
+import pandas as pd
+import pandera.typing as pt
+
+from src.common import cache, output
+from src.common.schemas import SymbolIndexSchema, SymbolSchema, TypeCollectionSchema
+from src.common.virtual import VirtualProject
+from .collector import build_type_collection_from_sources
+
+
+SYMBOL_KEYS = [
+    SymbolSchema.file,
+    SymbolSchema.category,
+    SymbolSchema.qname,
+    SymbolSchema.qname_ssa,
+]
+
+
+def symbol_index(
+    collection: pt.DataFrame[TypeCollectionSchema],
+) -> pt.DataFrame[SymbolIndexSchema]:
+    """Number the symbols of a collection in output.SYMBOL_ORDER, which keeps IDs stable
+    for the same project and lets the index be merged with stored outputs file by file"""
+    symbols = output.sort_symbols(
+        collection[SYMBOL_KEYS].drop_duplicates(ignore_index=True)
+    )
+    return symbols.assign(symbol=symbols.index).pipe(pt.DataFrame[SymbolIndexSchema])
+
+
+def load_symbol_index(project: pathlib.Path) -> pt.DataFrame[SymbolIndexSchema]:
+    """Index of all sources of the project, stubs excluded. Indices are cached by the project's
+    content, outside of it, so that edited sources are indexed anew; dataset ingestion
+    builds them ahead of the tools that join against them"""
+    sources = VirtualProject.read(project)
+    indices = cache.DiskCache[pt.DataFrame[SymbolIndexSchema]]("symbol-index", version="1")
+
+    if (index := indices.get(key := sources.content_hash())) is not None:
+        return index
+
+    index = symbol_index(build_type_collection_from_sources(sources).df)
+    indices.put(key, index)
+    return index
+
+
+def with_symbol_ids(
+    df: pd.DataFrame, index: pt.DataFrame[SymbolIndexSchema], how: str = "inner"
+) -> pd.DataFrame:
+    """The only join on string keys; everything downstream joins on SymbolIndexSchema.symbol"""
+    return pd.merge(
+        left=df.drop(columns=SymbolIndexSchema.symbol, errors="ignore"),
+        right=index,
+        how=how,
+        on=SYMBOL_KEYS,
+    )
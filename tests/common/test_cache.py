@@ -0,0 +1,43 @@
+import pathlib
+
+from src.common import cache
+from src.common.virtual import VirtualProject
+
+
+def test_content_hash_delimits_parts():
+    assert cache.content_hash("ab", "c") != cache.content_hash("a", "bc")
+    assert cache.content_hash("a", b"b") == cache.content_hash(b"a", "b")
+
+
+def test_roundtrip(tmp_path: pathlib.Path):
+    entries = cache.DiskCache[dict]("tool", version="1", root=tmp_path)
+    key = cache.content_hash("x = 1")
+
+    assert entries.get(key) is None
+    entries.put(key, {"x": [1]})
+
+    # Entries are copies, so that callers may mutate them
+    first = entries.get(key)
+    assert first == {"x": [1]}
+    first["x"].append(2)
+    assert entries.get(key) == {"x": [1]}
+
+    assert cache.DiskCache[dict]("tool", version="2", root=tmp_path).get(key) is None
+
+
+def test_corrupted_entries_are_discarded(tmp_path: pathlib.Path):
+    entries = cache.DiskCache[int]("tool", version="1", root=tmp_path)
+    key = cache.content_hash("x = 1")
+
+    entries.put(key, 1)
+    entries.path(key).write_bytes(b"\x80")
+
+    assert entries.get(key) is None
+    assert not entries.path(key).exists()
+
+
+def test_project_hash_follows_sources(tmp_path: pathlib.Path):
+    a = VirtualProject(tmp_path, {pathlib.Path("a.py"): "x = 1"})
+    assert a.content_hash() == a.rooted_at(tmp_path / "elsewhere").content_hash()
+    for sources in ({pathlib.Path("a.py"): "x = 2"}, {pathlib.Path("b.py"): "x = 1"}):
+        assert a.content_hash() != VirtualProject(tmp_path, sources).content_hash()
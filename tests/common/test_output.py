@@ -0,0 +1,106 @@
+import pathlib
+
+import pandas as pd
+import pytest
+
+from src.common import output
+from src.common.schemas import InferredSchema, TypeCollectionCategory, TypeCollectionSchema
+
+
+def inferred(rows: list[tuple[str, str, str, int]]) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            (file, TypeCollectionCategory.CALLABLE_PARAMETER, qname, qname, anno, "tool", topn)
+            for file, qname, anno, topn in rows
+        ],
+        # Tools without confidences do not provide scores
+        columns=[c for c in InferredSchema.to_schema().columns if c != InferredSchema.score],
+    )
+
+
+@pytest.fixture
+def project(tmp_path: pathlib.Path) -> pathlib.Path:
+    df = inferred(
+        [
+            ("b.py", "f.b", "int", 1),
+            ("a.py", "f.a", "str", 1),
+            ("b.py", "f.a", "int", 1),
+            ("a.py", "f.a", "bytes", 2),
+            ("c.py", "g.c", "float", 1),
+        ]
+    )
+    output.write_inferred(df, tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize(argnames="chunksize", argvalues=[1, 2, 100])
+def test_file_groups_span_chunks(project: pathlib.Path, chunksize: int):
+    groups = list(output.iter_file_groups(output.inferred_path(project), chunksize=chunksize))
+
+    assert [file for file, _ in groups] == ["a.py", "b.py", "c.py"]
+
+    a, b, c = (df for _, df in groups)
+    assert a[InferredSchema.topn].tolist() == [1, 2]
+    assert b[InferredSchema.qname_ssa].tolist() == ["f.a", "f.b"]
+    assert len(c) == 1
+
+
+@pytest.mark.parametrize(
+    argnames=["rows", "files"],
+    argvalues=[(1, [["a.py"], ["b.py"], ["c.py"]]), (3, [["a.py", "b.py"], ["c.py"]])],
+)
+def test_file_batches_hold_whole_files(project: pathlib.Path, rows: int, files: list[list[str]]):
+    batches = list(output.iter_file_batches(output.inferred_path(project), rows=rows))
+    assert [batch[InferredSchema.file].unique().tolist() for batch in batches] == files
+    assert sum(map(len, batches)) == 5
+
+
+def test_unsorted_outputs_are_rejected(tmp_path: pathlib.Path):
+    df = inferred([("b.py", "f.b", "int", 1), ("a.py", "f.a", "str", 1)])
+    df.to_csv(output.inferred_path(tmp_path), index=False)
+
+    with pytest.raises(RuntimeError):
+        list(output.iter_file_groups(output.inferred_path(tmp_path), chunksize=1))
+
+
+def test_appending_retains_header(tmp_path: pathlib.Path):
+    output.append_inferred(inferred([("a.py", "f.a", "str", 1)]), tmp_path)
+    output.append_inferred(inferred([("b.py", "f.b", "int", 1)]), tmp_path)
+
+    df = pd.read_csv(output.inferred_path(tmp_path))
+    assert df[InferredSchema.file].tolist() == ["a.py", "b.py"]
+
+
+def test_kway_merge():
+    left = inferred([("a.py", "f.a", "str", 1), ("c.py", "g.c", "float", 1)])
+    right = inferred([("b.py", "f.b", "int", 1), ("c.py", "g.c", "int", 1)])
+
+    merged = list(
+        output.merge_file_groups(
+            {"left": output.group_by_file(left), "right": output.group_by_file(right)}
+        )
+    )
+
+    assert [(file, sorted(groups)) for file, groups in merged] == [
+        ("a.py", ["left"]),
+        ("b.py", ["right"]),
+        ("c.py", ["left", "right"]),
+    ]
+
+
+def test_ground_truth_roundtrip(tmp_path: pathlib.Path):
+    df = pd.DataFrame(
+        {
+            TypeCollectionSchema.file: ["a.py", "a.py"],
+            TypeCollectionSchema.category: [TypeCollectionCategory.VARIABLE] * 2,
+            TypeCollectionSchema.qname: ["NA", "x"],
+            TypeCollectionSchema.qname_ssa: ["NA", "x"],
+            TypeCollectionSchema.anno: ["int", None],
+        }
+    )
+    output.write_ground_truth(df, tmp_path)
+
+    # Symbols named like missing values survive, missing annotations remain missing
+    read = output.read_ground_truth(tmp_path)
+    assert read[TypeCollectionSchema.qname].tolist() == ["NA", "x"]
+    assert read[TypeCollectionSchema.anno].isna().tolist() == [False, True]
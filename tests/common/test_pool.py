@@ -0,0 +1,135 @@
+import concurrent.futures
+import os
+import pickle
+
+import pytest
+
+from src.common import pool
+
+
+def _offset(state: int, task: int) -> int:
+    return state + task
+
+
+def _pid(_, __) -> int:
+    return os.getpid()
+
+
+@pytest.fixture
+def parallel(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(pool, "IN_PROCESS_BELOW", 0)
+
+
+def test_chunk_by_size():
+    chunks = pool.chunk_by_size([100, 1, 1, 1, 1, 100, 1], jobs=1)
+    assert [list(c) for c in chunks] == [[0], [1, 2, 3, 4, 5], [6]]
+
+    # Every task is part of exactly one chunk, in order
+    sizes = list(range(50))
+    assert [i for c in pool.chunk_by_size(sizes, jobs=3) for i in c] == list(range(50))
+
+
+def test_small_work_runs_in_process():
+    with pool.WorkerPool(jobs=2) as workers:
+        assert set(workers.map(_pid, None, list(range(10)))) == {os.getpid()}
+        assert workers._executor is None
+
+
+def test_workers_are_reused_across_stages(parallel):
+    with pool.WorkerPool(jobs=2) as workers:
+        tasks = list(range(100))
+        assert workers.map(_offset, 1, tasks, sizes=tasks) == [t + 1 for t in tasks]
+
+        executor = workers._executor
+        assert executor is not None
+
+        # Stage state is replaced, workers are not
+        assert workers.map(_offset, 2, tasks) == [t + 2 for t in tasks]
+        assert workers._executor is executor
+        assert os.getpid() not in set(workers.map(_pid, None, tasks))
+
+    assert workers._executor is None
+
+
+def test_shared_pool():
+    with pool.shared_pool(jobs=1) as transient:
+        assert transient is not pool._project_pool
+
+    with pool.project_pool(jobs=2) as project:
+        with pool.shared_pool() as shared:
+            assert shared is project
+    assert pool._project_pool is None
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_imap_unordered_yields_every_chunk(parallel, jobs: int):
+    with pool.WorkerPool(jobs=jobs) as workers:
+        tasks = list(range(100))
+        chunks = list(workers.imap_unordered(_offset, 1, tasks, sizes=tasks))
+
+    assert sorted(r for chunk in chunks for r in chunk) == [t + 1 for t in tasks]
+    assert len(chunks) > 1
+
+
+class _CountingExecutor(concurrent.futures.ProcessPoolExecutor):
+    submitted = 0
+    sent = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        self.sent += len(pickle.dumps(args))
+        return super().submit(*args, **kwargs)
+
+
+def test_imap_unordered_bounds_chunks_in_flight(parallel):
+    tasks = list(range(100))
+    with pool.WorkerPool(jobs=2) as workers:
+        workers._executor = executor = _CountingExecutor(max_workers=2)
+        window = workers.jobs * pool.IN_FLIGHT_PER_WORKER
+        assert len(pool.chunk_by_size(tasks, workers.jobs)) > window + 1
+
+        chunks = workers.imap_unordered(_offset, 1, tasks, sizes=tasks)
+        first = next(chunks)
+        assert executor.submitted <= window + 1
+
+        rest = [r for chunk in chunks for r in chunk]
+        assert sorted(first + rest) == [t + 1 for t in tasks]
+
+
+def _with_state(state: bytes, task: int) -> int:
+    return len(state) + task
+
+
+def test_state_is_not_sent_with_chunks(parallel):
+    state, tasks = bytes(2**20), list(range(100))
+    with pool.WorkerPool(jobs=2) as workers:
+        workers._executor = executor = _CountingExecutor(max_workers=2)
+        assert workers.map(_with_state, state, tasks) == [len(state) + t for t in tasks]
+
+        assert executor.submitted > 1
+        assert executor.sent < len(state)
+
+
+def _fragile(_, task: int) -> int:
+    if task == 13:
+        raise ValueError(task)
+    if task == 42:
+        # As if killed by the OOM killer
+        os._exit(1)
+    return task
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_failures_are_isolated(parallel, jobs: int):
+    tasks = [t for t in range(100) if jobs > 1 or t != 42]
+    with pool.WorkerPool(jobs=jobs) as workers:
+        results = workers.map(_fragile, None, tasks, on_failure=lambda t: -t)
+
+        expected = [-t if t in (13, 42) else t for t in tasks]
+        assert results == expected
+
+        # The pool remains usable after a worker died
+        assert workers.map(_offset, 1, tasks) == [t + 1 for t in tasks]
+
+        with pytest.raises(RuntimeError):
+            workers.map(_fragile, None, tasks)
@@ -0,0 +1,60 @@
+import pathlib
+import shutil
+
+import pandas as pd
+import pytest
+from libcst import codemod
+
+from src.common import output, pool
+from src.common.annotations import TypeAnnotationRemover
+from src.common.schemas import TypeCollectionSchema
+from src.common.virtual import VirtualProject
+from src.symbols.collector import build_type_collection, build_type_collection_from_sources
+
+
+@pytest.fixture
+def project(tmp_path: pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(
+        shutil.copytree(pathlib.Path("tests", "resources", "proj1"), tmp_path / "proj1")
+    )
+
+
+def _remover() -> TypeAnnotationRemover:
+    return TypeAnnotationRemover(
+        context=codemod.CodemodContext(), variables=True, parameters=True, rets=True
+    )
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_transform_does_not_touch_disk(
+    project: pathlib.Path, jobs: int, monkeypatch: pytest.MonkeyPatch
+):
+    # Small projects are transformed in-process otherwise
+    monkeypatch.setattr(pool, "IN_PROCESS_BELOW", 0)
+    before = {p: p.read_text() for p in project.glob("*.py")}
+
+    virtual = VirtualProject.read(project)
+    stripped, result = virtual.transform(_remover(), jobs=jobs)
+
+    assert result.successes == len(virtual.sources)
+    assert result.failures == 0
+    assert stripped.sources != virtual.sources
+    assert {p: p.read_text() for p in project.glob("*.py")} == before
+
+
+def test_collection_matches_materialized(project: pathlib.Path, tmp_path: pathlib.Path):
+    stripped, _ = VirtualProject.read(project).transform(_remover(), jobs=1)
+    in_memory = build_type_collection_from_sources(stripped).df
+
+    stripped.materialize(tmp_path / "materialized")
+    on_disk = build_type_collection(tmp_path / "materialized").df
+
+    assert in_memory[TypeCollectionSchema.anno].isna().all()
+    pd.testing.assert_frame_equal(output.sort_symbols(in_memory), output.sort_symbols(on_disk))
+
+
+def test_read_subset(project: pathlib.Path):
+    subset = {pathlib.Path("amod.py"), pathlib.Path("missing.py")}
+    assert list(VirtualProject.read(project, subset=subset).sources) == [
+        pathlib.Path("amod.py")
+    ]
@@ -4,9 +4,18 @@ import pandas as pd
 import pandera.typing as pt
 import pytest
 
-from src.common.schemas import ContextSymbolSchema
+from src.common import output, pool
+from src.common.schemas import ContextSymbolSchema, TypeCollectionCategory, TypeCollectionSchema
+from src.common.virtual import VirtualProject
 from src.context import RelevantFeatures
 from src.context import generate_context_vectors_for_file
+from src.context.visitors import (
+    generate_context_vectors_for_project,
+    generate_types_and_context_vectors,
+    iter_context_vectors_for_project,
+    with_annotations,
+)
+from src.symbols.collector import build_type_collection
 
 
 @pytest.fixture(scope="class")
@@ -212,3 +221,82 @@ def tuple_dataset() -> pt.DataFrame[ContextSymbolSchema]:
 # def test_tuple_handling(tuple_dataset: pt.DataFrame[ContextSymbolSchema]):
 # print(tuple_dataset)
 # assert False
+
+
+def test_types_and_context_vectors_in_one_pass(
+    context_dataset: pt.DataFrame[ContextSymbolSchema],
+):
+    repo = pathlib.Path.cwd() / "tests" / "resources" / "context"
+    types, contexts = generate_types_and_context_vectors(
+        features=RelevantFeatures(
+            loop=True, reassigned=True, nested=True, builtin=True, branching=True
+        ),
+        project=VirtualProject.read(repo),
+    )
+
+    pd.testing.assert_frame_equal(contexts, context_dataset)
+    pd.testing.assert_frame_equal(types.df, build_type_collection(repo).df)
+
+
+# The applier drops the builtins module from annotations, as must joining
+@pytest.mark.parametrize("builtin", ["int", "builtins.int"])
+def test_annotations_are_joined_like_applied(tmp_path: pathlib.Path, builtin: str):
+    from libcst import codemod
+    from src.infer.insertion import TypeAnnotationApplierTransformer
+
+    (tmp_path / "m.py").write_text(
+        "def f(a, b: str, c=None):\n"
+        "    for i in range(10):\n"
+        "        x = a\n"
+        "    return x\n"
+        "\n"
+        "class C:\n"
+        "    def g(self, y) -> list:\n"
+        "        if y:\n"
+        "            return [y]\n"
+        "        return []\n"
+    )
+    features = RelevantFeatures(
+        loop=True, reassigned=True, nested=True, builtin=True, branching=True
+    )
+    project = VirtualProject.read(tmp_path)
+
+    # Annotate every unannotated parameter and return with a builtin
+    types, structural = generate_types_and_context_vectors(features, project)
+    unannotated = types.df[TypeCollectionSchema.anno].isna() & (
+        types.df[TypeCollectionSchema.category] != TypeCollectionCategory.VARIABLE
+    )
+    annotations = types.df.copy()
+    annotations.loc[unannotated, TypeCollectionSchema.anno] = builtin
+
+    annotated, _ = project.transform(
+        TypeAnnotationApplierTransformer(codemod.CodemodContext(), annotations.copy())
+    )
+    _, applied = generate_types_and_context_vectors(features, annotated)
+
+    joined = with_annotations(structural, annotations, features)
+    assert joined[ContextSymbolSchema.builtin].sum() > structural[ContextSymbolSchema.builtin].sum()
+    pd.testing.assert_frame_equal(joined, applied)
+
+
+@pytest.mark.parametrize("in_process_below", [pool.IN_PROCESS_BELOW, 0])
+def test_project_vectors_are_streamed_from_workers(
+    context_dataset: pt.DataFrame[ContextSymbolSchema],
+    in_process_below: int,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(pool, "IN_PROCESS_BELOW", in_process_below)
+    repo = pathlib.Path.cwd() / "tests" / "resources" / "context"
+    features = RelevantFeatures(
+        loop=True, reassigned=True, nested=True, builtin=True, branching=True
+    )
+
+    batches = list(iter_context_vectors_for_project(features, repo))
+    assert batches
+
+    streamed = output.sort_symbols(pd.concat(batches, ignore_index=True))
+    expected = output.sort_symbols(context_dataset[streamed.columns])
+    pd.testing.assert_frame_equal(streamed, expected)
+    pd.testing.assert_frame_equal(
+        output.sort_symbols(generate_context_vectors_for_project(features, repo)), streamed
+    )
@@ -0,0 +1,34 @@
+import pathlib
+import shutil
+
+import pytest
+from click.testing import CliRunner
+
+from src.hintdiff.cli import _collect, cli_entrypoint
+from src.symbols.collector import build_type_collection
+
+
+@pytest.fixture
+def roots(tmp_path: pathlib.Path) -> list[pathlib.Path]:
+    proj1 = pathlib.Path("tests", "resources", "proj1")
+    return [pathlib.Path(shutil.copytree(proj1, tmp_path / name)) for name in ("left", "right")]
+
+
+def test_collects_from_all_roots(roots: list[pathlib.Path]):
+    merged = _collect(roots)
+    expected = build_type_collection(roots[0]).df
+
+    assert len(merged.symbols) == len(expected)
+    for root in roots:
+        annos = merged.df[merged.df["repository"] == root.name]
+        assert annos["anno"].notna().sum() == expected["anno"].notna().sum()
+
+
+def test_cli_stores_statistics(roots: list[pathlib.Path], tmp_path: pathlib.Path):
+    output = tmp_path / "hintdiff.tsv"
+    repos = [arg for root in roots for arg in ("-r", str(root))]
+    result = CliRunner().invoke(cli_entrypoint, [*repos, "-o", str(output), "-s", "COVERAGE"])
+
+    assert result.exit_code == 0, result.output
+    assert output.is_file()
+    assert output.with_suffix(".coverage.tsv").is_file()
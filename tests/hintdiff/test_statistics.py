@@ -0,0 +1,120 @@
+import pathlib
+
+import pandas as pd
+import pytest
+from pandas._libs import missing
+
+from src.common import MergedAnnotations
+from src.common.schemas import TypeCollectionCategory
+from src.hintdiff.accuracy import Accuracy
+from src.hintdiff.coverage import Coverage
+
+
+def collection(annos: dict[str, object], category=TypeCollectionCategory.VARIABLE) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "file": ["x.py"] * len(annos),
+            "category": [category] * len(annos),
+            "qname": list(annos),
+            "qname_ssa": list(annos),
+            "anno": list(annos.values()),
+        }
+    )
+
+
+@pytest.fixture
+def merged() -> MergedAnnotations:
+    merged = MergedAnnotations()
+    merged.add("gt", collection({"a": "int", "b": "str", "c": missing.NA, "d": "bytes"}))
+    merged.add("tool", collection({"a": "int", "b": "bytes", "c": missing.NA}))
+    return merged
+
+
+def test_symbols_are_shared(merged: MergedAnnotations):
+    assert len(merged.symbols) == 4
+    assert merged.repositories == ["gt", "tool"]
+
+    # Adding a repository only codes its new symbols
+    merged.add("other", collection({"a": "int", "e": "float"}))
+    assert merged.symbols["qname"].tolist() == ["a", "b", "c", "d", "e"]
+    assert merged.annotations.groupby("repository").size().tolist() == [4, 3, 2]
+
+    with pytest.raises(AssertionError):
+        merged.add("tool", collection({"a": "int"}))
+
+
+def test_coverage(merged: MergedAnnotations):
+    coverage = Coverage().forward(
+        repos=[pathlib.Path("gt"), pathlib.Path("tool")], annotations=merged
+    ).set_index(["repository", "category"])["coverage"]
+
+    assert coverage["gt", "VARIABLE"] == pytest.approx(3 / 4)
+    # d is absent from tool, and counts as not covered
+    assert coverage["tool", "VARIABLE"] == pytest.approx(2 / 4)
+    assert coverage["tool", Coverage.TOTAL] == pytest.approx(2 / 4)
+
+
+def test_coverage_is_measured_over_all_symbols(merged: MergedAnnotations):
+    merged.add("returns", collection({"f": "int"}, category=TypeCollectionCategory.CALLABLE_RETURN))
+    coverage = Coverage().forward(
+        repos=[pathlib.Path("tool"), pathlib.Path("returns")], annotations=merged
+    ).set_index(["repository", "category"])["coverage"]
+
+    assert coverage["tool", "CALLABLE_RETURN"] == pytest.approx(0.0)
+    assert coverage["tool", Coverage.TOTAL] == pytest.approx(2 / 5)
+    assert coverage["returns", "VARIABLE"] == pytest.approx(0.0)
+    assert coverage["returns", Coverage.TOTAL] == pytest.approx(1 / 5)
+    assert "gt" not in coverage.index.get_level_values("repository")
+
+
+def _with_returns(merged: MergedAnnotations) -> MergedAnnotations:
+    merged.add(
+        "returns",
+        pd.concat(
+            [
+                collection({"a": "int", "b": "str", "c": missing.NA, "d": "bytes"}),
+                collection({"f": "int"}, category=TypeCollectionCategory.CALLABLE_RETURN),
+            ],
+            ignore_index=True,
+        ),
+    )
+    return merged
+
+
+def test_accuracy(merged: MergedAnnotations):
+    accuracy = Accuracy(reference=pathlib.Path("gt")).forward(
+        repos=[pathlib.Path("gt"), pathlib.Path("tool"), pathlib.Path("returns")],
+        annotations=_with_returns(merged),
+    ).set_index(["repository", "category"])["accuracy"]
+
+    # f is absent from gt, and absent from gt and tool alike
+    assert accuracy["gt", Accuracy.TOTAL] == pytest.approx(1.0)
+    # a and c match (both missing), b differs, d is absent
+    assert accuracy["tool", "VARIABLE"] == pytest.approx(2 / 4)
+    assert accuracy["tool", Accuracy.TOTAL] == pytest.approx(3 / 5)
+    assert accuracy["returns", "VARIABLE"] == pytest.approx(1.0)
+    assert accuracy["returns", "CALLABLE_RETURN"] == pytest.approx(0.0)
+
+
+def test_totals_match_wide_format(merged: MergedAnnotations):
+    merged = _with_returns(merged)
+    repos = [pathlib.Path(name) for name in merged.repositories]
+
+    # As computed when every repository was a {repo}_anno column of an outer merge
+    wide = merged.df.pivot(
+        index=["file", "category", "qname", "qname_ssa"], columns="repository", values="anno"
+    )
+    expected_coverage = {name: wide[name].notna().mean() for name in merged.repositories}
+    expected_accuracy = {
+        name: (wide["gt"].fillna("-") == wide[name].fillna("-")).sum() / len(wide)
+        for name in merged.repositories
+    }
+
+    coverage = Coverage().forward(repos=repos, annotations=merged)
+    accuracy = Accuracy(reference=pathlib.Path("gt")).forward(repos=repos, annotations=merged)
+    for stat, expected, name in (
+        (coverage, expected_coverage, "coverage"),
+        (accuracy, expected_accuracy, "accuracy"),
+    ):
+        totals = stat[stat["category"] == Coverage.TOTAL].set_index("repository")[name]
+        assert totals.to_dict() == pytest.approx(expected)
@@ -0,0 +1,64 @@
+import pathlib
+
+import pandas as pd
+import pandera.typing as pt
+import pytest
+from pandas._libs import missing
+
+from src.common.schemas import InferredSchema, SymbolSchema, TypeCollectionCategory
+from src.icr.resolution import ConfidenceVoting
+
+
+def predictions(method: str, rows: list[tuple[str, object, int, object]]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "file": ["x.py"] * len(rows),
+            "category": [TypeCollectionCategory.CALLABLE_PARAMETER] * len(rows),
+            "qname": [f"function.{name}" for name, *_ in rows],
+            "qname_ssa": [f"function.{name}" for name, *_ in rows],
+            "anno": [anno for _, anno, _, _ in rows],
+            "method": [method] * len(rows),
+            "topn": [topn for *_, topn, _ in rows],
+            "score": [score for *_, score in rows],
+        }
+    ).pipe(pt.DataFrame[InferredSchema])
+
+
+@pytest.fixture()
+def engine() -> ConfidenceVoting:
+    reference = pd.DataFrame(
+        {
+            "file": ["x.py"] * 3,
+            "category": [TypeCollectionCategory.CALLABLE_PARAMETER] * 3,
+            "qname": [f"function.{name}" for name in "abc"],
+            "qname_ssa": [f"function.{name}" for name in "abc"],
+        }
+    ).pipe(pt.DataFrame[SymbolSchema])
+    return ConfidenceVoting(project=pathlib.Path("x"), reference=reference)
+
+
+def test_confident_ranks_outvote_unscored(engine: ConfidenceVoting):
+    static = predictions("mypy", [("a", missing.NA, 1, None), ("b", "int", 1, None)])
+    probabilistic = predictions(
+        "type4pyN2",
+        [
+            ("a", "str", 1, 0.6),
+            ("a", "bytes", 2, 0.4),
+            ("b", "float", 1, 0.9),
+            ("b", "int", 2, 0.3),
+        ],
+    )
+
+    resolved = engine.resolve(static=static, probabilistic=probabilistic).set_index("qname")
+
+    assert resolved.loc["function.a", "anno"] == "str"
+    assert resolved.loc["function.a", "score"] == pytest.approx(0.6)
+
+    # mypy votes 1.0 by its rank, which together with type4py's 0.3 wins over 0.9
+    assert resolved.loc["function.b", "anno"] == "int"
+    assert resolved.loc["function.b", "method"] == "mypy+type4pyN2"
+    assert resolved.loc["function.b", "score"] == pytest.approx(1.3 / 2.2)
+
+    # No tool made a prediction for c
+    assert pd.isna(resolved.loc["function.c", "anno"])
+    assert (resolved["topn"] == 1).all()
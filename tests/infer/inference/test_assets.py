@@ -0,0 +1,19 @@
+import pathlib
+
+import numpy as np
+
+from src.infer.inference import _assets
+
+
+def test_only_arrays_of_strings_are_converted(tmp_path: pathlib.Path):
+    strings = np.array(["int", "str"], dtype=object)
+    mixed = np.array([1, (2, 3)], dtype=object)
+    np.save(tmp_path / "types.npy", strings)
+    np.save(tmp_path / "mixed.npy", mixed)
+
+    assert _assets.convert_for_mmap(tmp_path) == [tmp_path / "types.npy"]
+    assert np.load(tmp_path / "types.npy", mmap_mode="r").tolist() == ["int", "str"]
+
+    unchanged = np.load(tmp_path / "mixed.npy", allow_pickle=True)
+    assert unchanged.dtype == object and unchanged.tolist() == mixed.tolist()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["mixed.npy", "types.npy"]
@@ -0,0 +1,33 @@
+import concurrent.futures
+import time
+
+import pytest
+
+from src.infer.inference._batching import Coalescer
+
+
+def test_concurrent_requests_are_merged():
+    calls = list[list[int]]()
+
+    def double(requests: list[int]) -> list[int]:
+        calls.append(requests)
+        time.sleep(0.05)
+        return [r * 2 for r in requests]
+
+    coalescer = Coalescer(double, max_batch=4, wait=0.05)
+    with concurrent.futures.ThreadPoolExecutor(8) as threads:
+        assert list(threads.map(coalescer, range(10))) == [r * 2 for r in range(10)]
+
+    assert max(map(len, calls)) == 4
+    assert len(calls) < 10
+
+
+def test_failures_reach_every_request():
+    def fail(requests: list[int]) -> list[int]:
+        raise ValueError(requests)
+
+    with pytest.raises(ValueError):
+        Coalescer(fail, max_batch=4, wait=0.01)(1)
+
+    with pytest.raises(RuntimeError):
+        Coalescer(lambda requests: [], max_batch=4, wait=0.01)(1)
@@ -0,0 +1,34 @@
+import os
+import pathlib
+
+import onnxruntime.quantization
+import pytest
+
+from src.infer.inference import _onnx
+
+
+def _quantize(model, quantized, weight_type) -> None:
+    pathlib.Path(quantized).write_bytes(pathlib.Path(model).read_bytes())
+
+
+def test_read_only_store_quantizes_into_cache(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    store, cache = tmp_path / "models", tmp_path / "cache"
+    store.mkdir()
+    (model := store / "model.onnx").write_bytes(b"onnx")
+
+    monkeypatch.setenv("MDTI4PY_CACHE", str(cache))
+    monkeypatch.setattr(onnxruntime.quantization, "quantize_dynamic", _quantize)
+    access = os.access
+    monkeypatch.setattr(os, "access", lambda path, mode: path != store and access(path, mode))
+
+    quantized = _onnx.quantized_model(model)
+    assert quantized.is_relative_to(cache) and quantized.read_bytes() == b"onnx"
+    assert list(store.iterdir()) == [model]
+    assert _onnx.quantized_model(model) == quantized
+
+    monkeypatch.setattr(os, "access", lambda path, mode: False)
+    (other := store / "other.onnx").write_bytes(b"other")
+    with pytest.raises(RuntimeError, match="writable"):
+        _onnx.quantized_model(other)
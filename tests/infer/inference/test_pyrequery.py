@@ -0,0 +1,61 @@
+import pathlib
+import subprocess
+
+import pytest
+
+from src.infer.inference import pyrequery
+from src.infer.inference.pyrequery import _index_types
+
+
+def _entry(path: str, annotation: str) -> dict:
+    location = {"path": path, "start": {"line": 1, "column": 0}, "stop": {"line": 1, "column": 1}}
+    return {"path": path, "types": [{"location": location, "annotation": annotation}]}
+
+
+def test_response_is_indexed_by_path(tmp_path: pathlib.Path):
+    response = [_entry(str(tmp_path / "b.py"), "str"), _entry("a/x.py", "int")]
+    index = _index_types(tmp_path, response)
+
+    assert index.keys() == {"b.py", "a/x.py"}
+    assert index["b.py"]["types"][0]["annotation"] == "str"
+    assert index["a/x.py"]["types"][0]["annotation"] == "int"
+
+
+def test_symlinked_roots_are_resolved(tmp_path: pathlib.Path):
+    (tmp_path / "real").mkdir()
+    (tmp_path / "link").symlink_to(tmp_path / "real")
+
+    index = _index_types(tmp_path / "link", [_entry(str(tmp_path / "real" / "x.py"), "int")])
+    assert list(index) == ["x.py"]
+
+
+def test_timeouts_are_retried_per_file(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    paths = [f"{name}.py" for name in "abcd"]
+    for path in paths:
+        (tmp_path / path).write_text("x = 1\n")
+
+    queries = list[tuple[list[str], int]]()
+
+    def query_types(root: pathlib.Path, paths: list[str], timeout: int) -> dict[str, dict]:
+        queries.append((paths, timeout))
+        if "c.py" in paths:
+            raise subprocess.TimeoutExpired("pyre", timeout)
+        return {}
+
+    monkeypatch.setattr(pyrequery, "_query_types", query_types)
+    queried = [relative for relative, _ in pyrequery.PyreQuery()._query(tmp_path, paths)]
+
+    assert queried == ["a.py", "b.py", "d.py"]
+    assert queries == [(paths, 240), *(([path], 60) for path in paths)]
+
+
+def test_missing_pyre_is_not_retried(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    queries = list[list[str]]()
+
+    def query_types(root: pathlib.Path, paths: list[str], timeout: int) -> dict[str, dict]:
+        queries.append(paths)
+        raise FileNotFoundError("pyre")
+
+    monkeypatch.setattr(pyrequery, "_query_types", query_types)
+    assert list(pyrequery.PyreQuery()._query(tmp_path, ["a.py", "b.py"])) == []
+    assert queries == [["a.py", "b.py"]]
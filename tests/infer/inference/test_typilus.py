@@ -0,0 +1,63 @@
+import ast
+import logging
+import math
+import pathlib
+
+import pytest
+from type_check import annotater
+
+from src.common.schemas import TypeCollectionCategory
+from src.common.virtual import VirtualProject
+from src.infer.inference.typilus import _scores, typed_ast_lineno
+
+
+def test_lines_are_those_of_typed_ast():
+    ast3 = pytest.importorskip("typed_ast.ast3")
+    code = "@a\n@b(\n  1\n)\ndef f(x):\n    y = 1\n\n@c\nclass C:\n    z: int = 2\n"
+
+    theirs = ast3.parse(code)
+    ours = ast.parse(code)
+    assert [typed_ast_lineno(n) for n in ours.body] == [n.lineno for n in theirs.body]
+    assert typed_ast_lineno(ours.body[0].args.args[0]) == theirs.body[0].args.args[0].lineno
+
+
+def _prediction(name: str, line: int, kind: annotater.AnnotationKind) -> dict:
+    return {
+        "name": name,
+        "location": [line, 0],
+        "annotation_type": kind.value,
+        "predicted_annotation_logprob_dist": [["int", math.log(0.75)], ["str", math.log(0.25)]],
+    }
+
+
+def test_scores_are_read_from_memory():
+    file = pathlib.Path("a.py")
+    project = VirtualProject(
+        pathlib.Path("/does/not/exist"),
+        {file: "class C:\n    @staticmethod\n    def f(x):\n        y = x\n"},
+    )
+    predictions = [
+        _prediction("f", 2, annotater.AnnotationKind.FUNC),
+        _prediction("x", 3, annotater.AnnotationKind.PARA),
+        _prediction("y", 4, annotater.AnnotationKind.VAR),
+    ]
+
+    rows = _scores(project, file, predictions, logging.getLogger(__name__))
+    assert [(category, qname, n) for _, category, qname, n, _ in rows] == [
+        (TypeCollectionCategory.CALLABLE_RETURN, "C.f", 1),
+        (TypeCollectionCategory.CALLABLE_RETURN, "C.f", 2),
+        (TypeCollectionCategory.CALLABLE_PARAMETER, "C.f.x", 1),
+        (TypeCollectionCategory.CALLABLE_PARAMETER, "C.f.x", 2),
+        (TypeCollectionCategory.VARIABLE, "C.f.y", 1),
+        (TypeCollectionCategory.VARIABLE, "C.f.y", 2),
+    ]
+    assert [p for *_, p in rows] == pytest.approx([0.75, 0.25] * 3)
+
+
+def test_unparsable_sources_are_logged(caplog):
+    file = pathlib.Path("a.py")
+    project = VirtualProject(pathlib.Path("/does/not/exist"), {file: "def f(:\n"})
+
+    predictions = [_prediction("f", 1, annotater.AnnotationKind.FUNC)]
+    assert _scores(project, file, predictions, logging.getLogger(__name__)) == []
+    assert "a.py" in caplog.text
@@ -0,0 +1,42 @@
+import math
+
+import pandas as pd
+
+from src.common.schemas import InferredSchema, TypeCollectionCategory
+from src.infer.benchmark import accuracy, agreement
+
+
+def _inferred(rows: list[tuple[str, int, str]]) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {
+                InferredSchema.file: "x.py",
+                InferredSchema.category: TypeCollectionCategory.VARIABLE,
+                InferredSchema.qname: qname,
+                InferredSchema.qname_ssa: f"{qname}λ1",
+                InferredSchema.anno: anno,
+                InferredSchema.method: "tool",
+                InferredSchema.topn: topn,
+            }
+            for qname, topn, anno in rows
+        ]
+    )
+
+
+def test_agreement_within_topn():
+    baseline = _inferred([("a", 1, "int"), ("a", 2, "str"), ("b", 1, "str"), ("c", 1, None)])
+    candidate = _inferred([("a", 1, "str"), ("a", 2, "int"), ("b", 1, "str"), ("c", 1, "int")])
+
+    # Slots that the baseline does not predict for are not counted
+    assert agreement(baseline, candidate, topn=1) == 0.5
+    assert agreement(baseline, candidate, topn=2) == 1.0
+    assert math.isnan(agreement(_inferred([("c", 1, None)]), candidate, topn=1))
+
+
+def test_accuracy_counts_missing_predictions():
+    ground_truth = _inferred([("a", 1, "int"), ("b", 1, "str")]).drop(
+        columns=[InferredSchema.method, InferredSchema.topn]
+    )
+    inferred = _inferred([("a", 1, "int"), ("a", 2, "str")])
+
+    assert accuracy(inferred, ground_truth) == 0.5
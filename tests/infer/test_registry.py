@@ -0,0 +1,34 @@
+import pathlib
+
+import pytest
+
+from src.infer.inference import _registry
+
+
+@pytest.fixture()
+def store(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    monkeypatch.setenv("MDTI4PY_MODELS", str(tmp_path / "models"))
+    monkeypatch.setenv("MDTI4PY_CACHE", str(tmp_path / "cache"))
+    _registry.resolve.cache_clear()
+
+    (tmp_path / "models" / "type4py").mkdir(parents=True)
+    (tmp_path / "models" / "type4py" / "model.onnx").write_bytes(b"weights")
+    (tmp_path / "models" / ".huggingface").mkdir()
+    (tmp_path / "models" / ".huggingface" / "download").write_text("metadata")
+    return tmp_path / "models"
+
+
+def test_resolves_from_store(store: pathlib.Path):
+    assert _registry.resolve("type4py") == store / "type4py"
+    with pytest.raises(RuntimeError):
+        _registry.resolve("typet5")
+
+
+def test_manifest_is_verified(store: pathlib.Path):
+    assert list(_registry.write_manifest(store)) == ["type4py/model.onnx"]
+    assert _registry.resolve("type4py") == store / "type4py"
+
+    _registry.resolve.cache_clear()
+    (store / "type4py" / "model.onnx").write_bytes(b"corrupt")
+    with pytest.raises(RuntimeError):
+        _registry.resolve("type4py")
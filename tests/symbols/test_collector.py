@@ -1,5 +1,6 @@
 import collections
 import pathlib
+import shutil
 import tempfile
 import textwrap
 import typing
@@ -16,8 +17,9 @@ from src.common.schemas import (
     TypeCollectionCategory,
     TypeCollectionSchema,
 )
-from src.common import TypeCollection
-from src.symbols.collector import build_type_collection
+from src.common import TypeAnnotationRemover, TypeCollection, output
+from src.common.virtual import VirtualProject
+from src.symbols.collector import build_type_collection, strip_and_collect
 
 
 @pytest.fixture
@@ -720,3 +722,27 @@ class Test_HintTracking(AnnotationTracking):
            """
         )
         assert df.empty, str(df)
+
+
+def test_strip_and_collect(tmp_path: pathlib.Path):
+    root = pathlib.Path(
+        shutil.copytree(pathlib.Path("tests", "resources", "proj1"), tmp_path / "proj1")
+    )
+    remover = TypeAnnotationRemover(
+        context=codemod.CodemodContext(), variables=False, parameters=True, rets=True
+    )
+
+    stripped, ground_truth, result = strip_and_collect(VirtualProject.read(root), remover)
+    assert result.failures == 0
+
+    # Ground truth is what a separate collection finds for the removed categories
+    removed = [TypeCollectionCategory.CALLABLE_PARAMETER, TypeCollectionCategory.CALLABLE_RETURN]
+    expected = build_type_collection(root).df
+    expected = expected[expected[TypeCollectionSchema.category].isin(removed)]
+    pd.testing.assert_frame_equal(
+        output.sort_symbols(ground_truth.df), output.sort_symbols(expected)
+    )
+
+    # ... and the stripped sources are those of a separate removal
+    separate, _ = VirtualProject.read(root).transform(remover)
+    assert stripped.sources == separate.sources
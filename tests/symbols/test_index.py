@@ -0,0 +1,64 @@
+import pathlib
+import shutil
+
+import pandas as pd
+import pytest
+
+from src.common import output
+from src.common.schemas import SymbolIndexSchema, TypeCollectionSchema
+from src.symbols.collector import build_type_collection
+from src.symbols.index import load_symbol_index, symbol_index, with_symbol_ids
+
+
+@pytest.fixture
+def project(tmp_path: pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(
+        shutil.copytree(pathlib.Path("tests", "resources", "proj1"), tmp_path / "proj1")
+    )
+
+
+def test_ids_follow_symbol_order(project: pathlib.Path):
+    collection = build_type_collection(project).df
+    index = symbol_index(collection)
+
+    assert index[SymbolIndexSchema.symbol].tolist() == list(range(len(index)))
+    pd.testing.assert_frame_equal(
+        index.drop(columns=SymbolIndexSchema.symbol),
+        output.sort_symbols(index.drop(columns=SymbolIndexSchema.symbol)),
+    )
+
+    # Independent of the order symbols were collected in
+    shuffled = symbol_index(collection.sample(frac=1, random_state=0))
+    pd.testing.assert_frame_equal(index, shuffled)
+
+
+def test_index_is_cached_by_content(
+    project: pathlib.Path, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("MDTI4PY_CACHE", str(tmp_path / "cache"))
+    files = sorted(p for p in project.rglob("*") if p.is_file())
+
+    index = load_symbol_index(project)
+    assert any((tmp_path / "cache" / "symbol-index").rglob("*.pkl"))
+    assert sorted(p for p in project.rglob("*") if p.is_file()) == files
+    pd.testing.assert_frame_equal(load_symbol_index(project), index)
+
+    # Edited sources are indexed anew
+    (project / "x.py").write_text((project / "x.py").read_text() + "\nnewly_added = 1\n")
+    reindexed = load_symbol_index(project)
+    assert "newly_added" in set(reindexed[SymbolIndexSchema.qname])
+    assert "newly_added" not in set(index[SymbolIndexSchema.qname])
+
+
+def test_with_symbol_ids(project: pathlib.Path):
+    collection = build_type_collection(project).df
+    index = symbol_index(collection)
+
+    unknown = collection.head(1).assign(qname="unknown", qname_ssa="unknown")
+    inferred = pd.concat([collection, unknown], ignore_index=True)
+
+    assert len(with_symbol_ids(inferred, index)) == len(collection)
+
+    left = with_symbol_ids(inferred, index, how="left")
+    assert left[SymbolIndexSchema.symbol].isna().sum() == 1
+    assert left[TypeCollectionSchema.anno].equals(inferred[TypeCollectionSchema.anno])
@@ -0,0 +1,84 @@
+import errno
+import os
+import pathlib
+
+import pytest
+
+import utils
+
+
+@pytest.fixture
+def project(tmp_path: pathlib.Path) -> pathlib.Path:
+    project = tmp_path / "project"
+    (project / "pkg").mkdir(parents=True)
+    (project / "pkg" / "mod.py").write_text("a: int = 5\n")
+    (project / "pkg" / "mod.pyi").write_text("a: int\n")
+    (project / "data.bin").write_bytes(b"\x00" * 1024)
+    (project / "link.py").symlink_to("pkg/mod.py")
+    (project / "pkglink").symlink_to("pkg")
+    return project
+
+
+def test_scratchpad_isolates_python_sources(project: pathlib.Path):
+    with utils.scratchpad(project) as sc:
+        assert sc != project
+        (sc / "pkg" / "mod.py").write_text("a = 5\n")
+
+        # Other files are read-only links to the original, which are replaced, not written to
+        assert (sc / "data.bin").samefile(project / "data.bin")
+        (sc / "data.bin").unlink()
+        (sc / "data.bin").write_bytes(b"changed")
+        assert os.readlink(sc / "link.py") == "pkg/mod.py"
+        assert os.readlink(sc / "pkglink") == "pkg"
+
+    assert (project / "pkg" / "mod.py").read_text() == "a: int = 5\n"
+    assert (project / "data.bin").read_bytes() == b"\x00" * 1024
+    assert not sc.exists()
+
+
+def test_scratchpad_outside_of_dataset(
+    project: pathlib.Path, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("MDTI4PY_SCRATCH", str(tmp_path / "scratch"))
+    with utils.scratchpad(project) as sc:
+        assert sc.parent == tmp_path / "scratch"
+        assert not any(p.name.startswith(".scratchpad-") for p in project.parent.iterdir())
+
+
+def test_scratchpad_python_only(project: pathlib.Path):
+    with utils.scratchpad(project, python_only=True) as sc:
+        files = {p.relative_to(sc).as_posix() for p in sc.rglob("*") if not p.is_dir()}
+
+    assert files == {"pkg/mod.py", "pkg/mod.pyi", "link.py"}
+
+
+def test_mirror_replaces_existing_files(project: pathlib.Path, tmp_path: pathlib.Path):
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    (outdir / "data.bin").write_bytes(b"stale")
+    (outdir / ".inferred.csv").write_text("kept")
+
+    utils.mirror(project, outdir)
+
+    assert (outdir / "data.bin").read_bytes() == (project / "data.bin").read_bytes()
+    assert (outdir / ".inferred.csv").read_text() == "kept"
+
+
+def test_mirror_symlinks_across_filesystems(
+    project: pathlib.Path, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(os, "link", cross_device)
+    utils.mirror(project, tmp_path / "out")
+
+    assert os.readlink(tmp_path / "out" / "data.bin") == str(project / "data.bin")
+    assert not (tmp_path / "out" / "pkg" / "mod.py").is_symlink()
+
+
+def test_mirror_excludes_written_files(project: pathlib.Path, tmp_path: pathlib.Path):
+    utils.mirror(project, tmp_path / "out", exclude={pathlib.Path("pkg/mod.py")})
+
+    assert not (tmp_path / "out" / "pkg" / "mod.py").exists()
+    assert (tmp_path / "out" / "pkg" / "mod.pyi").is_file()
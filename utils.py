@@ -1,5 +1,6 @@
 from contextlib import contextmanager
 
+import fcntl
 import os
 import pathlib
 import tempfile
@@ -12,20 +13,92 @@ from src.common.schemas import InferredSchema, TypeCollectionSchema
 import pandera.typing as pt
 
 
-@contextmanager
-def scratchpad(untouched: pathlib.Path) -> typing.Generator[pathlib.Path, None, None]:
-    with tempfile.TemporaryDirectory() as td:
-        shutil.copytree(
-            src=str(untouched),
-            dst=td,
-            dirs_exist_ok=True,
-            ignore_dangling_symlinks=True,
-            symlinks=True,
-        )
+PYTHON_SUFFIXES = frozenset((".py", ".pyi"))
+
+# ioctl request for cloning a file's extents, see ioctl_ficlone(2)
+_FICLONE = 0x40049409
+
+
+def _copy_on_write(src: str, dst: str) -> None:
+    # Reflinks share blocks until written to, but are not supported by every filesystem
+    with open(src, "rb") as s, open(dst, "wb") as d:
         try:
-            yield pathlib.Path(td)
-        finally:
-            pass
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        except OSError:
+            shutil.copyfileobj(s, d)
+    shutil.copymode(src, dst)
+
+
+def _link(src: str, dst: str) -> None:
+    # Hardlinks survive the removal of the original, but are confined to its filesystem
+    try:
+        os.link(src, dst)
+    except OSError:
+        os.symlink(os.path.abspath(src), dst)
+
+
+def scratch_root() -> typing.Optional[pathlib.Path]:
+    # Reflinks of Python sources require scratchpads on the same filesystem as the dataset
+    if root := os.getenv("MDTI4PY_SCRATCH"):
+        return pathlib.Path(root)
+    return None
+
+
+def mirror(
+    src: pathlib.Path,
+    dst: pathlib.Path,
+    python_only: bool = False,
+    exclude: typing.Collection[pathlib.Path] = (),
+) -> None:
+    """Recreate src at dst without copying data where possible. Python sources, which codemods
+    rewrite in place, are reflinked, which shares their blocks until either copy is written to,
+    or copied where reflinks are not supported. All other files are read-only links to the
+    original, hardlinked or else symlinked; replace them instead of writing to them, like
+    VirtualProject.materialize does. If python_only is given, only Python sources are
+    recreated; files in exclude, relative to src, are not, e.g. as the caller writes them"""
+    excluded = {os.path.normpath(e) for e in exclude}
+    for root, dirs, files in os.walk(src, followlinks=False):
+        relroot = os.path.relpath(root, src)
+        target = os.path.join(dst, relroot)
+        os.makedirs(target, exist_ok=True)
+
+        # Recreate symlinked folders as symlinks, like shutil.copytree(symlinks=True)
+        for d in [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            dirs.remove(d)
+            if not python_only and not os.path.lexists(os.path.join(target, d)):
+                os.symlink(os.readlink(os.path.join(root, d)), os.path.join(target, d))
+
+        for f in files:
+            source, dest = os.path.join(root, f), os.path.join(target, f)
+            is_python = os.path.splitext(f)[1] in PYTHON_SUFFIXES
+            if python_only and not is_python:
+                continue
+            if excluded and os.path.normpath(os.path.join(relroot, f)) in excluded:
+                continue
+            if os.path.lexists(dest):
+                os.remove(dest)
+
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), dest)
+            elif is_python:
+                _copy_on_write(source, dest)
+            else:
+                _link(source, dest)
+
+
+@contextmanager
+def scratchpad(
+    untouched: pathlib.Path, python_only: bool = False
+) -> typing.Generator[pathlib.Path, None, None]:
+    # Kept out of the dataset, so that scratchpads are neither written into it nor picked up
+    # as projects; set MDTI4PY_SCRATCH to a folder on the dataset's filesystem for hardlinks
+    # and reflinks, otherwise other files are symlinked and Python sources copied
+    parent = scratch_root()
+    if parent is not None:
+        parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=".scratchpad-", dir=parent) as td:
+        mirror(untouched, pathlib.Path(td), python_only=python_only)
+        yield pathlib.Path(td)
 
 
 @contextmanager
@@ -63,6 +136,11 @@ def top_preds_only(df: pt.DataFrame[InferredSchema]) -> pt.DataFrame[TypeCollect
     )
 
 
+def validate_predictions() -> bool:
+    # Validating intermediate predictions, e.g. those handed to HiTyper, is slow; debugging only
+    return os.getenv("MDTI4PY_VALIDATE", "0") not in ("", "0")
+
+
 def worker_count() -> typing.Optional[int]:
     if cpt := os.getenv("SLURM_CPUS_PER_TASK"):
         return int(cpt)